@@ -7,7 +7,17 @@ rulesets to be applied automatically while preserving the csv interface.
 This allows you to easily upgrade old software to use new, strict rules.
 '''
 
+import collections
+import concurrent.futures
+import itertools
+import os
+import threading
+import time
+
+import rigidity.cache
 import rigidity.errors
+import rigidity.profiling
+import rigidity.reports
 import rigidity.rules as rules
 
 
@@ -23,7 +33,9 @@ class Rigidity():
     #: Display simple warnings when ValueError is raised by a rule.
     DISPLAY_SIMPLE = 1
 
-    def __init__(self, csvobj, rules=[], display=DISPLAY_NONE):
+    def __init__(self, csvobj, rules=[], display=DISPLAY_NONE,
+                 batch_size=1000, row_rules=[], profile=False, cache_size=0,
+                 cache_bytes=None, read_ahead=False):
         '''
         :param csvfile: a Reader or Writer object from the csv module;
           any calls to this object's methods will be wrapped to perform
@@ -34,15 +46,74 @@ class Rigidity():
           of rules will be applied to.
         :param int display: When an error is thrown, display the row
           and information about which column caused the error.
+        :param int batch_size: the number of rows validated together
+          by :meth:`scan` and :meth:`threaded`, and read ahead by
+          iteration when `read_ahead` is set.
+        :param row_rules=[]: a list of row-level rules, such as
+          :class:`~rigidity.rules.CompositeUnique`, that are applied in
+          order to the whole row after the column rules.
+        :param bool profile: keep statistics about the values of each
+          column in rows that are read and not dropped, in
+          :attr:`profiles`.
+        :param int cache_size: remember the result of validating up to
+          this many distinct rows, and return it again for identical
+          rows instead of applying the rules. Rules must return the
+          same result for the same value; the cache cannot be used with
+          stateful rules.
+        :param int cache_bytes: bound the cache by an estimate of its
+          size in bytes instead of, or as well as, by `cache_size`.
+        :param bool read_ahead: when the ruleset contains rules that
+          resolve values in batches, such as
+          :class:`~rigidity.rules.Lookup`, read `batch_size` rows ahead
+          during iteration so that their values can be resolved
+          together. Rows are still validated and returned one at a
+          time, but the reader's `line_num` then counts the rows read
+          ahead, and iteration waits for a whole batch to be available.
+        :raises ValueError: when caching is enabled and the ruleset
+          contains stateful rules.
         '''
         self.csvobj = csvobj
         self.rules = rules
         self.display = display
+        self.batch_size = batch_size
+        self.row_rules = row_rules
+        self.read_ahead = read_ahead
 
         if isinstance(rules, dict):
             self.keys = rules.keys()
         else:
             self.keys = range(0, len(rules))
+        self.chains = [(key, self.rules[key]) for key in self.keys]
+
+        #: When profiling is enabled, a dict mapping each column to a
+        #: :class:`~rigidity.profiling.ColumnProfile`; otherwise None.
+        self.profiles = None
+        if profile:
+            self.profiles = dict((key, rigidity.profiling.ColumnProfile())
+                                 for key in self.keys)
+
+        #: When caching is enabled, the :class:`~rigidity.cache.RowCache`
+        #: of validated rows; otherwise None.
+        self.cache = None
+        if cache_size or cache_bytes:
+            for rule in self._all_rules():
+                if getattr(rule, 'stateful', False):
+                    raise ValueError('%s cannot be used with a row cache'
+                                     % type(rule).__name__)
+            self.cache = rigidity.cache.RowCache(cache_size, cache_bytes)
+
+        # Find rules that can resolve a batch of values at once, unless
+        #   they turned batching off with their `batch` attribute. Their
+        #   input can only be computed ahead of time when no stateful
+        #   rule precedes them in the column.
+        self.prefetch_positions = []
+        for key in self.keys:
+            for i, rule in enumerate(self.rules[key]):
+                if getattr(rule, 'stateful', False):
+                    break
+                if (hasattr(rule, 'prefetch') and
+                        getattr(rule, 'batch', True)):
+                    self.prefetch_positions.append((key, i))
 
     # Wrapper methods for the `csv` interface
     def writeheader(self):
@@ -131,15 +202,22 @@ class Rigidity():
 
         :param row: a row object that can be passed to a CSVWriter's
           __next__() method.
+          List and dict rows are corrected in place and returned; other
+          sequences, such as tuples, are copied to a new list first.
         '''
+        if self.cache is not None:
+            return self._validate_cached(row, 'write', self._validate_write)
+        return self._validate_write(row)
+
+    def _validate_write(self, row):
         # Ensure mutability - I'm looking at you, tuples!
         if not isinstance(row, (list, dict)):
             row = list(row)
 
         # Iterate through all keys, updating the data
-        for key in self.keys:
-            value = row[key]
-            for rule in self.rules[key]:
+        for key, chain in self.chains:
+            original = value = row[key]
+            for rule in chain:
                 try:
                     value = rule.write(value)
                 except ValueError as err:
@@ -149,7 +227,21 @@ class Rigidity():
                         print(' - Error raised by rule:', rule)
                         print('')
                     raise err
-            row[key] = value
+            # Rules often return their input unchanged; skip the store.
+            if value is not original:
+                row[key] = value
+
+        # Apply row-level rules to the corrected row
+        for rule in self.row_rules:
+            try:
+                row = rule.write(row)
+            except ValueError as err:
+                if self.display == self.DISPLAY_SIMPLE:
+                    print('Invalid data encountered in row:')
+                    print(' -', row)
+                    print(' - Error raised by rule:', rule)
+                    print('')
+                raise err
 
         # Return the updated data
         return row
@@ -166,15 +258,46 @@ class Rigidity():
 
         :param row: a row object that can be returned from CSVReader's
           readrow() method.
+          List and dict rows are corrected in place and returned; other
+          sequences, such as tuples, are copied to a new list first.
+        '''
+        return self._read_row(row)
+
+    def _read_row(self, row, partial=None):
+        '''
+        Validate a row like :meth:`validate_read`, skipping the rules
+        already applied in `partial`, as accepted by
+        :meth:`_validate_read`.
+        '''
+        if self.cache is not None:
+            row = self._validate_cached(
+                row, 'read', lambda row: self._validate_read(row, partial))
+        else:
+            row = self._validate_read(row, partial)
+
+        if self.profiles is not None:
+            for key, profile in self.profiles.items():
+                profile.add(row[key])
+        return row
+
+    def _validate_read(self, row, partial=None):
+        '''
+        :param dict partial: optionally, for some or all columns, the
+          number of their rules already applied and the value they
+          returned, as computed by :meth:`_prefetch` or
+          :meth:`_validate_ordered_batch`.
         '''
         # Ensure mutability - I'm looking at you, tuples!
         if not isinstance(row, (list, dict)):
             row = list(row)
 
         # Iterate through all keys, updating the data
-        for key in self.keys:
-            value = row[key]
-            for rule in self.rules[key]:
+        for key, chain in self.chains:
+            original = value = row[key]
+            if partial is not None and key in partial:
+                applied, value = partial[key]
+                chain = chain[applied:]
+            for rule in chain:
                 try:
                     value = rule.read(value)
                 except ValueError as err:
@@ -191,11 +314,381 @@ class Rigidity():
                         print(' - Error raised by rule:', rule)
                         print('')
                     raise err
-            row[key] = value
+            # Rules often return their input unchanged; skip the store.
+            if value is not original:
+                row[key] = value
+
+        # Apply row-level rules to the corrected row
+        for rule in self.row_rules:
+            try:
+                row = rule.read(row)
+            except ValueError as err:
+                if self.display == self.DISPLAY_SIMPLE:
+                    print('Invalid data encountered in row:')
+                    print(' -', row)
+                    print(' - Error raised by rule:', rule)
+                    print('')
+                raise err
 
         # Return the updated data
         return row
 
+    def _validate_cached(self, row, direction, validate):
+        '''
+        Validate `row` with `validate`, or return the cached result of
+        validating an identical row. Rows that were dropped are cached
+        too; rows that raise errors, and rows containing unhashable
+        values, are not.
+        '''
+        try:
+            key = (direction, tuple(row.items()) if isinstance(row, dict)
+                   else tuple(row))
+            cached = self.cache.get(key)
+        except TypeError:
+            return validate(row)
+
+        if cached is None:
+            try:
+                result = validate(row)
+            except rigidity.errors.DropRow:
+                self.cache.put(key, rigidity.cache.DROPPED)
+                raise
+            self.cache.put(key, dict(result) if isinstance(result, dict)
+                           else tuple(result))
+            return result
+        if cached is rigidity.cache.DROPPED:
+            raise rigidity.errors.DropRow()
+
+        # Keep the in-place behavior of the uncached methods.
+        if isinstance(row, dict):
+            row.clear()
+            row.update(cached)
+            return row
+        if isinstance(row, list):
+            row[:] = cached
+            return row
+        return list(cached)
+
+    def prefetch(self, rows, direction='read'):
+        '''
+        Give every batch-capable rule, such as
+        :class:`~rigidity.rules.Lookup`, the distinct values it will
+        see in `rows` so that it can resolve them with one query.
+
+        The values are computed by applying the rules that precede the
+        batch-capable rule in its column. Cells for which those rules
+        fail are skipped here; the error is raised again when the row
+        itself is validated.
+
+        :param list rows: the rows about to be validated.
+        :param str direction: 'read' or 'write', selecting which rule
+          method is used to compute the values.
+        '''
+        self._prefetch(rows, direction)
+
+    def _prefetch(self, rows, direction):
+        '''
+        Prefetch values for :meth:`prefetch`, and return, for each row,
+        the partial results accepted by :meth:`_validate_read`, so that
+        the rules preceding a batch-capable rule are not applied again.
+        Columns in which those rules failed are left out.
+        '''
+        partials = [{} for row in rows]
+        for key, position in self.prefetch_positions:
+            chain = self.rules[key]
+            values = set()
+            for row, partial in zip(rows, partials):
+                if partial.get(key, ()) is None:
+                    # An earlier rule failed; validating the row raises
+                    #   its error again.
+                    continue
+                try:
+                    applied, value = partial.get(key) or (0, row[key])
+                    for rule in chain[applied:position]:
+                        value = getattr(rule, direction)(value)
+                    values.add(value)
+                except (ValueError, IndexError, KeyError, TypeError,
+                        rigidity.errors.DropRow):
+                    partial[key] = None
+                    continue
+                partial[key] = (position, value)
+            chain[position].prefetch(values)
+        return [dict(item for item in partial.items() if item[1] is not None)
+                for partial in partials]
+
+    def validate_read_batch(self, rows):
+        '''
+        Validate and correct every row in `rows` with
+        :meth:`validate_read`, omitting rows that a rule asked to drop.
+
+        :param rows: an iterable of rows that could be returned from
+          CSVReader's __next__() method.
+        :returns: a list of the validated rows, in their original order.
+        '''
+        rows = list(rows)
+        partials = self._prefetch(rows, 'read')
+        validated = []
+        for row, partial in zip(rows, partials):
+            try:
+                validated.append(self._read_row(row, partial))
+            except rigidity.errors.DropRow:
+                continue
+        return validated
+
+    def validate_write_batch(self, rows):
+        '''
+        Validate and correct every row in `rows` with
+        :meth:`validate_write`, omitting rows that a rule asked to drop.
+
+        :param rows: an iterable of rows that could be passed to a
+          CSVWriter's writerow() method.
+        :returns: a list of the validated rows, in their original order.
+        '''
+        rows = list(rows)
+        self.prefetch(rows, 'write')
+        validated = []
+        for row in rows:
+            try:
+                validated.append(self.validate_write(row))
+            except rigidity.errors.DropRow:
+                continue
+        return validated
+
+    @classmethod
+    def transform(cls, reader, writer, read_rules=[], write_rules=[],
+                  batch_size=1000, display=DISPLAY_NONE, read_row_rules=[],
+                  write_row_rules=[]):
+        '''
+        Read every row from `reader`, validate it with the read rules,
+        validate the result with the write rules and write it to
+        `writer`. Rows are processed in batches of `batch_size`, and
+        each batch is written with a single call to the writer's
+        writerows() method.
+
+        Validation errors are raised, as with :meth:`__iter__` and
+        :meth:`writerows`; rows written before the error remain
+        written.
+
+        :param reader: a Reader object from the csv module, or any
+          iterable of rows.
+        :param writer: a Writer object from the csv module.
+        :param read_rules=[]: the rules applied when reading, as
+          accepted by :class:`Rigidity`.
+        :param write_rules=[]: the rules applied when writing.
+        :param int batch_size: the number of rows validated and written
+          together.
+        :param int display: as accepted by :class:`Rigidity`.
+        :param read_row_rules=[]: row-level rules applied when reading.
+        :param write_row_rules=[]: row-level rules applied when writing.
+        :returns: a :class:`~rigidity.reports.TransformReport`.
+        '''
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        inbound = cls(reader, read_rules, display=display,
+                      batch_size=batch_size, row_rules=read_row_rules)
+        outbound = cls(writer, write_rules, display=display,
+                       batch_size=batch_size, row_rules=write_row_rules)
+        report = rigidity.reports.TransformReport()
+        start = time.perf_counter()
+        rows = iter(reader)
+        try:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                report.rows += len(batch)
+                valid = inbound.validate_read_batch(batch)
+                report.dropped_read += len(batch) - len(valid)
+                written = outbound.validate_write_batch(valid)
+                report.dropped_write += len(valid) - len(written)
+                writer.writerows(written)
+                report.written += len(written)
+        finally:
+            report.seconds = time.perf_counter() - start
+        return report
+
+    def threaded(self, workers=None, batch_size=None):
+        '''
+        Iterate over the validated rows of the wrapped reader, like
+        :meth:`__iter__`, but validate batches of rows in a pool of
+        threads. Rows are yielded in their original order. On
+        free-threaded builds of Python, batches are validated in
+        parallel.
+
+        Stateful rules, the rules after them in each column and
+        row-level rules are applied to one batch at a time, in order,
+        so the result is the same as that of :meth:`__iter__`, and
+        stateful rules need not be thread-safe; the rules before them
+        are applied in parallel.
+
+        :param int workers: the number of threads. Defaults to four
+          more than the number of CPUs, up to 32.
+        :param int batch_size: the number of rows validated by a
+          thread at once. Defaults to the `batch_size` given when this
+          object was created.
+        :raises ValueError: when profiling is enabled.
+        '''
+        if self.profiles is not None:
+            raise ValueError('Profiling is not supported with threads')
+        batch_size = batch_size or self.batch_size
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+
+        # The number of rules of each column applied in parallel.
+        splits = {}
+        for key, chain in self.chains:
+            splits[key] = len(chain)
+            for i, rule in enumerate(chain):
+                if getattr(rule, 'stateful', False):
+                    splits[key] = i
+                    break
+        ordered = any(getattr(rule, 'stateful', False)
+                      for rule in self._all_rules())
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            # Bound the number of batches read ahead of the consumer.
+            max_pending = 2 * workers
+            pending = collections.deque()
+            previous = None
+            rows = iter(self.csvobj)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                if ordered:
+                    done = threading.Event()
+                    pending.append(executor.submit(
+                        self._validate_ordered_batch, batch, splits,
+                        previous, done))
+                    previous = done
+                else:
+                    pending.append(executor.submit(self.validate_read_batch,
+                                                   batch))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _validate_ordered_batch(self, rows, splits, previous, done):
+        '''
+        Validate a batch of rows for :meth:`threaded`, applying the
+        first `splits[key]` rules of each column straight away and the
+        remaining rules once `previous` is set, which happens when the
+        batch before this one has been validated. `done` is set when
+        this batch has been validated.
+
+        A rule that fails before the split is applied again, in order,
+        so that its error is raised, or its row dropped, at the same
+        point as in a sequential run.
+        '''
+        try:
+            rows = list(rows)
+            self.prefetch(rows, 'read')
+            partials = []
+            for row in rows:
+                partial = {}
+                for key, chain in self.chains:
+                    applied, value = 0, None
+                    try:
+                        value = row[key]
+                        for rule in chain[:splits[key]]:
+                            value = rule.read(value)
+                            applied += 1
+                    except Exception:
+                        pass
+                    partial[key] = (applied, value)
+                partials.append(partial)
+
+            if previous is not None:
+                previous.wait()
+            validated = []
+            for row, partial in zip(rows, partials):
+                try:
+                    validated.append(self._validate_read(row, partial))
+                except rigidity.errors.DropRow:
+                    continue
+            return validated
+        finally:
+            # Keep later batches waiting until earlier ones are done,
+            #   even when this one failed.
+            if previous is not None:
+                previous.wait()
+            done.set()
+
+    def _all_rules(self):
+        for key in self.keys:
+            for rule in self.rules[key]:
+                yield rule
+        for rule in self.row_rules:
+            yield rule
+
+    def scan(self, max_failures=100, report=None):
+        '''
+        Run the ruleset over every remaining row of the wrapped reader
+        without building corrected rows, and summarize the result.
+        Rows that fail are counted rather than raising an exception.
+
+        Row numbers are taken from the reader's `line_num` attribute
+        when it has one, and otherwise count rows from 1. Readers that
+        also have a `source` attribute, such as
+        :class:`~rigidity.multifile.MultiFileReader`, have failing rows
+        recorded as (source, row number) pairs.
+
+        :param int max_failures: the number of failing row numbers to
+          record in the report.
+        :param report: a :class:`~rigidity.reports.ScanReport` to add
+          the results to. By default, a new report is created.
+        :returns: a :class:`~rigidity.reports.ScanReport`.
+        '''
+        if report is None:
+            report = rigidity.reports.ScanReport(max_failures)
+        rows = iter(self.csvobj)
+        while True:
+            batch = []
+            for row in itertools.islice(rows, self.batch_size):
+                report.rows += 1
+                line_num = getattr(self.csvobj, 'line_num', report.rows)
+                if hasattr(self.csvobj, 'source'):
+                    line_num = (self.csvobj.source, line_num)
+                batch.append((line_num, row))
+            if not batch:
+                return report
+            self.prefetch([row for line_num, row in batch], 'read')
+            for line_num, row in batch:
+                self._scan_row(row, line_num, report)
+
+    def _scan_row(self, row, line_num, report):
+        '''
+        Apply the read rules to `row` and record the outcome in
+        `report`. Corrected values are only written to a copy of the
+        row when row-level rules need to see them.
+        '''
+        if self.row_rules:
+            row = dict(row) if isinstance(row, dict) else list(row)
+        for key in self.keys:
+            rule = None
+            try:
+                value = row[key]
+                for rule in self.rules[key]:
+                    value = rule.read(value)
+            except (ValueError, IndexError, KeyError):
+                report.add_error(line_num, key, rule)
+                return
+            except rigidity.errors.DropRow:
+                report.add_drop(key, rule)
+                return
+            if self.row_rules:
+                row[key] = value
+
+        for rule in self.row_rules:
+            try:
+                row = rule.read(row)
+            except (ValueError, IndexError, KeyError):
+                report.add_error(line_num, None, rule)
+                return
+            except rigidity.errors.DropRow:
+                report.add_drop(None, rule)
+                return
+
     def skip(self):
         '''
         Return a row, skipping validation. This is useful when you want
@@ -204,12 +697,34 @@ class Rigidity():
         return next(self.csvobj)
 
     def __iter__(self):
+        if self.read_ahead and self.prefetch_positions:
+            yield from self._iter_batches()
+            return
         for row in iter(self.csvobj):
             try:
                 yield self.validate_read(row)
             except rigidity.errors.DropRow:
                 continue
 
+    def _iter_batches(self):
+        '''
+        Iterate for :meth:`__iter__` when reading ahead, prefetching the
+        values of each batch of rows and then validating and yielding
+        its rows one at a time, so that the rows before a failing row
+        are yielded before the error is raised.
+        '''
+        rows = iter(self.csvobj)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            partials = self._prefetch(batch, 'read')
+            for row, partial in zip(batch, partials):
+                try:
+                    yield self._read_row(row, partial)
+                except rigidity.errors.DropRow:
+                    continue
+
     def __next__(self):
         '''
         Call the __next__() method on the given CSV object, validate and
@@ -0,0 +1,108 @@
+'''
+Find many strings in a value in a single pass, using the Aho-Corasick
+algorithm.
+
+An :class:`Automaton` is built once from the strings to search for. A
+scan then reads each character of a value once, however many strings
+are being searched for, rather than searching the value once per
+string.
+'''
+
+import collections
+
+
+class Automaton():
+    '''
+    A trie of the strings to search for, with failure links that let a
+    scan continue without backtracking after a partial match.
+    '''
+
+    def __init__(self, strings):
+        '''
+        :param strings: the strings to search for.
+        '''
+        self.strings = list(strings)
+        #: The transitions out of each state, by character.
+        self.goto = [{}]
+        #: The indexes of the strings that end at each state, including
+        #: those ending at states reached through failure links.
+        self.outputs = [set()]
+        for index, string in enumerate(self.strings):
+            state = 0
+            for char in string:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto.append({})
+                    self.outputs.append(set())
+                    self.goto[state][char] = following
+                state = following
+            self.outputs[state].add(index)
+
+        # Breadth-first, link each state to the longest proper suffix of
+        #   its string that is also a state.
+        self.fail = [0] * len(self.goto)
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                self.outputs[following] |= self.outputs[self.fail[following]]
+        self.outputs = [frozenset(output) for output in self.outputs]
+
+        # Follow the failure links ahead of time, so that a scan makes
+        #   one lookup per character. States are visited in breadth-first
+        #   order, so each state's failure target is complete first.
+        self.transitions = [None] * len(self.goto)
+        self.transitions[0] = dict(self.goto[0])
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            queue.extend(self.goto[state].values())
+            transitions = dict(self.transitions[self.fail[state]])
+            transitions.update(self.goto[state])
+            self.transitions[state] = transitions
+
+    def __repr__(self):
+        # Stable between runs, for use in rule fingerprints.
+        return '%s(%r)' % (type(self).__name__, self.strings)
+
+    def _matches(self, value):
+        '''
+        Yield the set of indexes of the strings ending at each position
+        of `value` where at least one does.
+        '''
+        transitions, outputs = self.transitions, self.outputs
+        if outputs[0]:
+            yield outputs[0]
+        state = 0
+        for char in value:
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                yield outputs[state]
+
+    def search(self, value):
+        '''
+        :returns: the index of a string found in `value`, or None if
+          none of the strings is found.
+        '''
+        for found in self._matches(value):
+            return min(found)
+        return None
+
+    def find_all(self, value):
+        '''
+        :returns: the set of indexes of the strings found in `value`.
+        '''
+        found = set()
+        total = len(self.strings)
+        for matched in self._matches(value):
+            found |= matched
+            if len(found) >= total:
+                break
+        return found
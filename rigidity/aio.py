@@ -0,0 +1,141 @@
+'''
+An asyncio-native counterpart to :class:`rigidity.Rigidity`.
+
+:class:`AsyncRigidity` wraps asynchronous row sources (any object
+supporting `async for`) and writers whose `writerow()` method may
+return an awaitable. Validation can optionally be offloaded to an
+executor in batches so that CPU-heavy rulesets do not block the event
+loop.
+
+This module requires Python 3.7 or later. It is not imported by
+:mod:`rigidity`, so it must be imported explicitly::
+
+   from rigidity.aio import AsyncRigidity
+'''
+
+import asyncio
+import collections
+import inspect
+
+import rigidity
+
+
+class AsyncRigidity(rigidity.Rigidity):
+    '''
+    A wrapper for asynchronous row sources and writers that applies
+    the same rules as :class:`rigidity.Rigidity`.
+
+    Rows are read from the wrapped object with `async for`, or written
+    with the coroutine methods :meth:`writerow` and :meth:`writerows`.
+    '''
+
+    def __init__(self, csvobj, rules=[],
+                 display=rigidity.Rigidity.DISPLAY_NONE, batch_size=1,
+                 offload=False, executor=None, row_rules=[],
+                 profile=False):
+        '''
+        :param csvobj: an asynchronous iterable of rows when reading,
+          or a writer whose writerow() method returns either None or
+          an awaitable when writing.
+        :param rules=[]: the ruleset, as accepted by
+          :class:`rigidity.Rigidity`.
+        :param int display: as accepted by :class:`rigidity.Rigidity`.
+        :param int batch_size: the number of rows collected from the
+          source before they are validated together.
+        :param bool offload: validate each batch in an executor rather
+          than on the event loop thread.
+        :param executor: the :class:`concurrent.futures.Executor` used
+          when `offload` is set. If None, the event loop's default
+          executor is used.
+        :param row_rules=[]: row-level rules, as accepted by
+          :class:`rigidity.Rigidity`.
+        :param bool profile: as accepted by :class:`rigidity.Rigidity`.
+        '''
+        super().__init__(csvobj, rules, display=display,
+                         batch_size=batch_size, row_rules=row_rules,
+                         profile=profile)
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        # Row sources may be asynchronous iterables rather than
+        #   iterators; writers are neither.
+        self.iterator = None
+        if hasattr(csvobj, '__aiter__'):
+            self.iterator = csvobj.__aiter__()
+        self.batch_size = batch_size
+        self.offload = offload
+        self.executor = executor
+        self.pending = collections.deque()
+        self.exhausted = False
+
+    async def _run(self, func, rows):
+        '''
+        Run `func` over a batch of rows, either inline or in the
+        configured executor.
+        '''
+        if not self.offload:
+            return func(rows)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, rows)
+
+    # Wrapper methods for the `csv` interface
+    async def writerow(self, row):
+        '''
+        Validate and correct the data provided in `row` and raise an
+        exception if the validation or correction fails. Then, write the
+        row, awaiting the wrapped writer if necessary.
+        '''
+        await self.writerows([row])
+
+    async def writerows(self, rows):
+        '''
+        Validate and correct the data provided in every row, in batches
+        of `batch_size` rows, and write the valid rows.
+
+        .. note::
+          As with :meth:`rigidity.Rigidity.writerows`, do not depend on
+          the presence or absence of any of the rows in `rows` in the
+          event that an exception occurs.
+        '''
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                await self._write_batch(batch)
+                batch = []
+        if batch:
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch):
+        for row in await self._run(self.validate_write_batch, batch):
+            result = self.csvobj.writerow(row)
+            if inspect.isawaitable(result):
+                await result
+
+    async def skip(self):
+        '''
+        Return a row, skipping validation. This is useful when you want
+        to skip validation of header information.
+        '''
+        return await self.iterator.__anext__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        '''
+        Fetch rows from the wrapped asynchronous source, validate and
+        repair them, and return the next row that was not dropped.
+        '''
+        while not self.pending:
+            if self.exhausted:
+                raise StopAsyncIteration
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await self.iterator.__anext__())
+                except StopAsyncIteration:
+                    self.exhausted = True
+                    break
+            self.pending.extend(await self._run(self.validate_read_batch,
+                                                batch))
+        return self.pending.popleft()
@@ -0,0 +1,79 @@
+'''
+A bounded cache of validated rows, used by :class:`rigidity.Rigidity`
+to skip validating rows identical to rows it has already validated.
+'''
+
+import collections
+import sys
+import threading
+
+#: Cached in place of a row when the ruleset dropped the row.
+DROPPED = object()
+
+
+def _entry_size(key, value):
+    '''
+    Estimate the memory used by a cache entry: the containers and the
+    values directly inside them.
+    '''
+    size = sys.getsizeof(key) + sum(sys.getsizeof(item) for item in key)
+    if value is not DROPPED:
+        items = value.values() if isinstance(value, dict) else value
+        size += sys.getsizeof(value) + sum(sys.getsizeof(item)
+                                           for item in items)
+    return size
+
+
+class RowCache():
+    '''
+    A least-recently-used mapping from raw rows to validated rows,
+    bounded by a number of entries, an estimate of the memory used, or
+    both.
+    '''
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        '''
+        :param int max_entries: the maximum number of cached rows.
+        :param int max_bytes: the maximum estimated size of the cached
+          rows, in bytes.
+        '''
+        if not max_entries and not max_bytes:
+            raise ValueError('max_entries or max_bytes must be set')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        :returns: the value cached for `key`, or None.
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = _entry_size(key, value) if self.max_bytes else 0
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.entries and (
+                    (self.max_entries and
+                     len(self.entries) > self.max_entries) or
+                    (self.max_bytes and self.size > self.max_bytes)):
+                key, (value, size) = self.entries.popitem(last=False)
+                self.size -= size
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,232 @@
+'''
+Read and write gzip, bz2 and xz compressed files, decompressing or
+compressing in a background thread so that the work overlaps with
+validation.
+
+The compression libraries release the GIL while they work on a block
+of data, so the background thread runs in parallel with the thread
+validating rows.
+'''
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+#: Compression formats, by name, with the functions used to open them.
+FORMATS = {
+    'gzip': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
+#: File name extensions used to infer the compression format.
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+
+def compression_for(path):
+    '''
+    :param path: a file name, as a str, bytes or path-like object.
+    :returns: the name of the compression format implied by the file
+      name's extension, or None if it is not compressed.
+    '''
+    path = os.fsdecode(path).lower()
+    for extension, name in EXTENSIONS.items():
+        if path.endswith(extension):
+            return name
+    return None
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _put(items, item, stop):
+    '''
+    Put `item` on a bounded queue, giving up when `stop` is set, so that
+    neither side blocks forever when the other has gone away.
+    '''
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            items.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+class ThreadedReader(io.RawIOBase):
+    '''
+    A raw binary stream of the decompressed contents of a file. A
+    background thread reads and decompresses the file ahead of the
+    reader, holding at most `chunks` blocks of `chunk_size` bytes.
+    '''
+
+    def __init__(self, path, compression, chunk_size=1 << 20, chunks=8):
+        '''
+        :param str path: the compressed file.
+        :param str compression: a key of :data:`FORMATS`.
+        :param int chunk_size: the number of decompressed bytes read at
+          once by the background thread.
+        :param int chunks: the number of blocks read ahead.
+        '''
+        super().__init__()
+        self.chunks = queue.Queue(chunks)
+        self.stop = threading.Event()
+        self.current = b''
+        self.offset = 0
+        self.eof = False
+        self.thread = threading.Thread(
+            target=self._decompress,
+            args=(FORMATS[compression], path, chunk_size), daemon=True)
+        self.thread.start()
+
+    def _decompress(self, opener, path, chunk_size):
+        try:
+            with opener(path, 'rb') as compressed:
+                while True:
+                    chunk = compressed.read(chunk_size)
+                    _put(self.chunks, chunk, self.stop)
+                    if not chunk:
+                        return
+        except _Stopped:
+            return
+        except BaseException as err:
+            try:
+                _put(self.chunks, err, self.stop)
+            except _Stopped:
+                return
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.offset >= len(self.current):
+            if self.eof:
+                return 0
+            chunk = self.chunks.get()
+            if isinstance(chunk, BaseException):
+                self.eof = True
+                raise chunk
+            if not chunk:
+                self.eof = True
+                return 0
+            self.current, self.offset = chunk, 0
+        size = min(len(buffer), len(self.current) - self.offset)
+        buffer[:size] = self.current[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stop.set()
+            self.thread.join()
+        super().close()
+
+
+class ThreadedWriter(io.RawIOBase):
+    '''
+    A raw binary stream that compresses the data written to it into a
+    file in a background thread. Errors raised by the background thread
+    are raised by the next write, or by :meth:`close`.
+    '''
+
+    def __init__(self, path, compression, chunks=8):
+        '''
+        :param str path: the compressed file to create.
+        :param str compression: a key of :data:`FORMATS`.
+        :param int chunks: the number of blocks queued for compression
+          before writes block.
+        '''
+        super().__init__()
+        self.chunks = queue.Queue(chunks)
+        self.stop = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._compress, args=(FORMATS[compression], path),
+            daemon=True)
+        self.thread.start()
+
+    def _compress(self, opener, path):
+        try:
+            with opener(path, 'wb') as compressed:
+                while True:
+                    chunk = self.chunks.get()
+                    if chunk is None:
+                        return
+                    compressed.write(chunk)
+        except BaseException as err:
+            self.error = err
+            self.stop.set()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        try:
+            _put(self.chunks, bytes(data), self.stop)
+        except _Stopped:
+            raise self.error
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().flush()
+                _put(self.chunks, None, self.stop)
+            except _Stopped:
+                pass
+            finally:
+                self.thread.join()
+                super().close()
+            if self.error is not None:
+                raise self.error
+
+
+def open_file(path, mode='r', encoding=None, newline=None,
+              compression='infer', buffer_size=1 << 20):
+    '''
+    Open a file for reading or writing, like :func:`open`, compressing
+    or decompressing it in a background thread when it is compressed.
+
+    Compressed files opened for reading are not seekable.
+
+    :param str path: the file to open.
+    :param str mode: 'r', 'rt', 'rb', 'w', 'wt' or 'wb'.
+    :param str encoding: the text encoding, in text mode.
+    :param str newline: as accepted by :func:`open`, in text mode.
+      Pass '' when the file is read or written by the csv module.
+    :param compression: 'gzip', 'bz2', 'xz', None for an uncompressed
+      file, or 'infer' to choose from the file name's extension.
+    :param int buffer_size: the size of the blocks passed to and from
+      the background thread.
+    :returns: a file object.
+    '''
+    if compression == 'infer':
+        compression = compression_for(path)
+    if compression is None:
+        if 'b' in mode:
+            return open(path, mode)
+        return open(path, mode, encoding=encoding, newline=newline)
+    if compression not in FORMATS:
+        raise ValueError('Unknown compression format: %s' % compression)
+
+    if mode.startswith('r'):
+        stream = io.BufferedReader(
+            ThreadedReader(path, compression, buffer_size), buffer_size)
+    elif mode.startswith('w'):
+        stream = io.BufferedWriter(
+            ThreadedWriter(path, compression), buffer_size)
+    else:
+        raise ValueError('Unsupported mode: %s' % mode)
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
@@ -0,0 +1,204 @@
+'''
+Apply Rigidity rulesets directly to the columns of a pandas DataFrame,
+without converting it to a list of rows and back.
+
+pandas is imported when :func:`validate_frame` is called, so it is
+only required by code that uses this module.
+
+Several built-in rules, such as :class:`~rigidity.rules.Lower`,
+:class:`~rigidity.rules.Integer` and
+:class:`~rigidity.rules.ReplaceValue`, are applied with vectorized
+pandas operations. Values the vectorized operation cannot handle
+exactly, and every value seen by other rules, are passed to the rule
+one at a time, so the result is the same as reading the rows with
+:class:`rigidity.Rigidity`.
+'''
+
+import rigidity.errors
+import rigidity.rules
+
+
+# Strings that int() and float() accept and that numpy converts to the
+#   same value. Other strings are passed to the rule itself.
+_INTEGER_PATTERN = r'[+-]?[0-9]{1,18}'
+_FLOAT_PATTERN = r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?'
+
+
+def _is_string(values):
+    import pandas
+    return pandas.api.types.infer_dtype(values, skipna=False) == 'string'
+
+
+def _string_method(name):
+    def vectorized(rule, values):
+        if not _is_string(values):
+            return None
+        args = getattr(rule, 'strip_args', [])
+        return getattr(values.str, name)(*args), None
+    return vectorized
+
+
+def _numeric(pattern, dtype, native):
+    def vectorized(rule, values):
+        if native(values.dtype):
+            return values.astype(dtype), None
+        if not _is_string(values):
+            return None
+        stripped = values.str.strip()
+        handled = stripped.str.fullmatch(pattern).astype(bool)
+        return stripped[handled].astype(dtype), handled
+    return vectorized
+
+
+def _is_integer_dtype(dtype):
+    import pandas
+    return (pandas.api.types.is_integer_dtype(dtype) and
+            not pandas.api.types.is_bool_dtype(dtype))
+
+
+def _is_number_dtype(dtype):
+    import pandas
+    return (pandas.api.types.is_numeric_dtype(dtype) and
+            not pandas.api.types.is_bool_dtype(dtype))
+
+
+def _boolean(rule, values):
+    mapping = {'true': True, 'yes': True, 't': True, '1': True,
+               'false': False, 'no': False, 'f': False, '0': False}
+    if rule.allow_null:
+        mapping.update({'null': None, 'none': None, '': None})
+    lowered = values.astype(object).map(str).str.lower()
+    handled = lowered.isin(mapping.keys())
+    return lowered[handled].map(mapping.__getitem__), handled
+
+
+def _replace_value(rule, values):
+    handled = values.isin(list(rule.replacements.keys()))
+    replaced = values[handled].map(rule.replacements.__getitem__)
+    return replaced, handled
+
+
+#: Vectorized implementations of built-in rules, keyed by the exact rule
+#: type so that subclasses overriding apply() are not affected. Each
+#: takes the rule and a Series of values and returns None when it
+#: cannot handle the Series, or the new values and a boolean Series
+#: selecting the values that were handled (None when all were).
+_VECTORIZED = {
+    rigidity.rules.Lower: _string_method('lower'),
+    rigidity.rules.Upper: _string_method('upper'),
+    rigidity.rules.Strip: _string_method('strip'),
+    rigidity.rules.Integer: _numeric(_INTEGER_PATTERN, 'int64',
+                                     _is_integer_dtype),
+    rigidity.rules.Float: _numeric(_FLOAT_PATTERN, 'float64',
+                                   _is_number_dtype),
+    rigidity.rules.Boolean: _boolean,
+    rigidity.rules.ReplaceValue: _replace_value,
+}
+
+
+def _apply_rule(rule, values, direction):
+    '''
+    Apply one rule to a Series of values.
+
+    :returns: the new values, and a list of the index labels of values
+      for which the rule asked to drop the row.
+    '''
+    import pandas
+
+    vectorized = _VECTORIZED.get(type(rule))
+    result = vectorized(rule, values) if vectorized else None
+    if result is None:
+        handled, remaining = None, values
+    else:
+        handled, mask = result
+        if mask is None:
+            return handled, []
+        remaining = values[~mask]
+
+    method = getattr(rule, direction)
+    kept, dropped = {}, []
+    for label, value in remaining.items():
+        try:
+            kept[label] = method(value)
+        except rigidity.errors.DropRow:
+            dropped.append(label)
+    kept = pandas.Series(list(kept.values()), index=list(kept.keys()),
+                         dtype=object)
+
+    if handled is None or handled.empty:
+        return kept, dropped
+    if kept.empty:
+        return handled, dropped
+    return pandas.concat([handled, kept]).sort_index(), dropped
+
+
+def validate_frame(frame, rules=[], row_rules=[], direction='read'):
+    '''
+    Validate and correct the columns of a DataFrame with a ruleset.
+
+    Each column's rules are applied to the whole column at once, in
+    the order of the ruleset, and later columns only see rows that
+    earlier columns did not drop, so stateful rules such as
+    :class:`~rigidity.rules.Unique` see the same values as they would
+    when reading row by row. Dropped rows are removed from the result
+    at the end. Errors raised by rules are not caught.
+
+    :param frame: a :class:`pandas.DataFrame`. It is not modified.
+    :param rules=[]: the column rules. When this is a dict, its keys
+      are column labels; when it is a list, its positions are column
+      positions, as with :class:`rigidity.Rigidity`.
+    :param row_rules=[]: row-level rules, such as
+      :class:`~rigidity.rules.CompositeUnique`, applied to each
+      remaining row after the column rules. Rows are passed as dicts
+      keyed by column label when `rules` is a dict, and as lists
+      otherwise.
+    :param str direction: 'read' or 'write', selecting which rule
+      method is applied.
+    :returns: a new DataFrame with the corrected values, keeping the
+      index labels of the rows that were not dropped.
+    '''
+    import numpy
+    import pandas
+
+    if isinstance(rules, dict):
+        labels = dict((key, key) for key in rules.keys())
+    else:
+        labels = dict((key, frame.columns[key])
+                      for key in range(0, len(rules)))
+
+    # Work on positions so that duplicate index labels are harmless.
+    alive = numpy.ones(len(frame), dtype=bool)
+    columns = {}
+    for key, label in labels.items():
+        positions = numpy.flatnonzero(alive)
+        values = frame[label].iloc[positions].set_axis(positions)
+        for rule in rules[key]:
+            values, dropped = _apply_rule(rule, values, direction)
+            alive[dropped] = False
+        columns[label] = values
+
+    positions = numpy.flatnonzero(alive)
+    result = frame.iloc[positions].copy()
+    for label, values in columns.items():
+        values = pandas.Series(values.loc[positions].to_numpy(),
+                               index=result.index)
+        result[label] = (values.infer_objects() if values.dtype == object
+                         else values)
+
+    if row_rules:
+        as_dict = isinstance(rules, dict)
+        rows, index = [], []
+        for label, values in zip(result.index,
+                                 result.itertuples(index=False, name=None)):
+            row = (dict(zip(result.columns, values)) if as_dict
+                   else list(values))
+            try:
+                for rule in row_rules:
+                    row = getattr(rule, direction)(row)
+            except rigidity.errors.DropRow:
+                continue
+            rows.append(row if as_dict else dict(zip(result.columns, row)))
+            index.append(label)
+        result = pandas.DataFrame(rows, index=pandas.Index(
+            index, name=result.index.name), columns=result.columns)
+    return result
@@ -0,0 +1,146 @@
+'''
+Produce several outputs from one input, reading and parsing each row
+only once.
+
+Each output of a :class:`FanOut` has its own ruleset and writer. Rules
+that appear at the start of the same column's chain in several
+rulesets, as the same rule object, are evaluated once per row and their
+result is shared, so a common cleaning prefix is not repeated for
+every output.
+'''
+
+import collections
+
+import rigidity.errors
+
+
+class _Node():
+    '''
+    A node in the tree of rule chains for one column. The value at a
+    node is the result of applying the rules on the path to it.
+    '''
+    def __init__(self):
+        #: (rule, child node) pairs, in the order they were added.
+        self.children = []
+        #: Outputs whose chain for the column ends at this node.
+        self.terminals = []
+        #: Every output whose chain passes through this node.
+        self.outputs = set()
+
+    def child(self, rule):
+        for existing, node in self.children:
+            if existing is rule:
+                return node
+        node = _Node()
+        self.children.append((rule, node))
+        return node
+
+
+class FanOut():
+    '''
+    Read rows from a reader once and write them to several outputs,
+    each validated with its own ruleset.
+    '''
+
+    def __init__(self, reader):
+        '''
+        :param reader: a Reader object from the csv module, or any
+          iterable of rows.
+        '''
+        self.reader = reader
+        self.outputs = []
+        self.trees = collections.OrderedDict()
+
+    def add_output(self, writer, rules=[], row_rules=[], rejects=None):
+        '''
+        Add an output.
+
+        :param writer: a Writer object from the csv module that valid
+          rows are written to.
+        :param rules=[]: the column rules, as accepted by
+          :class:`rigidity.Rigidity`. Rule objects shared with other
+          outputs at the start of a column's chain are evaluated once.
+        :param row_rules=[]: row-level rules, as accepted by
+          :class:`rigidity.Rigidity`.
+        :param rejects: a writer that rows failing validation or
+          dropped by this ruleset are written to, unmodified. Without
+          it, validation errors are raised and dropped rows discarded.
+        :returns: the index of the output.
+        '''
+        index = len(self.outputs)
+        keys = rules.keys() if isinstance(rules, dict) else range(len(rules))
+        for key in keys:
+            node = self.trees.setdefault(key, _Node())
+            node.outputs.add(index)
+            for rule in rules[key]:
+                node = node.child(rule)
+                node.outputs.add(index)
+            node.terminals.append(index)
+        self.outputs.append((writer, list(keys), row_rules, rejects))
+        return index
+
+    def _evaluate(self, node, value, alive, values, failures, key):
+        for output in node.terminals:
+            values[output].append((key, value))
+        for rule, child in node.children:
+            if alive.isdisjoint(child.outputs):
+                continue
+            try:
+                result = rule.read(value)
+            except (ValueError, IndexError, rigidity.errors.DropRow) as err:
+                for output in child.outputs & alive:
+                    failures[output] = err
+                alive -= child.outputs
+                continue
+            self._evaluate(child, result, alive, values, failures, key)
+
+    def run(self):
+        '''
+        Read every row from the reader and write it to each output.
+
+        :returns: a list with a dict for each output, counting the
+          rows 'written', 'dropped' and 'rejected'.
+        '''
+        counts = [{'written': 0, 'dropped': 0, 'rejected': 0}
+                  for output in self.outputs]
+        for row in self.reader:
+            alive = set(range(0, len(self.outputs)))
+            values = [[] for output in self.outputs]
+            failures = {}
+            for key, tree in self.trees.items():
+                if alive.isdisjoint(tree.outputs):
+                    continue
+                try:
+                    value = row[key]
+                except (IndexError, KeyError) as err:
+                    for output in tree.outputs & alive:
+                        failures[output] = err
+                    alive -= tree.outputs
+                    continue
+                self._evaluate(tree, value, alive, values, failures, key)
+
+            for index, (writer, keys, row_rules, rejects) in \
+                    enumerate(self.outputs):
+                if index in alive:
+                    out = dict(row) if isinstance(row, dict) else list(row)
+                    for key, value in values[index]:
+                        out[key] = value
+                    try:
+                        for rule in row_rules:
+                            out = rule.read(out)
+                    except (ValueError, rigidity.errors.DropRow) as err:
+                        failures[index] = err
+                    else:
+                        writer.writerow(out)
+                        counts[index]['written'] += 1
+                        continue
+
+                err = failures[index]
+                if rejects is not None:
+                    rejects.writerow(row)
+                    counts[index]['rejected'] += 1
+                elif isinstance(err, rigidity.errors.DropRow):
+                    counts[index]['dropped'] += 1
+                else:
+                    raise err
+        return counts
@@ -0,0 +1,234 @@
+'''
+Revalidate archived files after a ruleset changes, recomputing only
+the columns whose rules changed.
+
+:class:`IncrementalValidator` saves the output of each column's rule
+chain for each file in a :class:`CheckpointStore`, under a fingerprint
+of the chain built from :meth:`rigidity.rules.Rule.fingerprint`. When
+a file is validated again, columns whose fingerprint is unchanged are
+read from the store instead of being recomputed.
+
+Only chains without stateful rules are saved. The output of a stateful
+chain, such as one containing :class:`~rigidity.rules.Unique`, depends
+on every value it has seen, including those of other files, and on
+which rows earlier columns dropped; these chains are recomputed every
+time, as are row-level rules and chains containing a rule whose
+fingerprint is None, such as a :class:`~rigidity.rules.Lookup` that
+cannot identify the version of its reference store.
+'''
+
+import csv
+import hashlib
+import os
+import pickle
+import tempfile
+
+import rigidity.compression
+import rigidity.errors
+
+
+class _Dropped():
+    '''
+    Saved in place of a value when a rule asked to drop the row.
+    '''
+
+
+class _Failed():
+    '''
+    Saved in place of a value when a rule raised an error.
+    '''
+    def __init__(self, error):
+        self.error = error
+
+
+def chain_fingerprint(chain):
+    '''
+    :param list chain: the rules applied to a column.
+    :returns: a hex digest identifying the rules and their order, or
+      None if the output of a rule must not be saved.
+    '''
+    digest = hashlib.sha256()
+    for rule in chain:
+        fingerprint = rule.fingerprint()
+        if fingerprint is None:
+            return None
+        digest.update(fingerprint.encode('utf8', 'surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def source_id(path):
+    '''
+    Identify a file by its path, size and modification time, so that
+    saved results are not reused after the file changes.
+
+    :returns: a hex digest.
+    '''
+    stat = os.stat(path)
+    key = '%s\0%d\0%d' % (os.path.abspath(path), stat.st_size,
+                          stat.st_mtime_ns)
+    return hashlib.sha256(key.encode('utf8', 'surrogateescape')).hexdigest()
+
+
+class CheckpointStore():
+    '''
+    A directory of saved column outputs, one pickle file per file,
+    column and chain fingerprint.
+    '''
+
+    def __init__(self, directory):
+        '''
+        :param str directory: where the outputs are saved. It is
+          created if it does not exist.
+        '''
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, source, column, fingerprint):
+        column = hashlib.sha256(repr(column).encode('utf8')).hexdigest()
+        return os.path.join(self.directory, source,
+                            '%s-%s.pickle' % (column[:16], fingerprint))
+
+    def load(self, source, column, fingerprint):
+        '''
+        :returns: the saved outputs, or None if there are none.
+        '''
+        try:
+            with open(self._path(source, column, fingerprint), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, source, column, fingerprint, outputs):
+        '''
+        Save the outputs of a column, replacing the file atomically.
+        '''
+        path = self._path(source, column, fingerprint)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(outputs, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+class IncrementalValidator():
+    '''
+    Validate files with a ruleset, saving and reusing the output of
+    each column's rules between runs.
+    '''
+
+    def __init__(self, rules, store, row_rules=[]):
+        '''
+        :param rules: the column rules, as accepted by
+          :class:`rigidity.Rigidity`. When this is a dict, files are
+          read with :class:`csv.DictReader`.
+        :param store: a :class:`CheckpointStore`.
+        :param row_rules=[]: row-level rules, as accepted by
+          :class:`rigidity.Rigidity`. They are applied on every run.
+        '''
+        self.rules = rules
+        self.store = store
+        self.row_rules = row_rules
+        if isinstance(rules, dict):
+            self.keys = list(rules.keys())
+        else:
+            self.keys = list(range(0, len(rules)))
+        #: The columns recomputed by the last call to
+        #: :meth:`validate_file`.
+        self.recomputed = []
+        #: The columns read from the store by the last call to
+        #: :meth:`validate_file`.
+        self.reused = []
+
+    def _evaluate(self, chain, rows, key, alive):
+        outputs = []
+        for row, keep in zip(rows, alive):
+            if not keep:
+                outputs.append(None)
+                continue
+            try:
+                value = row[key]
+                for rule in chain:
+                    value = rule.read(value)
+            except rigidity.errors.DropRow:
+                value = _Dropped()
+            except (ValueError, IndexError, KeyError) as err:
+                value = _Failed(err)
+            outputs.append(value)
+        return outputs
+
+    def validate_file(self, path, header=False, encoding='utf8',
+                      **fmtparams):
+        '''
+        Read and validate every row of a CSV file.
+
+        Rows are returned as :meth:`rigidity.Rigidity.validate_read`
+        would return them, and the first error in row order is raised.
+
+        :param str path: the file. Compressed files are opened with
+          :func:`rigidity.compression.open_file`.
+        :param bool header: skip the first row. Ignored when the rules
+          are a dict.
+        :param str encoding: the encoding of the file.
+        :param fmtparams: formatting parameters passed to the csv
+          reader.
+        :returns: a list of the rows that were not dropped.
+        '''
+        source = source_id(path)
+        with rigidity.compression.open_file(path, 'r', encoding=encoding,
+                                            newline='') as csvfile:
+            if isinstance(self.rules, dict):
+                rows = list(csv.DictReader(csvfile, **fmtparams))
+            else:
+                reader = csv.reader(csvfile, **fmtparams)
+                if header:
+                    next(reader, None)
+                rows = list(reader)
+
+        self.recomputed, self.reused = [], []
+        # Stateful rules only see rows that earlier columns kept.
+        alive = [True] * len(rows)
+        outputs = {}
+        for key in self.keys:
+            chain = self.rules[key]
+            fingerprint = None
+            if not any(getattr(rule, 'stateful', False) for rule in chain):
+                fingerprint = chain_fingerprint(chain)
+            if fingerprint is None:
+                column = self._evaluate(chain, rows, key, alive)
+                self.recomputed.append(key)
+            else:
+                column = self.store.load(source, key, fingerprint)
+                if column is None or len(column) != len(rows):
+                    column = self._evaluate(chain, rows, key,
+                                            [True] * len(rows))
+                    self.store.save(source, key, fingerprint, column)
+                    self.recomputed.append(key)
+                else:
+                    self.reused.append(key)
+            for i, value in enumerate(column):
+                if isinstance(value, (_Dropped, _Failed)):
+                    alive[i] = False
+            outputs[key] = column
+
+        validated = []
+        for i, row in enumerate(rows):
+            try:
+                for key in self.keys:
+                    value = outputs[key][i]
+                    if isinstance(value, _Dropped):
+                        raise rigidity.errors.DropRow()
+                    elif isinstance(value, _Failed):
+                        raise value.error
+                    row[key] = value
+                for rule in self.row_rules:
+                    row = rule.read(row)
+            except rigidity.errors.DropRow:
+                continue
+            validated.append(row)
+        return validated
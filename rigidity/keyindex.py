@@ -0,0 +1,329 @@
+'''
+Compact key indexes and sets used by rules that check values against
+a large set of keys.
+
+A :class:`SortedKeyIndex` file is built once and memory-mapped
+read-only for lookups, so processes using the same index share the
+operating system's page cache instead of each holding a copy of the
+keys in memory.
+'''
+
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+
+def encode_value(value):
+    '''
+    Encode a cell value as bytes for storage in an index. Strings and
+    bytes are tagged so that equal strings and bytes values do not
+    collide; other values are stored by their `repr()`.
+
+    :param value: the value to encode.
+    :returns: a bytes object uniquely identifying the value.
+    '''
+    if isinstance(value, str):
+        return b's' + value.encode('utf8', 'surrogatepass')
+    elif isinstance(value, bytes):
+        return b'b' + value
+    return b'r' + repr(value).encode('utf8', 'surrogatepass')
+
+
+class SortedKeyIndex():
+    '''
+    A read-only, memory-mapped set of byte-string keys.
+
+    The file consists of a 16 byte header (the magic number, a version
+    and the number of keys), an array of little-endian 64-bit offsets,
+    and the sorted keys themselves. Membership tests use a binary
+    search over the mapped file.
+    '''
+
+    MAGIC = b'RGKI'
+    VERSION = 1
+    HEADER = struct.Struct('<4sI Q')
+    OFFSET = struct.Struct('<Q')
+
+    def __init__(self, path):
+        '''
+        :param str path: the path of an index file written by
+          :meth:`build`.
+        :raises ValueError: when the file is not a valid index.
+        '''
+        self.path = path
+        with open(path, 'rb') as indexfile:
+            self.map = mmap.mmap(indexfile.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+
+        if len(self.map) < self.HEADER.size:
+            raise ValueError('%s is not a key index' % path)
+        magic, version, self.count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('%s is not a key index' % path)
+        self.data_start = (self.HEADER.size +
+                           (self.count + 1) * self.OFFSET.size)
+
+    @classmethod
+    def build(cls, keys, path):
+        '''
+        Write an index containing `keys` to `path`. The file is written
+        to a temporary location and renamed into place, so readers
+        never observe a partially written index.
+
+        :param keys: an iterable of bytes objects; duplicates are
+          removed.
+        :param str path: where the index file is written.
+        :returns: the new index, opened for lookups.
+        '''
+        keys = sorted(set(keys))
+        return cls._write(lambda: iter(keys), path)
+
+    @classmethod
+    def merge(cls, index, keys, path):
+        '''
+        Write an index containing every key of an existing index and
+        the keys in `keys`. The existing index is streamed rather than
+        loaded into memory, so only `keys` need to fit in memory.
+
+        :param index: a :class:`SortedKeyIndex`, or None.
+        :param keys: an iterable of bytes objects.
+        :param str path: where the index file is written. This may be
+          the path of `index` itself.
+        :returns: the new index, opened for lookups.
+        '''
+        keys = sorted(set(keys))
+
+        def merged():
+            previous = None
+            for key in heapq.merge(index if index is not None else (), keys):
+                if key != previous:
+                    yield key
+                    previous = key
+        return cls._write(merged, path)
+
+    @classmethod
+    def combine(cls, indexes, path):
+        '''
+        Write an index containing every key of several existing
+        indexes. The indexes are streamed, so none of them is loaded
+        into memory.
+
+        :param list indexes: the :class:`SortedKeyIndex` objects to
+          combine.
+        :param str path: where the index file is written.
+        :returns: the new index, opened for lookups.
+        '''
+        def merged():
+            previous = None
+            for key in heapq.merge(*indexes):
+                if key != previous:
+                    yield key
+                    previous = key
+        return cls._write(merged, path)
+
+    @classmethod
+    def _write(cls, sorted_keys, path):
+        '''
+        Write the keys produced by the `sorted_keys` callable, which is
+        called once per section of the file, to `path`.
+        '''
+        count = sum(1 for key in sorted_keys())
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as indexfile:
+                indexfile.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION,
+                                                count))
+                offset = 0
+                indexfile.write(cls.OFFSET.pack(offset))
+                for key in sorted_keys():
+                    offset += len(key)
+                    indexfile.write(cls.OFFSET.pack(offset))
+                for key in sorted_keys():
+                    indexfile.write(key)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return cls(path)
+
+    def key(self, i):
+        '''
+        :param int i: the position of a key in sorted order.
+        :returns: the key at position `i`.
+        '''
+        start, end = struct.unpack_from(
+            '<2Q', self.map, self.HEADER.size + i * self.OFFSET.size)
+        return self.map[self.data_start + start:self.data_start + end]
+
+    def __contains__(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self.key(middle)
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __iter__(self):
+        for i in range(0, self.count):
+            yield self.key(i)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.map.close()
+
+    def __getstate__(self):
+        # Worker processes re-open the file rather than copying it.
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+
+class BloomFilter():
+    '''
+    A fixed-size probabilistic set of byte-string keys. Membership tests
+    never report a missing key for a key that was added, but may report
+    a key that was never added as present, at roughly the false positive
+    rate the filter was sized for.
+    '''
+
+    MAGIC = b'RGBF'
+    VERSION = 2
+    HEADER = struct.Struct('<4sI 3Q')
+
+    def __init__(self, capacity, error_rate=0.001):
+        '''
+        :param int capacity: the number of distinct keys the filter is
+          expected to hold.
+        :param float error_rate: the target false positive rate once
+          `capacity` keys have been added.
+        '''
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        size = int(math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2))
+        hashes = max(1, int(round(size / capacity * math.log(2))))
+        self._setup(size, hashes, bytearray((size + 7) // 8), 0)
+
+    def _setup(self, size, hashes, bits, count):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        return [(first + i * second) % self.size
+                for i in range(0, self.hashes)]
+
+    def add(self, key):
+        '''
+        Add a key to the filter.
+
+        :param bytes key: the key to add.
+        :returns: True if the key may already have been present.
+        '''
+        bits = self.bits
+        present = True
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                present = False
+                bits[position >> 3] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def update(self, other):
+        '''
+        Add every key of another filter with the same size and number
+        of hashes to this filter.
+
+        :raises ValueError: when the filters are not compatible.
+        '''
+        if (other.size, other.hashes) != (self.size, self.hashes):
+            raise ValueError('Bloom filters have different parameters')
+        # Combine the bitmaps as integers, in a single operation.
+        combined = (int.from_bytes(self.bits, 'little') |
+                    int.from_bytes(other.bits, 'little'))
+        self.bits = bytearray(combined.to_bytes(len(self.bits), 'little'))
+        self.count += other.count
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        '''
+        The number of keys added that were not already reported as
+        present.
+        '''
+        return self.count
+
+    def to_bytes(self):
+        '''
+        :returns: the state of the filter, suitable for
+          :meth:`from_bytes`.
+        '''
+        return self.HEADER.pack(self.MAGIC, self.VERSION, self.size,
+                                self.hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Recreate a filter from the output of :meth:`to_bytes`.
+
+        :raises ValueError: when `data` is not a valid filter.
+        '''
+        if len(data) < cls.HEADER.size:
+            raise ValueError('Data is not a Bloom filter')
+        magic, version, size, hashes, count = cls.HEADER.unpack_from(data)
+        bits = bytearray(data[cls.HEADER.size:])
+        if (magic != cls.MAGIC or version != cls.VERSION or
+                len(bits) != (size + 7) // 8):
+            raise ValueError('Data is not a Bloom filter')
+        bloom = cls.__new__(cls)
+        bloom._setup(size, hashes, bits, count)
+        return bloom
+
+    def save(self, path):
+        '''
+        Write the state of the filter to `path`, replacing the file
+        atomically.
+        '''
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as bloomfile:
+                bloomfile.write(self.to_bytes())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read a filter written by :meth:`save`.
+        '''
+        with open(path, 'rb') as bloomfile:
+            return cls.from_bytes(bloomfile.read())
@@ -0,0 +1,181 @@
+'''
+Read many CSV files as one stream of rows, so that a single ruleset,
+including stateful rules such as :class:`~rigidity.rules.Unique`, is
+applied across all of them.
+
+:class:`MultiFileReader` reads several files at once in background
+threads, each holding a bounded number of rows ahead of the consumer,
+and yields their rows in a deterministic order.
+'''
+
+import collections
+import csv
+import itertools
+import queue
+import threading
+
+import rigidity.compression
+
+
+class MultiFileReader():
+    '''
+    A reader that yields the rows of several CSV files, either one file
+    after another or interleaved, one row from each open file in turn.
+
+    After each row is returned, :attr:`source` and :attr:`line_num`
+    identify the file and line it was read from, so that
+    :meth:`rigidity.Rigidity.scan` can report where rows failed.
+    '''
+
+    #: The number of rows passed from a reading thread at once.
+    CHUNK_SIZE = 100
+
+    def __init__(self, paths, interleave=False, max_open=4, read_ahead=1000,
+                 header=False, encoding='utf8', **fmtparams):
+        '''
+        :param list paths: the files to read. Compressed files are
+          opened with :func:`rigidity.compression.open_file`.
+        :param bool interleave: when False, the files are read one after
+          another, in order. When True, rows are taken in turn from the
+          first `max_open` unfinished files; when a file ends, the next
+          file takes its place in the rotation.
+        :param int max_open: the number of files read at once.
+        :param int read_ahead: the number of rows read ahead from each
+          open file.
+        :param bool header: skip the first row of every file. The first
+          row of the first file is kept in :attr:`header`.
+        :param str encoding: the encoding of the files.
+        :param fmtparams: formatting parameters passed to
+          :func:`csv.reader`.
+        '''
+        if max_open < 1:
+            raise ValueError('max_open must be at least 1')
+        self.paths = list(paths)
+        self.interleave = interleave
+        self.skip_header = header
+        self.encoding = encoding
+        self.fmtparams = fmtparams
+        #: The header row of the first file, when `header` is set. It is
+        #: available once the first row has been read.
+        self.header = None
+        #: The path of the file the last row was read from.
+        self.source = None
+        #: The line number of the last row within its file.
+        self.line_num = 0
+
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.queues = [queue.Queue(max(1, read_ahead // self.CHUNK_SIZE))
+                       for path in self.paths]
+        self.threads = []
+        # A file is opened when a file before it has been read to the
+        #   end. The files being consumed are always open, since every
+        #   file consumed before them has been read to the end.
+        for i in range(0, min(max_open, len(self.paths))):
+            self._start_next()
+
+        self.rows = self._rows(max_open if interleave else 1)
+
+    def _put(self, chunks, item):
+        while not self.stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _start_next(self):
+        with self.lock:
+            index = len(self.threads)
+            if index >= len(self.paths) or self.stop.is_set():
+                return
+            thread = threading.Thread(
+                target=self._read,
+                args=(index, self.paths[index], self.queues[index]),
+                daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def _read(self, index, path, chunks):
+        '''
+        Read a file in a worker thread, passing its rows to `chunks` in
+        lists of (line number, row) pairs, followed by None, and then
+        start reading the next file that has not been started.
+        '''
+        try:
+            with rigidity.compression.open_file(
+                    path, 'r', encoding=self.encoding, newline='') as infile:
+                reader = csv.reader(infile, **self.fmtparams)
+                if self.skip_header:
+                    header = next(reader, None)
+                    if index == 0:
+                        self.header = header
+                while True:
+                    chunk = []
+                    for row in itertools.islice(reader, self.CHUNK_SIZE):
+                        chunk.append((reader.line_num, row))
+                    if not chunk:
+                        break
+                    if not self._put(chunks, chunk):
+                        return
+            self._put(chunks, None)
+        except BaseException as err:
+            self._put(chunks, err)
+        finally:
+            self._start_next()
+
+    def _rows(self, slots):
+        '''
+        Yield (path, line number, row) triples, taking one row at a time
+        from each of the active files in turn.
+        '''
+        waiting = collections.deque(zip(self.paths, self.queues))
+        active = []
+        while waiting and len(active) < slots:
+            path, chunks = waiting.popleft()
+            active.append([path, chunks, collections.deque()])
+
+        while active:
+            position = 0
+            while position < len(active):
+                path, chunks, pending = active[position]
+                if not pending:
+                    chunk = chunks.get()
+                    if isinstance(chunk, BaseException):
+                        raise chunk
+                    if chunk is None:
+                        # Replace the finished file with the next one.
+                        if waiting:
+                            path, chunks = waiting.popleft()
+                            active[position] = [path, chunks,
+                                                collections.deque()]
+                        else:
+                            del active[position]
+                        continue
+                    pending.extend(chunk)
+                line_num, row = pending.popleft()
+                yield path, line_num, row
+                position += 1
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.source, self.line_num, row = next(self.rows)
+        return row
+
+    def close(self):
+        '''
+        Stop the reading threads and close the files.
+        '''
+        with self.lock:
+            self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
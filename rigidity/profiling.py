@@ -0,0 +1,202 @@
+'''
+Constant-memory column statistics that can be collected while rows are
+validated, so that data-quality metrics do not require a second pass.
+
+Pass `profile=True` to :class:`rigidity.Rigidity` to keep a
+:class:`ColumnProfile` for every column in the ruleset.
+'''
+
+import math
+import random
+
+
+def _mix(value):
+    '''
+    Spread the bits of Python's hash of `value` over 64 bits. The hash
+    of a small integer is the integer itself, which is not suitable
+    for HyperLogLog without mixing.
+    '''
+    x = hash(value) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class HyperLogLog():
+    '''
+    Estimate the number of distinct values in a stream using a fixed
+    number of small registers. The relative error is roughly
+    1.04 / sqrt(2 ** precision).
+
+    Values are hashed with Python's `hash()`, so estimates are only
+    consistent within a single process.
+    '''
+
+    def __init__(self, precision=12):
+        '''
+        :param int precision: the number of bits used to select a
+          register; the sketch uses 2 ** precision bytes.
+        '''
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18')
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        x = _mix(value)
+        register = x >> (64 - self.precision)
+        remaining = (x << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = min(65 - remaining.bit_length(), 65 - self.precision)
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    def estimate(self):
+        '''
+        :returns: the estimated number of distinct values added.
+        '''
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            return m * math.log(m / zeros)
+        return raw
+
+
+class QuantileSketch():
+    '''
+    Estimate quantiles of a stream of numbers in bounded memory, using
+    a simplified KLL sketch: values are kept in a hierarchy of buffers,
+    and a full buffer is sorted and every other value is promoted to
+    the next level with twice the weight.
+    '''
+
+    def __init__(self, k=200, seed=None):
+        '''
+        :param int k: the size of the largest buffer. Larger values
+          give more accurate quantiles.
+        :param seed: a seed for the random choices made when buffers
+          are compacted.
+        '''
+        self.k = k
+        self.random = random.Random(seed)
+        self.compactors = [[]]
+        self.size = 0
+        self.max_size = 0
+        self.count = 0
+        self._update_max_size()
+
+    def _capacity(self, height):
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def _update_max_size(self):
+        self.max_size = sum(self._capacity(height)
+                            for height in range(0, len(self.compactors)))
+
+    def add(self, value):
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for height, items in enumerate(self.compactors):
+            if len(items) >= self._capacity(height):
+                if height + 1 >= len(self.compactors):
+                    self.compactors.append([])
+                items.sort()
+                promoted = items[self.random.randint(0, 1)::2]
+                self.compactors[height + 1].extend(promoted)
+                self.size -= len(items) - len(promoted)
+                self.compactors[height] = []
+                self._update_max_size()
+                return
+
+    def quantile(self, q):
+        '''
+        :param float q: the quantile to estimate, between 0 and 1.
+        :returns: the estimated value, or None if nothing was added.
+        '''
+        weighted = sorted((value, 2 ** height)
+                          for height, items in enumerate(self.compactors)
+                          for value in items)
+        if not weighted:
+            return None
+        total = sum(weight for value, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+
+class ColumnProfile():
+    '''
+    Statistics about the validated values of one column: the number of
+    values and nulls, an estimate of the number of distinct values, and
+    the minimum, maximum and quantiles of numeric values, such as those
+    produced by :class:`~rigidity.rules.Integer` and
+    :class:`~rigidity.rules.Float`.
+    '''
+
+    #: The quantiles reported by :meth:`summary`.
+    QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+    def __init__(self, precision=12, k=200):
+        '''
+        :param int precision: passed to :class:`HyperLogLog`.
+        :param int k: passed to :class:`QuantileSketch`.
+        '''
+        self.count = 0
+        self.nulls = 0
+        self.numeric = 0
+        self.minimum = None
+        self.maximum = None
+        self.distinct = HyperLogLog(precision)
+        self.quantiles = QuantileSketch(k)
+
+    def add(self, value):
+        '''
+        Record a validated value.
+        '''
+        self.count += 1
+        if value is None or value == '':
+            self.nulls += 1
+            return
+        self.distinct.add(value)
+        if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                and value == value):
+            self.numeric += 1
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+            self.quantiles.add(value)
+
+    @property
+    def null_rate(self):
+        return self.nulls / self.count if self.count else 0.0
+
+    def summary(self):
+        '''
+        :returns: a dict of the statistics, suitable for reporting.
+        '''
+        return {
+            'count': self.count,
+            'nulls': self.nulls,
+            'null_rate': self.null_rate,
+            'distinct': len(self.distinct),
+            'numeric': self.numeric,
+            'min': self.minimum,
+            'max': self.maximum,
+            'quantiles': dict((q, self.quantiles.quantile(q))
+                              for q in self.QUANTILES),
+        }
@@ -0,0 +1,170 @@
+'''
+Validate CSV data as raw bytes, decoding only the columns that have
+rules.
+
+The csv module decodes every cell of every row, even when most columns
+are passed through unchanged. :func:`process` splits each record into
+byte slices instead, applies the ruleset to the decoded values of the
+ruled columns only, and writes every other column back as the original
+bytes. Rows whose ruled values are unchanged are written exactly as
+they were read.
+
+Only single-byte delimiters and quote characters, with quotes escaped
+by doubling them as the csv module does by default, are supported.
+'''
+
+import rigidity.errors
+
+
+def split_record(record, delimiter=b',', quotechar=b'"'):
+    '''
+    Split a record into the raw bytes of its fields. Quoted fields keep
+    their quotes; see :func:`decode_field`.
+
+    :param bytes record: a record without its line terminator. It may
+      contain line breaks inside quoted fields.
+    :param bytes delimiter: the field delimiter.
+    :param bytes quotechar: the quote character.
+    :returns: a list of bytes objects.
+    :raises ValueError: when a quoted field is not terminated.
+    '''
+    if quotechar not in record:
+        return record.split(delimiter)
+
+    fields = []
+    start = 0
+    while True:
+        if record.startswith(quotechar, start):
+            # Find the closing quote, skipping doubled quotes.
+            position = start + 1
+            while True:
+                position = record.find(quotechar, position)
+                if position == -1:
+                    raise ValueError('Unterminated quoted field')
+                if not record.startswith(quotechar, position + 1):
+                    break
+                position += 2
+            end = record.find(delimiter, position + 1)
+        else:
+            end = record.find(delimiter, start)
+        if end == -1:
+            fields.append(record[start:])
+            return fields
+        fields.append(record[start:end])
+        start = end + 1
+
+
+def decode_field(field, encoding='utf8', quotechar=b'"'):
+    '''
+    Decode the raw bytes of a field, as returned by
+    :func:`split_record`, to the string the csv module would read.
+    '''
+    if (len(field) >= 2 and field.startswith(quotechar) and
+            field.endswith(quotechar)):
+        field = field[1:-1].replace(quotechar + quotechar, quotechar)
+    return field.decode(encoding)
+
+
+def encode_field(value, encoding='utf8', delimiter=b',', quotechar=b'"'):
+    '''
+    Encode a value as the bytes of a field, quoting it when necessary,
+    as the csv module's writer does with QUOTE_MINIMAL. Bytes values
+    are written as they are; None is written as an empty field, and
+    other values are converted with `str()`.
+    '''
+    if value is None:
+        return b''
+    if not isinstance(value, bytes):
+        value = str(value).encode(encoding)
+    if (delimiter in value or quotechar in value or b'\n' in value or
+            b'\r' in value):
+        return (quotechar + value.replace(quotechar, quotechar + quotechar) +
+                quotechar)
+    return value
+
+
+def records(infile, quotechar=b'"'):
+    '''
+    Yield the records of a binary file as (record, terminator) pairs.
+    Lines are joined while a quoted field is open, so records may span
+    several lines.
+
+    :param infile: a file object opened in binary mode.
+    :param bytes quotechar: the quote character.
+    '''
+    pending = None
+    for line in infile:
+        if pending is not None:
+            line = pending + line
+        if line.count(quotechar) % 2:
+            pending = line
+            continue
+        pending = None
+        if line.endswith(b'\r\n'):
+            yield line[:-2], b'\r\n'
+        elif line.endswith(b'\n'):
+            yield line[:-1], b'\n'
+        else:
+            yield line, b''
+    if pending is not None:
+        raise ValueError('Unterminated quoted field at end of file')
+
+
+def process(infile, outfile, rules=[], encoding='utf8', delimiter=b',',
+            quotechar=b'"', header=False, direction='read'):
+    '''
+    Validate the records of a binary CSV file and write the valid ones
+    to another binary file.
+
+    Errors raised by rules are not caught, and rows a rule asks to drop
+    are omitted, as when reading with :class:`rigidity.Rigidity`.
+    Row-level rules are not supported, since they need every column
+    decoded.
+
+    :param infile: the input, opened in binary mode.
+    :param outfile: the output, opened in binary mode.
+    :param rules=[]: the column rules, as a list or as a dict keyed by
+      column position.
+    :param str encoding: the encoding of the ruled columns.
+    :param bytes delimiter: the field delimiter.
+    :param bytes quotechar: the quote character.
+    :param bool header: copy the first record to the output without
+      validating it.
+    :param str direction: 'read' or 'write', selecting which rule
+      method is applied.
+    :returns: the number of rows written, excluding the header.
+    '''
+    if isinstance(rules, dict):
+        keys = rules.keys()
+    else:
+        keys = range(0, len(rules))
+    chains = [(key, [getattr(rule, direction) for rule in rules[key]])
+              for key in keys if rules[key]]
+
+    written = 0
+    source = records(infile, quotechar)
+    if header:
+        for record, terminator in source:
+            outfile.write(record + terminator)
+            break
+
+    for record, terminator in source:
+        fields = split_record(record, delimiter, quotechar)
+        changed = False
+        try:
+            for key, chain in chains:
+                original = decode_field(fields[key], encoding, quotechar)
+                value = original
+                for method in chain:
+                    value = method(value)
+                if value != original or type(value) is not str:
+                    fields[key] = encode_field(value, encoding, delimiter,
+                                               quotechar)
+                    changed = True
+        except rigidity.errors.DropRow:
+            continue
+        if changed:
+            record = delimiter.join(fields)
+        outfile.write(record + terminator)
+        written += 1
+    return written
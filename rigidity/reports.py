@@ -0,0 +1,142 @@
+'''
+Summaries returned by the Rigidity entry points that process a whole
+input rather than returning rows.
+'''
+
+import collections
+
+
+def _rule_name(rule):
+    if rule is None:
+        return None
+    return type(rule).__name__
+
+
+class ScanReport():
+    '''
+    The result of :meth:`rigidity.Rigidity.scan`: whether the input
+    passes the ruleset and, if not, where it fails.
+    '''
+
+    def __init__(self, max_failures=100):
+        '''
+        :param int max_failures: the number of failing row numbers to
+          record in :attr:`failing_rows`.
+        '''
+        self.max_failures = max_failures
+        #: The number of rows scanned.
+        self.rows = 0
+        #: The number of rows for which a rule raised an error.
+        self.failed = 0
+        #: The number of rows a rule asked to drop.
+        self.dropped = 0
+        #: Errors counted by (column, rule name). Row-level rules are
+        #: counted under the column None, and rows missing a column
+        #: under the rule name None.
+        self.errors = collections.Counter()
+        #: Dropped rows counted by (column, rule name).
+        self.drops = collections.Counter()
+        #: The row numbers of the first `max_failures` failing rows.
+        self.failing_rows = []
+
+    @property
+    def passed(self):
+        '''
+        The number of rows that were neither dropped nor failed.
+        '''
+        return self.rows - self.failed - self.dropped
+
+    @property
+    def ok(self):
+        '''
+        True if no row failed validation.
+        '''
+        return self.failed == 0
+
+    def add_error(self, line_num, column, rule):
+        self.failed += 1
+        self.errors[(column, _rule_name(rule))] += 1
+        if len(self.failing_rows) < self.max_failures:
+            self.failing_rows.append(line_num)
+
+    def add_drop(self, column, rule):
+        self.dropped += 1
+        self.drops[(column, _rule_name(rule))] += 1
+
+    def __repr__(self):
+        return '<ScanReport rows=%d passed=%d failed=%d dropped=%d>' % (
+            self.rows, self.passed, self.failed, self.dropped)
+
+
+class SampleReport(ScanReport):
+    '''
+    The result of :func:`rigidity.sampling.sample`: a
+    :class:`ScanReport` over a sample of the input, with estimated
+    error and drop rates.
+    '''
+
+    def __init__(self, max_failures=100):
+        super().__init__(max_failures)
+        #: (column, rule name) pairs of stateful rules, such as
+        #: :class:`~rigidity.rules.Cary` and
+        #: :class:`~rigidity.rules.Unique`, whose results on a sample
+        #: only approximate their results on the whole input. Row-level
+        #: rules are listed under the column None.
+        self.approximate = []
+
+    @property
+    def error_rate(self):
+        '''
+        The estimated fraction of rows that fail validation.
+        '''
+        return self.failed / self.rows if self.rows else 0.0
+
+    @property
+    def drop_rate(self):
+        '''
+        The estimated fraction of rows that are dropped.
+        '''
+        return self.dropped / self.rows if self.rows else 0.0
+
+    def __repr__(self):
+        return '<SampleReport rows=%d error_rate=%.4f drop_rate=%.4f>' % (
+            self.rows, self.error_rate, self.drop_rate)
+
+
+class TransformReport():
+    '''
+    The result of :meth:`rigidity.Rigidity.transform`: how many rows
+    were read, dropped and written, and how quickly.
+    '''
+
+    def __init__(self):
+        #: The number of rows read.
+        self.rows = 0
+        #: The number of rows written.
+        self.written = 0
+        #: The number of rows dropped by the read rules.
+        self.dropped_read = 0
+        #: The number of rows dropped by the write rules.
+        self.dropped_write = 0
+        #: The time taken, in seconds.
+        self.seconds = 0.0
+
+    @property
+    def dropped(self):
+        '''
+        The number of rows dropped by either ruleset.
+        '''
+        return self.dropped_read + self.dropped_write
+
+    @property
+    def rows_per_second(self):
+        '''
+        The number of rows read per second.
+        '''
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return ('<TransformReport rows=%d written=%d dropped=%d '
+                'rows_per_second=%.1f>' % (self.rows, self.written,
+                                           self.dropped,
+                                           self.rows_per_second))
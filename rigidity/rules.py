@@ -1,5 +1,69 @@
+import collections
+import csv
 import ctypes
+import datetime
+import hashlib
+import inspect
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+import rigidity.ahocorasick
 import rigidity.errors
+import rigidity.keyindex
+
+
+class _StripedSet():
+    '''
+    A set divided into stripes, each guarded by its own lock, so that
+    threads adding different values rarely wait for each other.
+    '''
+    STRIPES = 16
+
+    def __init__(self, values=()):
+        self.stripes = [set() for i in range(0, self.STRIPES)]
+        self.locks = [threading.Lock() for i in range(0, self.STRIPES)]
+        self.update(values)
+
+    def add_if_absent(self, value):
+        '''
+        Atomically add a value to the set.
+
+        :returns: True if the value was already present.
+        '''
+        i = hash(value) % self.STRIPES
+        stripe = self.stripes[i]
+        with self.locks[i]:
+            if value in stripe:
+                return True
+            stripe.add(value)
+            return False
+
+    def update(self, values):
+        for value in values:
+            self.add_if_absent(value)
+
+    def __contains__(self, value):
+        return value in self.stripes[hash(value) % self.STRIPES]
+
+    def __iter__(self):
+        for stripe in self.stripes:
+            for value in list(stripe):
+                yield value
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self.stripes)
+
+    def __getstate__(self):
+        return set(self)
+
+    def __setstate__(self, state):
+        self.__init__(state)
 
 
 class Rule():
@@ -7,6 +71,23 @@ class Rule():
     Base rule class implementing a simple apply() method that returns
     the given data unchanged.
     '''
+    #: Set to True by rules whose result depends on the values they
+    #: have previously seen, such as :class:`Cary` and :class:`Unique`.
+    #: Rigidity uses this to decide when values may be evaluated out of
+    #: order or more than once.
+    stateful = False
+    #: Stateful rules set this to True when their state may be updated
+    #: from several threads at once, so that one rule may be shared by
+    #: threads validating rows concurrently. Stateless rules are always
+    #: considered thread-safe. :meth:`rigidity.Rigidity.threaded` does
+    #: not require it, since it applies stateful rules to one batch at
+    #: a time, in order.
+    thread_safe = False
+    #: Increase this in a subclass when a change to the rule changes
+    #: its results in a way :meth:`fingerprint` cannot see, such as a
+    #: change to a helper called by its methods, so that results saved
+    #: by :mod:`rigidity.incremental` are recomputed.
+    version = 0
 
     def apply(self, value):
         '''
@@ -61,6 +142,182 @@ class Rule():
         '''
         return self.apply(value)
 
+    def export_state(self):
+        '''
+        Return the state this rule has accumulated from the values it
+        has seen, so that it can be passed to :meth:`merge_state` on a
+        copy of the rule that processes later input. This allows input
+        to be split between processes while producing the same results
+        as a sequential run.
+
+        :returns: a picklable object, or None if the rule has no state.
+        '''
+        return None
+
+    def merge_state(self, state):
+        '''
+        Update this rule as though it had already seen the input that a
+        copy of the rule summarized with :meth:`export_state`. States
+        are merged in the order of the input they were exported from,
+        and before this rule sees any values.
+
+        :param state: the result of :meth:`export_state`.
+        :raises NotImplementedError: when a stateful rule does not
+          support merging.
+        '''
+        if self.stateful:
+            raise NotImplementedError(
+                '%s does not support merging state' % type(self).__name__)
+
+    def fingerprint(self):
+        '''
+        Describe the rule's type, code and configuration, so that
+        :mod:`rigidity.incremental` can tell whether a ruleset has
+        changed since results were saved. By default, the configuration
+        is the current value of each attribute named after a parameter
+        of the rule's constructor, so that state the rule builds up as
+        it is used is not included, while changes to its settings are.
+        The code of the methods that compute the rule's results, apply(),
+        read() and write(), and prefetch() and resolve() where defined,
+        and its :attr:`version` are included as well.
+
+        Override this method, usually by calling :meth:`_describe`,
+        when the rule keeps a parameter under another name, or when the
+        representation of a setting is not stable between runs, for
+        example because it contains the address of an object; otherwise
+        saved results are never reused. Rules whose results depend on
+        data outside the rule, such as a file, should include a version
+        of that data, or return None.
+
+        :returns: a string, or None when the rule's results must not be
+          saved, including when a parameter of the constructor is not
+          kept in an attribute of the same name.
+        '''
+        configuration = {}
+        parameters = inspect.signature(type(self).__init__).parameters
+        # Skip the rule itself, bound to the first parameter.
+        for parameter in list(parameters.values())[1:]:
+            if parameter.kind in (parameter.VAR_POSITIONAL,
+                                  parameter.VAR_KEYWORD):
+                continue
+            if not hasattr(self, parameter.name):
+                return None
+            configuration[parameter.name] = getattr(self, parameter.name)
+        return self._describe(**configuration)
+
+    def _describe(self, **configuration):
+        '''
+        Build a fingerprint from the rule's class, the code of the
+        methods that compute its results, its :attr:`version` and the
+        given settings.
+        '''
+        rule_type = type(self)
+        digest = hashlib.sha256()
+        for name in ('apply', 'read', 'write', 'prefetch', 'resolve'):
+            method = getattr(rule_type, name, None)
+            code = getattr(method, '__code__', None)
+            if method is None:
+                continue
+            elif code is None:
+                digest.update(repr(method).encode('utf8'))
+            else:
+                _digest_code(code, digest)
+        return '%s.%s[%r:%s]%r' % (
+            rule_type.__module__, rule_type.__qualname__, rule_type.version,
+            digest.hexdigest()[:16], sorted(configuration.items()))
+
+
+def _digest_code(code, digest):
+    '''
+    Add the instructions, names and constants of a code object,
+    including the functions defined in it, to a hash.
+    '''
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode('utf8'))
+    for constant in code.co_consts:
+        if inspect.iscode(constant):
+            _digest_code(constant, digest)
+        elif isinstance(constant, frozenset):
+            # The order of a set depends on the hash seed.
+            digest.update(repr(sorted(map(repr, constant))).encode('utf8'))
+        else:
+            digest.update(repr(constant).encode('utf8'))
+
+
+def _file_version(path):
+    '''
+    Identify the contents of a file by its size and modification time,
+    for use in rule fingerprints.
+    '''
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class RowRule(Rule):
+    '''
+    Base class for row-level rules. Rather than a single cell, the
+    `apply()`, `read()` and `write()` methods of a row rule receive the
+    whole row, after the column rules have been applied, and return the
+    row to be used in its place. Row rules are passed to
+    :class:`rigidity.Rigidity` with the `row_rules` parameter.
+    '''
+
+    def apply(self, row):
+        '''
+        :param row: the row being validated, as a list or dict.
+        :returns: the validated and possibly modified row.
+        :raises rigidity.errors.DropRow: when the rule wants to drop
+          the row.
+        '''
+        return row
+
+
+class CompositeUnique(RowRule):
+    '''
+    Only allow rows whose combination of values in several columns is
+    unique, such as (store_id, sku, date). The values are combined
+    into a tuple, so no joined string is built for each row.
+    '''
+    stateful = True
+    thread_safe = True
+
+    #: When a repeated combination is encountered, raise an exception.
+    ACTION_ERROR = 1
+    #: When a repeated combination is encountered, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, columns, action=ACTION_ERROR):
+        '''
+        :param list columns: the indices or keys of the columns that
+          form the composite key.
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a key is not unique.
+        '''
+        self.columns = tuple(columns)
+        self.action = action
+        self.encountered = _StripedSet()
+
+    def apply(self, row):
+        '''
+        Check that the row's composite key is unique.
+
+        :raises ValueError: when ACTION_ERROR is set and the key is not
+          unique.
+        '''
+        key = tuple([row[column] for column in self.columns])
+        if self.encountered.add_if_absent(key):
+            if self.action == self.ACTION_DROPROW:
+                raise rigidity.errors.DropRow()
+            else:
+                raise ValueError('Composite key not unique')
+        return row
+
+    def export_state(self):
+        return set(self.encountered)
+
+    def merge_state(self, state):
+        self.encountered.update(state)
+
 
 class CapitalizeWords(Rule):
     '''
@@ -102,7 +359,13 @@ class CapitalizeWords(Rule):
 class Cary(Rule):
     '''
     Cary values into subsequent rows lacking values in their column.
+
+    :meth:`rigidity.Rigidity.threaded` applies Cary to batches in
+    order, so values are carried into the first rows of a batch from
+    the last rows of the batch before it.
     '''
+    stateful = True
+
     #: When an empty cell is encountered and no previous fill value is
     #: available, throw an error.
     ACTION_ERROR = 1
@@ -119,25 +382,56 @@ class Cary(Rule):
           ACTION_DEFAULT, or ACTION_DROPROW.
         '''
         self.action = action
+        self.default = default
         self.previous_available = False
         self.previous = default
+        # Whether a value has been seen, rather than only the default.
+        self.adopted = False
+        self.lock = threading.Lock()
 
         if action == self.ACTION_DEFAULT:
             self.previous_available = True
 
     def apply(self, value):
         if value is None or value == '':
-            if self.previous_available:
-                return self.previous
+            # Read both attributes together so another thread cannot
+            #   change one of them in between.
+            with self.lock:
+                previous_available = self.previous_available
+                previous = self.previous
+            if previous_available:
+                return previous
             elif self.action == self.ACTION_ERROR:
                 raise ValueError('Empty cell encountered before a value.')
             elif self.action == self.ACTION_DROPROW:
                 raise rigidity.errors.DropRow()
         else:
-            self.previous = value
-            self.previous_available = True
+            with self.lock:
+                self.previous = value
+                self.previous_available = True
+                self.adopted = True
             return value
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def export_state(self):
+        if self.adopted:
+            return (self.previous,)
+        return None
+
+    def merge_state(self, state):
+        if state is not None:
+            self.previous, = state
+            self.previous_available = True
+            self.adopted = True
+
 
 class Boolean(Rule):
     '''
@@ -198,7 +492,15 @@ class Contains(Rule):
     '''
     Check that a string field value contains the string (or all strings
     in a list of strings) passed as a parameter to this rule.
+
+    With many strings, values are scanned once with an
+    :class:`~rigidity.ahocorasick.Automaton` rather than once per
+    string.
     '''
+    #: The number of strings from which an automaton is used. Below
+    #: this, searching for each string separately is faster.
+    AUTOMATON_THRESHOLD = 64
+
     def __init__(self, string):
         if isinstance(string, str):
             self.strings = [string]
@@ -207,12 +509,370 @@ class Contains(Rule):
         else:
             raise ValueError('string must be a string or a lsit')
 
+        self.automaton = None
+        if len(self.strings) >= self.AUTOMATON_THRESHOLD:
+            self.automaton = rigidity.ahocorasick.Automaton(self.strings)
+
     def apply(self, value):
+        if self.automaton is not None:
+            found = self.automaton.find_all(value)
+            for index, string in enumerate(self.strings):
+                if index not in found:
+                    raise ValueError('String "%s" not in value' % string)
+            return value
+
         for string in self.strings:
             if string not in value:
                 raise ValueError('String "%s" not in value' % string)
         return value
 
+    def fingerprint(self):
+        return self._describe(strings=self.strings)
+
+
+class ContainsAny(Contains):
+    '''
+    Check that a string field value contains at least one of the
+    strings passed as a parameter to this rule.
+    '''
+    def apply(self, value):
+        if self.automaton is not None:
+            if self.automaton.search(value) is not None:
+                return value
+        elif any(string in value for string in self.strings):
+            return value
+        raise ValueError('None of the strings are in value')
+
+
+class ContainsNone(Contains):
+    '''
+    Check that a string field value contains none of the strings passed
+    as a parameter to this rule.
+    '''
+    def apply(self, value):
+        if self.automaton is not None:
+            index = self.automaton.search(value)
+            if index is not None:
+                raise ValueError('String "%s" in value' % self.strings[index])
+            return value
+
+        for string in self.strings:
+            if string in value:
+                raise ValueError('String "%s" in value' % string)
+        return value
+
+
+#: strptime directives the fixed-width date parser understands, with
+#: the datetime argument and the number of digits of each.
+_FIXED_DIRECTIVES = {
+    'Y': ('year', 4),
+    'm': ('month', 2),
+    'd': ('day', 2),
+    'H': ('hour', 2),
+    'M': ('minute', 2),
+    'S': ('second', 2),
+}
+
+
+#: The ISO 8601 forms parsed on versions of Python without
+#: :meth:`datetime.datetime.fromisoformat`.
+_ISO_FORMATS = (
+    '%Y-%m-%d',
+    '%Y-%m-%dT%H:%M',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S.%f',
+)
+
+
+def _fromisoformat(value):
+    '''
+    Parse an ISO 8601 date or timestamp, without a time zone, with
+    strptime. Used before Python 3.7.
+    '''
+    for fmt in _ISO_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError('Invalid isoformat string: %r' % (value,))
+
+
+_fromisoformat = getattr(datetime.datetime, 'fromisoformat', _fromisoformat)
+
+
+def _fixed_width_parser(fmt):
+    '''
+    Build a function that parses values of the strptime format `fmt`
+    by slicing, when every field has a fixed width. The function
+    returns None for values it cannot parse, which should then be
+    passed to strptime, since strptime also accepts values such as
+    unpadded numbers.
+
+    :returns: the function, or None if the format is not supported.
+    '''
+    fields = []
+    literals = []
+    position = 0
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%':
+            directive = _FIXED_DIRECTIVES.get(fmt[i + 1:i + 2])
+            if directive is None:
+                return None
+            name, width = directive
+            fields.append((name, position, position + width))
+            position += width
+            i += 2
+        else:
+            literals.append((position, fmt[i]))
+            position += 1
+            i += 1
+    length = position
+
+    def parse(value):
+        if len(value) != length:
+            return None
+        for offset, char in literals:
+            if value[offset] != char:
+                return None
+        parts = {'year': 1900, 'month': 1, 'day': 1}
+        for name, start, end in fields:
+            digits = value[start:end]
+            if digits.strip('0123456789'):
+                return None
+            parts[name] = int(digits)
+        try:
+            return datetime.datetime(**parts)
+        except ValueError:
+            return None
+    return parse
+
+
+class DateTime(Rule):
+    '''
+    Parse a date or timestamp into a :class:`datetime.datetime` when
+    reading, and format it as a string when writing.
+
+    ISO 8601 values are parsed with :meth:`datetime.datetime.fromisoformat`
+    (before Python 3.7, only the forms without a time zone are accepted),
+    and strptime formats made of fixed-width numeric fields, such as
+    `%Y/%m/%d %H:%M:%S`, by slicing the value; other values fall back
+    to :meth:`datetime.datetime.strptime`. Results are cached by value,
+    since date columns usually repeat the same values many times.
+
+    When a format is inferred from the first value, the rule is
+    stateful, and the chosen format is passed on by
+    :meth:`export_state` so that later parts of a file split between
+    processes are parsed with the same format.
+    '''
+    thread_safe = True
+    #: The format name for ISO 8601 values.
+    FORMAT_ISO = 'iso'
+    #: The formats tried, in order, when none are given.
+    FORMATS = (
+        FORMAT_ISO,
+        '%Y/%m/%d',
+        '%Y/%m/%d %H:%M:%S',
+        '%m/%d/%Y',
+        '%m/%d/%Y %H:%M:%S',
+        '%m/%d/%Y %H:%M',
+        '%d.%m.%Y',
+        '%d.%m.%Y %H:%M:%S',
+        '%d-%b-%Y',
+        '%b %d %Y',
+        '%d %b %Y',
+    )
+
+    #: When invalid data is encountered, raise an exception.
+    ACTION_ERROR = 1
+    #: When invalid data is encountered, return a set default value.
+    ACTION_DEFAULT = 2
+    #: When invalid data is encountered, drop the row.
+    ACTION_DROPROW = 3
+
+    def __init__(self, formats=None, infer=True, action=ACTION_ERROR,
+                 default=None, output_format=None, cache_size=10000):
+        '''
+        :param formats: a strptime format or FORMAT_ISO, or a list of
+          them. Defaults to :attr:`FORMATS`.
+        :param bool infer: use the first format that parses a value for
+          every later value. Otherwise, every format is tried, in order,
+          for each value. Ambiguous formats, such as `%m/%d/%Y` and
+          `%d/%m/%Y`, should be given explicitly, since the first value
+          decides between them.
+        :param action: take the behavior indicated by ACTION_ERROR,
+          ACTION_DEFAULT, or ACTION_DROPROW.
+        :param default: the value returned by ACTION_DEFAULT.
+        :param str output_format: the strptime format used when
+          writing. Defaults to the inferred format or the only format
+          given, and otherwise ISO 8601.
+        :param int cache_size: the number of distinct values whose
+          results are cached. The cache is emptied when it is full.
+        '''
+        if formats is None:
+            formats = self.FORMATS
+        elif isinstance(formats, str):
+            formats = [formats]
+        self.formats = list(formats)
+        self.infer = infer
+        # The first value decides the format of later values.
+        self.stateful = infer and len(self.formats) > 1
+        self.action = action
+        self.default = default
+        self.output_format = output_format
+        self.cache_size = cache_size
+        #: The format chosen from the first value, when inferring.
+        self.format = None
+        self.cache = {}
+        self.parsers = dict((fmt, _fixed_width_parser(fmt))
+                            for fmt in self.formats
+                            if fmt != self.FORMAT_ISO)
+
+    def _parse_format(self, value, fmt):
+        if fmt == self.FORMAT_ISO:
+            return _fromisoformat(value)
+        parser = self.parsers.get(fmt)
+        if parser is not None:
+            result = parser(value)
+            if result is not None:
+                return result
+        return datetime.datetime.strptime(value, fmt)
+
+    def parse(self, value):
+        '''
+        :param str value: the value to parse.
+        :returns: a :class:`datetime.datetime`.
+        :raises ValueError: when no format matches the value.
+        '''
+        result = self.cache.get(value)
+        if result is not None:
+            return result
+
+        formats = [self.format] if self.format is not None else self.formats
+        for fmt in formats:
+            try:
+                result = self._parse_format(value, fmt)
+            except (ValueError, TypeError):
+                continue
+            if self.infer:
+                self.format = fmt
+            break
+        else:
+            raise ValueError('Value is not a recognized date: %r' % (value,))
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[value] = result
+        return result
+
+    def _invalid(self, err):
+        if self.action == self.ACTION_DEFAULT:
+            return self.default
+        elif self.action == self.ACTION_DROPROW:
+            raise rigidity.errors.DropRow()
+        raise err
+
+    def read(self, value):
+        if isinstance(value, datetime.datetime):
+            return value
+        try:
+            return self.parse(value)
+        except ValueError as err:
+            return self._invalid(err)
+
+    def write(self, value):
+        if not isinstance(value, (datetime.date, datetime.datetime)):
+            try:
+                value = self.parse(value)
+            except ValueError as err:
+                return self._invalid(err)
+        fmt = self.output_format or self.format
+        if fmt is None and len(self.formats) == 1:
+            fmt = self.formats[0]
+        if fmt is None or fmt == self.FORMAT_ISO:
+            return value.isoformat()
+        return value.strftime(fmt)
+
+    def export_state(self):
+        if self.format is not None:
+            return (self.format,)
+        return None
+
+    def merge_state(self, state):
+        # The format inferred from the earliest input is kept.
+        if state is not None and self.format is None:
+            self.format, = state
+
+
+class ForeignKey(Rule):
+    '''
+    Check that values exist in a column of another CSV file, such as a
+    product master. The reference column is stored in a compact index
+    file, built once with :meth:`build_index`, that is memory-mapped
+    for lookups so that worker processes share a single copy.
+    '''
+    #: When a value is not in the index, raise an exception.
+    ACTION_ERROR = 1
+    #: When a value is not in the index, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, index, action=ACTION_ERROR):
+        '''
+        :param str index: the path of an index file created by
+          :meth:`build_index`.
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a value is not found.
+        '''
+        self.index = rigidity.keyindex.SortedKeyIndex(index)
+        self.action = action
+
+    @staticmethod
+    def build_index(csvpath, column, index, header=True, encoding='utf8',
+                    **fmtparams):
+        '''
+        Build an index file from one column of a reference CSV file.
+
+        :param str csvpath: the reference CSV file.
+        :param column: the column containing the keys, either as an
+          integer position or, when `header` is set, as a column name.
+        :param str index: the path the index file is written to.
+        :param bool header: the first row of the file is a header and
+          is not included in the index.
+        :param str encoding: the encoding of the reference file.
+        :param fmtparams: formatting parameters passed to
+          :func:`csv.reader`.
+        '''
+        with open(csvpath, newline='', encoding=encoding) as csvfile:
+            reader = csv.reader(csvfile, **fmtparams)
+            if header:
+                names = next(reader, [])
+                if not isinstance(column, int):
+                    column = names.index(column)
+            keys = (row[column].encode('utf8', 'surrogatepass')
+                    for row in reader if row)
+            rigidity.keyindex.SortedKeyIndex.build(keys, index).close()
+
+    def apply(self, value):
+        if isinstance(value, bytes):
+            key = value
+        else:
+            key = str(value).encode('utf8', 'surrogatepass')
+
+        if key in self.index:
+            return value
+        elif self.action == self.ACTION_DROPROW:
+            raise rigidity.errors.DropRow()
+        else:
+            raise ValueError('Value not found in index')
+
+    def fingerprint(self):
+        # Results change when the index is rebuilt.
+        return self._describe(index=self.index.path, action=self.action,
+                              index_version=_file_version(self.index.path))
+
 
 class Integer(Rule):
     '''
@@ -278,6 +938,208 @@ class Float(Rule):
                 raise err
 
 
+class _LookupResults(threading.local):
+    '''
+    The results a :class:`Lookup` keeps for the calling thread.
+    '''
+    def __init__(self):
+        #: Prefetched values that were found, with their results.
+        self.resolved = {}
+        #: Prefetched values that were not found.
+        self.missing = set()
+        #: Values resolved one at a time by apply(), with whether they
+        #: were found and their results.
+        self.fallback = {}
+
+
+class Lookup(Rule):
+    '''
+    Base class for rules that check values against a reference store,
+    such as a database of valid IDs.
+
+    Rather than querying the store once per cell, a lookup rule
+    resolves many distinct values at once with :meth:`resolve`. When
+    rows are validated in batches, :class:`rigidity.Rigidity` collects
+    the distinct values of a column and passes them to
+    :meth:`prefetch`; :meth:`apply` then answers from the prefetched
+    results. Values that were not prefetched are resolved one at a
+    time, and up to :attr:`FALLBACK_SIZE` of their results are kept.
+
+    Results are kept separately for each thread, so that batches
+    validated by :meth:`rigidity.Rigidity.threaded` do not replace
+    each other's results.
+
+    Subclasses only need to implement :meth:`resolve`.
+    '''
+    #: The number of values resolved one at a time whose results are
+    #: kept. The results are discarded when this many are kept.
+    FALLBACK_SIZE = 10000
+
+    #: When a value is not found, drop the row.
+    ACTION_DROPROW = 1
+    #: When a value is not found, return a set default value.
+    ACTION_DEFAULT_VALUE = 2
+    #: When a value is not found, allow the original to pass through.
+    ACTION_PASSTHROUGH = 3
+    #: When a value is not found, raise an exception.
+    ACTION_ERROR = 4
+
+    def __init__(self, missing_action=ACTION_ERROR, default_value=''):
+        '''
+        :param missing_action: when a value is not found in the store,
+          take the behavior specified by ACTION_DROPROW,
+          ACTION_DEFAULT_VALUE, ACTION_PASSTHROUGH, or ACTION_ERROR.
+        :param default_value: if ACTION_DEFAULT_VALUE is the missing
+          value behavior, use this variable as the default value.
+        '''
+        self.missing_action = missing_action
+        self.default_value = default_value
+        self.results = _LookupResults()
+
+    def __getstate__(self):
+        # Results are per thread and cannot be pickled.
+        state = self.__dict__.copy()
+        del state['results']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.results = _LookupResults()
+
+    def resolve(self, values):
+        '''
+        Look up many values in the reference store at once.
+
+        :param list values: distinct values to look up.
+        :returns: a dict mapping each value that was found to its
+          result. Values absent from the dict are treated as missing.
+        '''
+        raise NotImplementedError('Lookup rules must implement resolve()')
+
+    def fingerprint(self):
+        '''
+        :returns: None, since the results depend on the reference
+          store. Subclasses that can identify a version of their store
+          may include it in a fingerprint instead.
+        '''
+        return None
+
+    def prefetch(self, values):
+        '''
+        Resolve `values` with a single call to :meth:`resolve` and keep
+        the results for subsequent calls to :meth:`apply`. Results of
+        any previous prefetch are discarded, which bounds the memory
+        used by the rule to roughly one batch of distinct values, plus
+        :attr:`FALLBACK_SIZE` values resolved one at a time.
+
+        :param values: an iterable of values from a batch of rows.
+        '''
+        values = set(values)
+        resolved = self.resolve(list(values))
+        self.results.resolved = resolved
+        self.results.missing = values.difference(resolved)
+
+    def apply(self, value):
+        results = self.results
+        if value in results.resolved:
+            return results.resolved[value]
+        if value not in results.missing:
+            try:
+                found, result = results.fallback[value]
+            except KeyError:
+                result = self.resolve([value])
+                found = value in result
+                result = result.get(value)
+                if len(results.fallback) >= self.FALLBACK_SIZE:
+                    results.fallback.clear()
+                results.fallback[value] = (found, result)
+            if found:
+                return result
+
+        if self.missing_action == self.ACTION_DROPROW:
+            raise rigidity.errors.DropRow()
+        elif self.missing_action == self.ACTION_PASSTHROUGH:
+            return value
+        elif self.missing_action == self.ACTION_DEFAULT_VALUE:
+            return self.default_value
+        else:
+            raise ValueError('Value not found: %r' % (value,))
+
+
+class SQLiteLookup(Lookup):
+    '''
+    Look up values in a table of a SQLite database. If `value_column`
+    is given, each value is replaced with the matching value from that
+    column; otherwise, the rule only checks that the value exists.
+
+    Keys are compared as stored, so the key column should have TEXT
+    affinity when used with values read from a CSV file.
+    '''
+    #: The number of values bound to a single query. Older SQLite
+    #: releases limit a statement to 999 parameters.
+    QUERY_SIZE = 500
+
+    def __init__(self, database, table, key_column, value_column=None,
+                 missing_action=Lookup.ACTION_ERROR, default_value=''):
+        '''
+        :param str database: the path to the SQLite database file.
+        :param str table: the table containing the reference data.
+        :param str key_column: the column that values are matched
+          against.
+        :param str value_column: the column containing replacement
+          values, or None to only check that values exist.
+        :param missing_action: as accepted by :class:`Lookup`.
+        :param default_value: as accepted by :class:`Lookup`.
+        '''
+        super().__init__(missing_action, default_value)
+        self.database = database
+        self.table = table
+        self.key_column = key_column
+        self.value_column = value_column
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+
+        columns = self._quote(key_column)
+        if value_column is not None:
+            columns += ', ' + self._quote(value_column)
+        self.query = 'SELECT %s FROM %s WHERE %s IN (%%s)' % (
+            columns, self._quote(table), self._quote(key_column))
+
+    def __getstate__(self):
+        # Connections cannot be pickled; worker processes reconnect.
+        state = super().__getstate__()
+        del state['connection']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.connection = sqlite3.connect(self.database,
+                                          check_same_thread=False)
+
+    def fingerprint(self):
+        # Results change when the database is written to, including
+        #   writes still held in its write-ahead log.
+        versions = [_file_version(self.database)]
+        if os.path.exists(self.database + '-wal'):
+            versions.append(_file_version(self.database + '-wal'))
+        fingerprint = Rule.fingerprint(self)
+        if fingerprint is not None:
+            fingerprint += repr(versions)
+        return fingerprint
+
+    @staticmethod
+    def _quote(identifier):
+        return '"%s"' % identifier.replace('"', '""')
+
+    def resolve(self, values):
+        results = {}
+        for i in range(0, len(values), self.QUERY_SIZE):
+            chunk = values[i:i + self.QUERY_SIZE]
+            query = self.query % ', '.join('?' * len(chunk))
+            for record in self.connection.execute(query, chunk):
+                results[record[0]] = record[-1]
+        return results
+
+
 class NoneToEmptyString(Rule):
     '''
     Replace None values with an empty string. This is useful in cases
@@ -368,24 +1230,45 @@ class Static(Rule):
     def apply(self, value):
         return self.static_value
 
+    def fingerprint(self):
+        return self._describe(value=self.static_value)
+
 
 class Unique(Rule):
     '''
     Only allow unique values to pass. When a repeated value is found,
     the row may be dropped or an error may be raised.
+
+    Uniqueness may be enforced across runs by passing the path of a key
+    index. Keys from previous runs are memory-mapped from that file as
+    a read-only base layer, while keys first seen in this run are kept
+    in memory until :meth:`save` writes them back to the index.
+
+    The in-memory keys are divided between lock-striped sets, so the
+    rule may be shared by threads validating rows concurrently.
     '''
+    stateful = True
+    thread_safe = True
+
     #: When repeat data is encountered, raise an exception.
     ACTION_ERROR = 1
     #: When repeat data is encountered, drop the row.
     ACTION_DROPROW = 2
 
-    def __init__(self, action=ACTION_ERROR):
+    def __init__(self, action=ACTION_ERROR, index=None):
         '''
         :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
           the behavior to be performed when a value is not unique.
+        :param str index: the path of a key index written by
+          :meth:`save` during a previous run. If the file does not
+          exist yet, the rule starts empty.
         '''
         self.action = action
-        self.encountered = []
+        self.index = index
+        self.encountered = _StripedSet()
+        self.base = None
+        if index is not None and os.path.exists(index):
+            self.base = rigidity.keyindex.SortedKeyIndex(index)
 
     def apply(self, value):
         '''
@@ -394,16 +1277,304 @@ class Unique(Rule):
         :raises ValueError: when ACTION_ERROR is set and the value is
           not unique.
         '''
-        if value in self.encountered:
+        if ((self.base is not None and
+             rigidity.keyindex.encode_value(value) in self.base) or
+                self.encountered.add_if_absent(value)):
             if self.action == self.ACTION_ERROR:
                 raise ValueError('Value not unique')
             elif self.action == self.ACTION_DROPROW:
                 raise rigidity.errors.DropRow()
             else:
                 raise ValueError('Invalid action set')
-        self.encountered.append(value)
         return value
 
+    def export_state(self):
+        # The base layer is shared through the index file.
+        return set(self.encountered)
+
+    def merge_state(self, state):
+        self.encountered.update(state)
+
+    def save(self, index=None):
+        '''
+        Write every key seen by this rule, including those of the base
+        layer, to a key index that a later run can load.
+
+        :param str index: the path to write to. Defaults to the index
+          the rule was created with.
+        '''
+        if index is None:
+            index = self.index
+        if index is None:
+            raise ValueError('No index path given')
+        keys = (rigidity.keyindex.encode_value(v) for v in self.encountered)
+        rigidity.keyindex.SortedKeyIndex.merge(self.base, keys, index).close()
+
+
+class BloomUnique(Rule):
+    '''
+    Only allow unique values to pass, using a fixed amount of memory.
+    Seen values are recorded in a Bloom filter, so a small fraction of
+    unique values, close to `error_rate`, are treated as repeats.
+    Repeated values are always detected.
+
+    The state of the filter may be saved with :meth:`save` and used to
+    continue checking uniqueness in a later run.
+    '''
+    stateful = True
+
+    #: When repeat data is encountered, raise an exception.
+    ACTION_ERROR = 1
+    #: When repeat data is encountered, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, capacity, error_rate=0.001, action=ACTION_ERROR,
+                 state=None):
+        '''
+        :param int capacity: the expected number of distinct values.
+        :param float error_rate: the target rate at which unique values
+          are reported as repeats once `capacity` values were seen.
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a value is not unique.
+        :param str state: the path of a filter written by :meth:`save`.
+          If the file exists, it is loaded and `capacity` and
+          `error_rate` are ignored.
+        '''
+        self.action = action
+        if state is not None and os.path.exists(state):
+            self.filter = rigidity.keyindex.BloomFilter.load(state)
+        else:
+            self.filter = rigidity.keyindex.BloomFilter(capacity, error_rate)
+
+    def apply(self, value):
+        '''
+        Check that a value is (probably) unique.
+
+        :raises ValueError: when ACTION_ERROR is set and the value is
+          not unique.
+        '''
+        if self.filter.add(rigidity.keyindex.encode_value(value)):
+            if self.action == self.ACTION_DROPROW:
+                raise rigidity.errors.DropRow()
+            else:
+                raise ValueError('Value not unique')
+        return value
+
+    def export_state(self):
+        return self.filter.to_bytes()
+
+    def merge_state(self, state):
+        self.filter.update(rigidity.keyindex.BloomFilter.from_bytes(state))
+
+    def fingerprint(self):
+        # The filter's contents are state, so only its shape is used.
+        return self._describe(action=self.action, size=self.filter.size,
+                              hashes=self.filter.hashes)
+
+    def save(self, state):
+        '''
+        Write the filter to `state` so that a later run can continue
+        from it.
+        '''
+        self.filter.save(state)
+
+
+class WindowedUnique(Rule):
+    '''
+    Only allow values that have not been seen within a sliding window
+    to pass. The window may be limited to the most recently accepted
+    `max_keys` values, to values accepted within the last `seconds`
+    seconds, or both. Older values are forgotten, so memory stays
+    bounded for processes that run indefinitely.
+    '''
+    stateful = True
+
+    #: When repeat data is encountered, raise an exception.
+    ACTION_ERROR = 1
+    #: When repeat data is encountered, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, action=ACTION_ERROR, max_keys=None, seconds=None,
+                 clock=time.monotonic):
+        '''
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a value is not unique.
+        :param int max_keys: remember at most this many values.
+        :param float seconds: forget values accepted more than this
+          many seconds ago.
+        :param clock: a function returning the current time in seconds.
+        '''
+        if max_keys is None and seconds is None:
+            raise ValueError('max_keys or seconds must be set')
+        self.action = action
+        self.max_keys = max_keys
+        self.seconds = seconds
+        self.clock = clock
+        # Values in the order they were accepted, mapped to the time at
+        #   which they were accepted; the oldest is evicted first.
+        self.encountered = collections.OrderedDict()
+
+    def evict(self):
+        '''
+        Forget values that were accepted more than `seconds` seconds
+        ago.
+        '''
+        encountered = self.encountered
+        if self.seconds is not None:
+            cutoff = self.clock() - self.seconds
+            while encountered and next(iter(encountered.values())) <= cutoff:
+                encountered.popitem(last=False)
+
+    def apply(self, value):
+        '''
+        Check that a value is unique within the window.
+
+        :raises ValueError: when ACTION_ERROR is set and the value is
+          not unique.
+        '''
+        self.evict()
+        if value in self.encountered:
+            if self.action == self.ACTION_DROPROW:
+                raise rigidity.errors.DropRow()
+            else:
+                raise ValueError('Value not unique')
+        if self.seconds is not None:
+            self.encountered[value] = self.clock()
+        else:
+            self.encountered[value] = None
+        if self.max_keys is not None and len(self.encountered) > self.max_keys:
+            self.encountered.popitem(last=False)
+        return value
+
+    def export_state(self):
+        return collections.OrderedDict(self.encountered)
+
+    def merge_state(self, state):
+        # Merged states follow the input we have already seen, so their
+        #   values are newer than ours and go after them.
+        encountered = self.encountered
+        for value, accepted in state.items():
+            encountered.pop(value, None)
+            encountered[value] = accepted
+        if self.max_keys is not None:
+            while len(self.encountered) > self.max_keys:
+                self.encountered.popitem(last=False)
+
+
+class SpillingUnique(Rule):
+    '''
+    Only allow unique values to pass, keeping at most `memory_keys`
+    values in memory. When the budget is exceeded, the values in memory
+    are hash-partitioned and written to sorted, memory-mapped run files
+    in a temporary directory. New values are then checked against the
+    runs of their own partition only.
+
+    Runs in a partition are merged whenever the newest run is at least
+    half the size of the one before it, so each partition holds a
+    logarithmic number of runs.
+    '''
+    stateful = True
+
+    #: When repeat data is encountered, raise an exception.
+    ACTION_ERROR = 1
+    #: When repeat data is encountered, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, action=ACTION_ERROR, memory_keys=1000000,
+                 partitions=64, directory=None):
+        '''
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a value is not unique.
+        :param int memory_keys: the number of values kept in memory
+          before they are written to disk.
+        :param int partitions: the number of partitions spilled values
+          are divided between.
+        :param str directory: the directory in which the temporary run
+          directory is created. Defaults to the system's temporary
+          directory.
+        '''
+        self.action = action
+        self.memory_keys = memory_keys
+        self.partitions = partitions
+        self.encountered = set()
+        self.runs = [[] for i in range(0, partitions)]
+        self.spills = 0
+        self.directory = tempfile.mkdtemp(prefix='rigidity-', dir=directory)
+        self._finalizer = weakref.finalize(self, shutil.rmtree,
+                                           self.directory, True)
+
+    def apply(self, value):
+        '''
+        Check that a value is unique.
+
+        :raises ValueError: when ACTION_ERROR is set and the value is
+          not unique.
+        '''
+        key = rigidity.keyindex.encode_value(value)
+        if key in self.encountered or self.spilled(key):
+            if self.action == self.ACTION_DROPROW:
+                raise rigidity.errors.DropRow()
+            else:
+                raise ValueError('Value not unique')
+        self.encountered.add(key)
+        if len(self.encountered) >= self.memory_keys:
+            self.spill()
+        return value
+
+    def spilled(self, key):
+        '''
+        :param bytes key: an encoded value.
+        :returns: True if the key was written to disk by :meth:`spill`.
+        '''
+        for run in self.runs[zlib.crc32(key) % self.partitions]:
+            if key in run:
+                return True
+        return False
+
+    def spill(self):
+        '''
+        Write the values held in memory to a new run in each partition.
+        '''
+        groups = collections.defaultdict(list)
+        for key in self.encountered:
+            groups[zlib.crc32(key) % self.partitions].append(key)
+
+        for partition, keys in groups.items():
+            runs = self.runs[partition]
+            runs.append(rigidity.keyindex.SortedKeyIndex.build(
+                keys, self._run_path(partition)))
+            while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+                older, newer = runs.pop(-2), runs.pop()
+                runs.append(rigidity.keyindex.SortedKeyIndex.combine(
+                    [older, newer], self._run_path(partition)))
+                for run in (older, newer):
+                    run.close()
+                    os.remove(run.path)
+
+        self.encountered = set()
+
+    def _run_path(self, partition):
+        self.spills += 1
+        return os.path.join(self.directory,
+                            'p%04d-%08d.idx' % (partition, self.spills))
+
+    def close(self):
+        '''
+        Remove the spilled runs from disk. The rule must not be used
+        afterwards.
+        '''
+        for runs in self.runs:
+            for run in runs:
+                run.close()
+        self.runs = [[] for i in range(0, self.partitions)]
+        self._finalizer()
+
+    def fingerprint(self):
+        # The directory holding the runs is created for each rule.
+        return self._describe(action=self.action,
+                              memory_keys=self.memory_keys,
+                              partitions=self.partitions)
+
 
 class Drop(Rule):
     '''
@@ -428,6 +1599,9 @@ class Strip(Rule):
     def apply(self, value):
         return value.strip(*self.strip_args)
 
+    def fingerprint(self):
+        return self._describe(chars=self.strip_args)
+
 
 class UpcA(Rule):
     '''
@@ -486,3 +1660,202 @@ class Upper(Rule):
     '''
     def apply(self, value):
         return value.upper()
+
+
+class _MatchResults(threading.local):
+    '''
+    The prefetched results a :class:`Match` keeps for the calling
+    thread.
+    '''
+    def __init__(self):
+        self.matched = set()
+        self.unmatched = set()
+
+
+class Match(Rule):
+    '''
+    Check that the whole value matches a regular expression. The
+    expression is compiled once, when the rule is created.
+
+    When `batch` is set and rows are validated in batches,
+    :meth:`prefetch` checks the distinct values of a batch with one
+    search over the values joined by line breaks, rather than one match
+    per value. This is only done for expressions without groups,
+    anchors, word boundaries or lookarounds, whose meaning could change
+    when the values are joined; values containing line breaks are
+    matched individually, matches are verified to cover exactly one
+    value, and values the search cannot decide are matched
+    individually too. Results are kept separately for each thread, as
+    with :class:`Lookup`. Batch matching pays off for batches with many
+    short distinct values; by default, every value is matched on its
+    own, and :class:`rigidity.Rigidity` does not read rows ahead for
+    the rule.
+    '''
+    #: When the value does not match, raise an exception.
+    ACTION_ERROR = 1
+    #: When the value does not match, drop the row.
+    ACTION_DROPROW = 2
+
+    #: Fragments of an expression that prevent batch matching.
+    UNBATCHABLE = ('^', '$', '\\A', '\\Z', '\\b', '\\B', '(?=', '(?!',
+                   '(?<')
+
+    def __init__(self, pattern, action=ACTION_ERROR, flags=0, batch=False):
+        '''
+        :param pattern: a regular expression, as a string or compiled.
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when a value does not match.
+        :param int flags: flags passed to :func:`re.compile`.
+        :param bool batch: match the values of a batch with one search
+          in :meth:`prefetch`.
+        '''
+        self.regex = re.compile(pattern, flags)
+        self.action = action
+        self.batch = batch
+        self.results = _MatchResults()
+
+        self.batch_regex = None
+        if (batch and isinstance(self.regex.pattern, str) and
+                not self.regex.groups and
+                not any(fragment in self.regex.pattern
+                        for fragment in self.UNBATCHABLE)):
+            try:
+                self.batch_regex = re.compile(
+                    '^(?:%s)$' % self.regex.pattern,
+                    self.regex.flags | re.MULTILINE)
+            except re.error:
+                pass
+
+    def __getstate__(self):
+        # Results are per thread and cannot be pickled.
+        state = self.__dict__.copy()
+        del state['results']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.results = _MatchResults()
+
+    def prefetch(self, values):
+        '''
+        Decide which of `values` match with a single search, keeping the
+        results for subsequent calls to :meth:`apply`. Results of any
+        previous prefetch are discarded.
+
+        :param values: an iterable of values from a batch of rows.
+        '''
+        results = self.results
+        results.matched = set()
+        results.unmatched = set()
+        if self.batch_regex is None:
+            return
+        if not isinstance(values, (set, frozenset)):
+            values = set(values)
+        try:
+            joined = '\n'.join(values)
+        except TypeError:
+            values = set(value for value in values if isinstance(value, str))
+            joined = '\n'.join(values)
+        if joined.count('\n') != len(values) - 1:
+            # Values containing line breaks are matched individually.
+            values = set(value for value in values if '\n' not in value)
+            joined = '\n'.join(values)
+        if not values:
+            return
+
+        # With MULTILINE, a match that does not contain a line break
+        #   covers exactly one value. A match that does may hide matches
+        #   of the values it covers, so they are left undecided.
+        found = self.batch_regex.findall(joined)
+        if not found or '\n'.join(found).count('\n') == len(found) - 1:
+            results.matched = set(found)
+            results.unmatched = values - results.matched
+        else:
+            results.matched = set(match for match in found
+                                  if '\n' not in match)
+
+    def apply(self, value):
+        results = self.results
+        if value in results.matched:
+            return value
+        if value not in results.unmatched and self.regex.fullmatch(value):
+            return value
+
+        if self.action == self.ACTION_DROPROW:
+            raise rigidity.errors.DropRow()
+        raise ValueError('Value does not match %r' % self.regex.pattern)
+
+    def fingerprint(self):
+        return self._describe(pattern=self.regex.pattern,
+                              flags=self.regex.flags, action=self.action)
+
+
+class Extract(Rule):
+    '''
+    Replace a value with the part of it matched by a regular expression
+    or by a group of the expression. The expression is compiled once,
+    when the rule is created.
+    '''
+    #: When the expression is not found, raise an exception.
+    ACTION_ERROR = 1
+    #: When the expression is not found, drop the row.
+    ACTION_DROPROW = 2
+
+    def __init__(self, pattern, group=None, action=ACTION_ERROR, flags=0):
+        '''
+        :param pattern: a regular expression, as a string or compiled.
+        :param group: the number or name of the group to return. By
+          default, the first group if the expression has groups, and
+          otherwise the whole match.
+        :param action: Accepts either ACTION_ERROR or ACTION_DROPROW as
+          the behavior to be performed when the expression is not found.
+        :param int flags: flags passed to :func:`re.compile`.
+        '''
+        self.regex = re.compile(pattern, flags)
+        if group is None:
+            group = 1 if self.regex.groups else 0
+        self.group = group
+        self.action = action
+
+    def apply(self, value):
+        found = self.regex.search(value)
+        if found is not None:
+            return found.group(self.group)
+
+        if self.action == self.ACTION_DROPROW:
+            raise rigidity.errors.DropRow()
+        raise ValueError('Value does not contain %r' % self.regex.pattern)
+
+    def fingerprint(self):
+        return self._describe(pattern=self.regex.pattern,
+                              flags=self.regex.flags, group=self.group,
+                              action=self.action)
+
+
+class Substitute(Rule):
+    '''
+    Replace the parts of a value matched by a regular expression, as
+    :func:`re.sub` does. The expression is compiled once, when the rule
+    is created.
+    '''
+
+    def __init__(self, pattern, replacement, count=0, flags=0):
+        '''
+        :param pattern: a regular expression, as a string or compiled.
+        :param replacement: the replacement string or function, as
+          accepted by :func:`re.sub`.
+        :param int count: the maximum number of replacements; zero
+          replaces every match.
+        :param int flags: flags passed to :func:`re.compile`.
+        '''
+        self.regex = re.compile(pattern, flags)
+        self.replacement = replacement
+        self.count = count
+
+    def apply(self, value):
+        return self.regex.sub(self.replacement, value, self.count)
+
+    def fingerprint(self):
+        return self._describe(pattern=self.regex.pattern,
+                              flags=self.regex.flags,
+                              replacement=self.replacement, count=self.count)
@@ -0,0 +1,196 @@
+'''
+Fast, approximate validation of large files by validating a sample of
+their rows.
+
+On seekable files, :func:`sample` seeks to random byte offsets and
+resynchronizes on the next record boundary, so only the sampled
+records are read. Other inputs are sampled with a single pass of
+reservoir sampling.
+'''
+
+import csv
+import io
+import os
+import random
+
+import rigidity
+import rigidity.compression
+import rigidity.reports
+
+
+#: The types accepted as file names; path-like objects need Python 3.6.
+_PATH_TYPES = (str, bytes) + ((os.PathLike,) if hasattr(os, 'PathLike')
+                              else ())
+
+#: Pick offsets uniformly at random from the whole file.
+SAMPLE_RANDOM = 'random'
+#: Divide the file into equally sized byte ranges and pick one offset
+#: at random from each, spreading the sample evenly over the file.
+SAMPLE_STRATIFIED = 'stratified'
+
+
+class _SampledRows():
+    '''
+    An iterator over sampled rows that exposes the position of the
+    current row as `line_num`, for use by :meth:`rigidity.Rigidity.scan`.
+    '''
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.line_num = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.line_num, row = next(self.rows)
+        return row
+
+
+def sample(source, rules=[], size=1000, method=SAMPLE_RANDOM, seed=None,
+           header=False, encoding='utf8', row_rules=[], max_failures=100,
+           **fmtparams):
+    '''
+    Validate a sample of the rows of a CSV file and estimate its error
+    and drop rates.
+
+    Stateless rules run normally. Stateful rules, such as
+    :class:`~rigidity.rules.Cary` and :class:`~rigidity.rules.Unique`,
+    only see the sampled rows; they are listed in the report's
+    :attr:`~rigidity.reports.SampleReport.approximate` attribute.
+
+    Records are found by seeking to a byte offset and skipping to the
+    start of the next line, so files whose quoted fields contain line
+    breaks may occasionally be resynchronized inside a record.
+
+    :param source: the path of a CSV file, as a str, bytes or
+      path-like object, or a binary file object.
+      Compressed files, recognized by their extension, are sampled in
+      a single pass, since they cannot be read at random offsets.
+    :param rules=[]: the column rules, as accepted by
+      :class:`rigidity.Rigidity`.
+    :param int size: the number of rows to sample.
+    :param method: SAMPLE_RANDOM or SAMPLE_STRATIFIED. Inputs that are
+      not seekable are always sampled uniformly.
+    :param seed: a seed for the random number generator, for
+      reproducible samples.
+    :param bool header: the first line of the file is a header and is
+      never sampled.
+    :param str encoding: the encoding of the file.
+    :param row_rules=[]: row-level rules, as accepted by
+      :class:`rigidity.Rigidity`.
+    :param int max_failures: the number of failing rows recorded in
+      the report. For seekable inputs, failing rows are identified by
+      the byte offset of the record rather than its line number.
+    :param fmtparams: formatting parameters passed to
+      :func:`csv.reader`.
+    :returns: a :class:`~rigidity.reports.SampleReport`.
+    '''
+    if isinstance(source, _PATH_TYPES):
+        with rigidity.compression.open_file(source, 'rb') as csvfile:
+            return sample(csvfile, rules, size, method, seed, header,
+                          encoding, row_rules, max_failures, **fmtparams)
+
+    rng = random.Random(seed)
+    if _seekable(source):
+        rows = _sample_seekable(source, size, method, rng, header, encoding,
+                                fmtparams)
+    else:
+        rows = _sample_stream(source, size, rng, header, encoding, fmtparams)
+
+    r = rigidity.Rigidity(_SampledRows(rows), rules, row_rules=row_rules)
+    report = rigidity.reports.SampleReport(max_failures)
+    for key in r.keys:
+        for rule in rules[key]:
+            if getattr(rule, 'stateful', False):
+                report.approximate.append((key, type(rule).__name__))
+    for rule in row_rules:
+        if getattr(rule, 'stateful', False):
+            report.approximate.append((None, type(rule).__name__))
+
+    return r.scan(max_failures, report)
+
+
+def _seekable(source):
+    try:
+        return source.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _sample_seekable(source, size, method, rng, header, encoding,
+                     fmtparams):
+    '''
+    :returns: a list of (byte offset, row) pairs in file order.
+    '''
+    source.seek(0)
+    if header:
+        source.readline()
+    start = source.tell()
+    end = source.seek(0, io.SEEK_END)
+    if end <= start or size < 1:
+        return []
+
+    width = (end - start) / size
+    if method == SAMPLE_STRATIFIED:
+        offsets = [start + int((i + rng.random()) * width)
+                   for i in range(0, size)]
+    else:
+        offsets = sorted(rng.randrange(start, end) for i in range(0, size))
+
+    quotechar = fmtparams.get('quotechar', '"').encode(encoding)
+    rows = []
+    seen = set()
+    for offset in offsets:
+        # An offset of `start` is already on a record boundary; any
+        #   other offset is moved to the start of the next line.
+        source.seek(offset - 1 if offset > start else start)
+        if offset > start:
+            source.readline()
+        position = source.tell()
+        record = source.readline()
+        # Keep reading while a quoted field is left open.
+        while record and record.count(quotechar) % 2:
+            line = source.readline()
+            if not line:
+                break
+            record += line
+        if not record or position in seen:
+            continue
+        seen.add(position)
+        try:
+            text = record.decode(encoding)
+            rows.extend((position, row) for row in
+                        csv.reader(io.StringIO(text, newline=''), **fmtparams))
+        except (UnicodeDecodeError, csv.Error):
+            # The offset was resynchronized inside a record.
+            continue
+    return rows
+
+
+def _sample_stream(source, size, rng, header, encoding, fmtparams):
+    '''
+    Reservoir sample `size` rows from a file that cannot seek.
+
+    :returns: a list of (line number, row) pairs in file order.
+    '''
+    if isinstance(source, io.TextIOBase):
+        text = source
+    else:
+        text = io.TextIOWrapper(source, encoding=encoding, newline='')
+    reader = csv.reader(text, **fmtparams)
+    if header:
+        next(reader, None)
+
+    reservoir = []
+    for i, row in enumerate(reader):
+        if i < size:
+            reservoir.append((reader.line_num, row))
+        else:
+            j = rng.randrange(0, i + 1)
+            if j < size:
+                reservoir[j] = (reader.line_num, row)
+    if text is not source:
+        # Leave the caller's file open.
+        text.detach()
+    reservoir.sort(key=lambda item: item[0])
+    return reservoir
@@ -0,0 +1,361 @@
+'''
+Validate a large CSV file in several worker processes.
+
+:func:`process_file` splits the input into byte ranges that start on
+record boundaries and validates each range in its own process with
+its own copy of the ruleset. The outputs are concatenated in order.
+
+When the input contains no quote or escape characters, every line is
+a record, and ranges are found by seeking. Otherwise a quoted field
+may contain line breaks, so the records are read with :func:`csv.reader`
+to find where ranges can start; this is a single pass over the file,
+without validation.
+
+Stateful rules, such as :class:`~rigidity.rules.Cary` and
+:class:`~rigidity.rules.Unique`, would give different results if each
+range started from an empty state. When the ruleset contains them, the
+input is processed in two passes: the first pass records the state each
+range contributes with :meth:`~rigidity.rules.Rule.export_state`, and
+the second pass validates each range after merging, with
+:meth:`~rigidity.rules.Rule.merge_state`, the states of every range
+before it.
+
+Compressed inputs cannot be divided into byte ranges, so they are
+validated in a single pass in the calling process. Compressed outputs
+are compressed in a background thread while the ranges are copied.
+
+A range in which rows fail or are dropped during the first pass, for
+example because no value could be carried into its first rows, is
+summarized a second time starting from the states of the ranges before
+it. This matches a sequential run unless the state a range contributes
+depends on state carried across several ranges.
+'''
+
+import concurrent.futures
+import copy
+import csv
+import os
+import shutil
+import tempfile
+
+import rigidity
+import rigidity.compression
+import rigidity.rules
+
+
+def split_ranges(path, shards, header=False, encoding='utf8',
+                 **fmtparams):
+    '''
+    Divide a file into byte ranges of roughly equal size that each
+    start at the beginning of a record.
+
+    :param str path: the file to divide.
+    :param int shards: the number of ranges to produce. Fewer ranges
+      are returned for files with fewer records.
+    :param bool header: exclude the first record of the file from the
+      ranges.
+    :param str encoding: the encoding of the file.
+    :param fmtparams: formatting parameters, as passed to
+      :func:`csv.reader`.
+    :returns: a list of (start, end) byte offsets.
+    '''
+    dialect = csv.reader([], **fmtparams).dialect
+    special = []
+    if dialect.quoting != csv.QUOTE_NONE and dialect.quotechar:
+        special.append(dialect.quotechar.encode(encoding))
+    if dialect.escapechar:
+        special.append(dialect.escapechar.encode(encoding))
+
+    with open(path, 'rb') as csvfile:
+        end = os.path.getsize(path)
+        if _contains(csvfile, special):
+            csvfile.seek(0)
+            return _split_records(csvfile, end, shards, header, encoding,
+                                  fmtparams)
+
+        csvfile.seek(0)
+        if header:
+            csvfile.readline()
+        start = csvfile.tell()
+
+        boundaries = [start]
+        for i in range(1, shards):
+            offset = start + (end - start) * i // shards
+            # Move to the first line starting at or after the offset.
+            csvfile.seek(max(offset - 1, start))
+            if offset > start:
+                csvfile.readline()
+            position = min(csvfile.tell(), end)
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        boundaries.append(end)
+    return _pairs(boundaries)
+
+
+def _pairs(boundaries):
+    return [(boundaries[i], boundaries[i + 1])
+            for i in range(0, len(boundaries) - 1)
+            if boundaries[i] < boundaries[i + 1]]
+
+
+def _contains(csvfile, strings, chunk_size=1 << 20):
+    '''
+    :returns: whether any of `strings`, each a single character, occurs
+      in the file.
+    '''
+    if not strings:
+        return False
+    while True:
+        chunk = csvfile.read(chunk_size)
+        if not chunk:
+            return False
+        if any(string in chunk for string in strings):
+            return True
+
+
+class _Lines():
+    '''
+    The decoded lines of a binary file, counting the bytes read so that
+    the offset of the next record is known after csv.reader returns a
+    record.
+    '''
+
+    def __init__(self, csvfile, encoding):
+        self.csvfile = csvfile
+        self.encoding = encoding
+        self.position = csvfile.tell()
+
+    def __iter__(self):
+        for line in self.csvfile:
+            self.position += len(line)
+            yield line.decode(self.encoding)
+
+
+def _split_records(csvfile, end, shards, header, encoding, fmtparams):
+    '''
+    Divide a file into ranges by reading its records, so that ranges
+    do not start inside a quoted field containing a line break.
+    '''
+    lines = _Lines(csvfile, encoding)
+    records = csv.reader(lines, **fmtparams)
+    if header:
+        next(records, None)
+    start = lines.position
+
+    boundaries = [start]
+    targets = [start + (end - start) * i // shards
+               for i in range(1, shards)]
+    targets.reverse()
+    while targets:
+        # Each record is read in full, so the position is the start of
+        #   the next one.
+        if lines.position >= targets[-1]:
+            if lines.position > boundaries[-1]:
+                boundaries.append(lines.position)
+            while targets and targets[-1] <= lines.position:
+                targets.pop()
+        elif next(records, None) is None:
+            break
+    boundaries.append(end)
+    return _pairs([min(boundary, end) for boundary in boundaries])
+
+
+def _read_range(path, start, end, encoding):
+    '''
+    Yield the decoded lines of `path` between the byte offsets `start`
+    and `end`.
+    '''
+    with open(path, 'rb') as csvfile:
+        csvfile.seek(start)
+        position = start
+        while position < end:
+            line = csvfile.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode(encoding)
+
+
+def _merged_rules(rules, row_rules, states):
+    '''
+    Copy a ruleset and merge the states exported by earlier ranges, in
+    order, into the copy.
+    '''
+    rules, row_rules = copy.deepcopy((rules, row_rules))
+    for column_states, row_states in states:
+        for key, chain_states in column_states.items():
+            for rule, state in zip(rules[key], chain_states):
+                rule.merge_state(state)
+        for rule, state in zip(row_rules, row_states):
+            rule.merge_state(state)
+    return rules, row_rules
+
+
+def _shard_state(path, start, end, rules, row_rules, states, encoding,
+                 fmtparams):
+    '''
+    First pass: validate a range after merging the states of earlier
+    ranges, if any are known yet, and export the state of every rule.
+    Errors are not raised, since they may be caused by state that is
+    still missing.
+
+    :returns: the exported states, and whether any row failed or was
+      dropped.
+    '''
+    rules, row_rules = _merged_rules(rules, row_rules, states)
+    reader = csv.reader(_read_range(path, start, end, encoding), **fmtparams)
+    r = rigidity.Rigidity(reader, rules, row_rules=row_rules)
+    report = r.scan(max_failures=0)
+    column_states = dict((key, [rule.export_state() for rule in rules[key]])
+                         for key in r.keys)
+    row_states = [rule.export_state() for rule in row_rules]
+    return (column_states, row_states), bool(report.failed or report.dropped)
+
+
+def _shard_output(path, start, end, rules, row_rules, states, output,
+                  encoding, fmtparams):
+    '''
+    Second pass: validate a range after merging the states of earlier
+    ranges, and write the valid rows to `output`.
+
+    :returns: the number of rows written.
+    '''
+    rules, row_rules = _merged_rules(rules, row_rules, states)
+    reader = csv.reader(_read_range(path, start, end, encoding), **fmtparams)
+    r = rigidity.Rigidity(reader, rules, row_rules=row_rules)
+    written = 0
+    with open(output, 'w', newline='', encoding=encoding) as outfile:
+        writer = csv.writer(outfile, **fmtparams)
+        for row in r:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def _all_rules(rules, row_rules):
+    keys = rules.keys() if isinstance(rules, dict) else range(0, len(rules))
+    for key in keys:
+        for rule in rules[key]:
+            yield rule
+    for rule in row_rules:
+        yield rule
+
+
+def _check_mergeable(rules, row_rules):
+    for rule in _all_rules(rules, row_rules):
+        if (getattr(rule, 'stateful', False) and
+                type(rule).merge_state is rigidity.rules.Rule.merge_state):
+            raise ValueError('%s does not support merging state'
+                             % type(rule).__name__)
+
+
+def _process_stream(path, output, rules, row_rules, header, encoding,
+                    fmtparams):
+    '''
+    Validate a file that cannot be divided into ranges, such as a
+    compressed file, in a single pass.
+    '''
+    open_file = rigidity.compression.open_file
+    with open_file(path, 'r', encoding=encoding, newline='') as infile, \
+            open_file(output, 'w', encoding=encoding, newline='') as outfile:
+        if header:
+            outfile.write(infile.readline())
+        r = rigidity.Rigidity(csv.reader(infile, **fmtparams), rules,
+                              row_rules=row_rules)
+        writer = csv.writer(outfile, **fmtparams)
+        written = 0
+        for row in r:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def process_file(path, output, rules=[], row_rules=[], shards=None,
+                 workers=None, header=False, encoding='utf8', executor=None,
+                 **fmtparams):
+    '''
+    Validate the CSV file at `path` in parallel and write the valid
+    rows, in their original order, to `output`.
+
+    The rules must be picklable, since each worker process receives
+    its own copy. Rows are read with :func:`csv.reader`.
+
+    :param str path: the input file. Compressed files are validated in
+      a single pass without worker processes.
+    :param str output: the output file. It is compressed when its
+      extension is that of a compressed format.
+    :param rules=[]: the column rules, as accepted by
+      :class:`rigidity.Rigidity`.
+    :param row_rules=[]: row-level rules, as accepted by
+      :class:`rigidity.Rigidity`.
+    :param int shards: the number of byte ranges. Defaults to the
+      number of workers.
+    :param int workers: the number of worker processes. Defaults to
+      the number of CPUs.
+    :param bool header: copy the first record of the input to the
+      output without validating it.
+    :param str encoding: the encoding of the input and output files.
+    :param executor: a :class:`concurrent.futures.Executor` to use
+      instead of a new process pool.
+    :param fmtparams: formatting parameters passed to :func:`csv.reader`
+      and :func:`csv.writer`.
+    :returns: the number of rows written, excluding the header.
+    :raises ValueError: when a stateful rule does not support merging.
+    '''
+    if rigidity.compression.compression_for(path):
+        return _process_stream(path, output, rules, row_rules, header,
+                               encoding, fmtparams)
+    _check_mergeable(rules, row_rules)
+    workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(path, shards or workers, header, encoding,
+                          **fmtparams)
+    stateful = any(getattr(rule, 'stateful', False)
+                   for rule in _all_rules(rules, row_rules))
+
+    directory = tempfile.mkdtemp(prefix='rigidity-',
+                                 dir=os.path.dirname(os.path.abspath(output)))
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        contributions = []
+        if stateful:
+            # Ranges in which rows failed or were dropped may have been
+            #   affected by missing state, so they are summarized again
+            #   once the states of the ranges before them are known.
+            futures = [executor.submit(_shard_state, path, start, end, rules,
+                                       row_rules, [], encoding, fmtparams)
+                       for start, end in ranges[:-1]]
+            results = [future.result() for future in futures]
+            contributions = [state for state, retry in results]
+            futures = dict((i, executor.submit(_shard_state, path, start, end,
+                                               rules, row_rules,
+                                               contributions[:i], encoding,
+                                               fmtparams))
+                           for i, (start, end) in enumerate(ranges[:-1])
+                           if i > 0 and results[i][1])
+            for i, future in futures.items():
+                contributions[i] = future.result()[0]
+
+        outputs = [os.path.join(directory, '%06d.csv' % i)
+                   for i in range(0, len(ranges))]
+        futures = [executor.submit(_shard_output, path, start, end, rules,
+                                   row_rules, contributions[:i], outputs[i],
+                                   encoding, fmtparams)
+                   for i, (start, end) in enumerate(ranges)]
+        written = sum(future.result() for future in futures)
+
+        with rigidity.compression.open_file(output, 'wb') as outfile:
+            if header:
+                header_end = (ranges[0][0] if ranges
+                              else os.path.getsize(path))
+                with open(path, 'rb') as infile:
+                    outfile.write(infile.read(header_end))
+            for shard_output in outputs:
+                with open(shard_output, 'rb') as infile:
+                    shutil.copyfileobj(infile, outfile)
+        return written
+    finally:
+        if own_executor:
+            executor.shutdown()
+        shutil.rmtree(directory, True)
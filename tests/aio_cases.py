@@ -0,0 +1,121 @@
+'''
+Tests of :mod:`rigidity.aio`, imported by test_aio.py on versions of
+Python that support it.
+'''
+
+import asyncio
+import concurrent.futures
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import rigidity
+from rigidity import rules
+from rigidity.aio import AsyncRigidity
+
+
+class AsyncRows():
+    '''
+    A minimal asynchronous row source for testing.
+    '''
+    def __init__(self, rows):
+        self.rows = iter(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncWriter():
+    '''
+    A writer whose writerow() method is a coroutine.
+    '''
+    def __init__(self):
+        self.rows = []
+
+    async def writerow(self, row):
+        self.rows.append(row)
+
+
+async def collect(r):
+    return [row async for row in r]
+
+
+class TestAsyncRigidity(unittest.TestCase):
+
+    def test_not_imported_by_package(self):
+        self.assertFalse(hasattr(rigidity, 'AsyncRigidity'))
+
+    def test_async_iterable(self):
+        '''
+        Test that sources only need to be asynchronous iterables.
+        '''
+        class Iterable():
+            def __aiter__(self):
+                return AsyncRows([['header'], [' a ']])
+
+        async def run():
+            r = AsyncRigidity(Iterable(), [[rules.Strip()]])
+            return await r.skip(), await collect(r)
+        self.assertEqual(asyncio.run(run()), (['header'], [['a']]))
+
+    def test_async_for(self):
+        r = AsyncRigidity(AsyncRows([[' a '], ['b ']]), [[rules.Strip()]])
+        self.assertEqual(asyncio.run(collect(r)), [['a'], ['b']])
+
+    def test_async_for_droprow(self):
+        '''
+        Test that dropped rows are skipped, including across batches.
+        '''
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        source = AsyncRows([['1'], ['x'], ['y'], ['z'], ['2']])
+        r = AsyncRigidity(source, r_rules, batch_size=2)
+        self.assertEqual(asyncio.run(collect(r)), [[1], [2]])
+
+    def test_async_for_offload(self):
+        r_rules = [[rules.Upper()]]
+        rows = [['row%d' % i] for i in range(10)]
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            r = AsyncRigidity(AsyncRows(rows), r_rules, batch_size=3,
+                              offload=True, executor=executor)
+            result = asyncio.run(collect(r))
+        self.assertEqual(result, [['ROW%d' % i] for i in range(10)])
+
+    def test_async_for_error(self):
+        r = AsyncRigidity(AsyncRows([['a']]), [[rules.Integer()]])
+        self.assertRaises(ValueError, asyncio.run, collect(r))
+
+    def test_skip(self):
+        r = AsyncRigidity(AsyncRows([['header'], ['1']]), [[rules.Integer()]])
+
+        async def run():
+            header = await r.skip()
+            return header, await collect(r)
+        self.assertEqual(asyncio.run(run()), (['header'], [[1]]))
+
+    def test_writerow_async_writer(self):
+        writer = AsyncWriter()
+        r = AsyncRigidity(writer, [[rules.Drop()]])
+        asyncio.run(r.writerow(('hello',)))
+        self.assertEqual(writer.rows, [['']])
+
+    def test_writerows_sync_writer(self):
+        writer = mock.MagicMock()
+        writer.writerow.return_value = None
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        r = AsyncRigidity(writer, r_rules, batch_size=2, offload=True)
+        asyncio.run(r.writerows([['1'], ['a'], ['3']]))
+        self.assertEqual(writer.writerow.call_args_list,
+                         [mock.call([1]), mock.call([3])])
+
+    def test_invalid_batch_size(self):
+        self.assertRaises(ValueError, AsyncRigidity, AsyncRows([]), [],
+                          batch_size=0)
@@ -0,0 +1,37 @@
+import random
+import unittest
+
+from rigidity import ahocorasick
+
+
+class TestAutomaton(unittest.TestCase):
+
+    def test_find_all(self):
+        a = ahocorasick.Automaton(['he', 'she', 'his', 'hers'])
+        self.assertEqual(a.find_all('ushers'), {0, 1, 3})
+        self.assertEqual(a.find_all('this'), {2})
+        self.assertEqual(a.find_all('nothing'), set())
+
+    def test_search(self):
+        a = ahocorasick.Automaton(['abc', 'bcd', 'x'])
+        self.assertEqual(a.search('zzbcd'), 1)
+        self.assertIsNone(a.search('abbc'))
+        self.assertEqual(ahocorasick.Automaton(['', 'a']).search('b'), 0)
+
+    def test_matches_in_operator(self):
+        '''
+        Test the automaton against Python's substring search on random
+        strings with many overlapping patterns.
+        '''
+        rng = random.Random(1)
+
+        def word(length):
+            return ''.join(rng.choice('abc') for i in range(0, length))
+
+        for trial in range(0, 20):
+            strings = [word(rng.randint(1, 5)) for i in range(0, 30)]
+            a = ahocorasick.Automaton(strings)
+            for value in [word(rng.randint(0, 40)) for i in range(0, 20)]:
+                self.assertEqual(a.find_all(value),
+                                 set(i for i, string in enumerate(strings)
+                                     if string in value))
@@ -0,0 +1,6 @@
+import sys
+
+# rigidity.aio requires Python 3.7, and its tests use syntax that older
+#   versions cannot parse.
+if sys.version_info >= (3, 7):
+    from aio_cases import *  # noqa: F401,F403
@@ -0,0 +1,35 @@
+import unittest
+
+from rigidity import cache
+
+
+class TestRowCache(unittest.TestCase):
+
+    def test_lru_entries(self):
+        c = cache.RowCache(max_entries=2)
+        c.put(('a',), ('A',))
+        c.put(('b',), ('B',))
+        self.assertEqual(c.get(('a',)), ('A',))
+        c.put(('c',), ('C',))
+        # 'b' was the least recently used entry.
+        self.assertIsNone(c.get(('b',)))
+        self.assertEqual(c.get(('a',)), ('A',))
+        self.assertEqual(len(c), 2)
+        self.assertEqual((c.hits, c.misses), (2, 1))
+
+    def test_max_bytes(self):
+        c = cache.RowCache(max_bytes=2000)
+        for i in range(0, 100):
+            c.put((str(i),), ('x' * 100,))
+        self.assertLessEqual(c.size, 2000)
+        self.assertGreater(len(c), 0)
+        self.assertLess(len(c), 100)
+        self.assertIsNotNone(c.get(('99',)))
+
+    def test_dropped(self):
+        c = cache.RowCache(max_bytes=1000)
+        c.put(('a',), cache.DROPPED)
+        self.assertIs(c.get(('a',)), cache.DROPPED)
+
+    def test_unbounded(self):
+        self.assertRaises(ValueError, cache.RowCache)
@@ -0,0 +1,89 @@
+import bz2
+import gzip
+import lzma
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from rigidity import compression
+
+
+class TestOpenFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = ''.join('%d,row %d\r\n' % (i, i)
+                            for i in range(50000)).encode()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_compression_for(self):
+        self.assertEqual(compression.compression_for('a.csv.gz'), 'gzip')
+        self.assertEqual(compression.compression_for('A.CSV.BZ2'), 'bz2')
+        self.assertEqual(compression.compression_for('a.xz'), 'xz')
+        self.assertIsNone(compression.compression_for('a.csv'))
+        self.assertEqual(compression.compression_for(b'a.csv.gz'), 'gzip')
+
+    @unittest.skipUnless(hasattr(os, 'PathLike'),
+                         'path-like objects need Python 3.6')
+    def test_compression_for_path(self):
+        self.assertEqual(
+            compression.compression_for(pathlib.Path('a.csv.xz')), 'xz')
+
+    def test_read(self):
+        for extension, module in (('.gz', gzip), ('.bz2', bz2),
+                                  ('.xz', lzma)):
+            path = os.path.join(self.directory, 'data.csv' + extension)
+            with module.open(path, 'wb') as compressed:
+                compressed.write(self.data)
+            with compression.open_file(path, 'rb',
+                                       buffer_size=4096) as infile:
+                self.assertFalse(infile.seekable())
+                self.assertEqual(infile.read(), self.data)
+            with compression.open_file(path, 'r', encoding='utf8',
+                                       newline='') as infile:
+                self.assertEqual(infile.readline(), '0,row 0\r\n')
+            with compression.open_file(os.fsencode(path), 'rb') as infile:
+                self.assertEqual(infile.read(), self.data)
+
+    def test_write(self):
+        path = os.path.join(self.directory, 'data.csv.gz')
+        with compression.open_file(path, 'w', encoding='utf8',
+                                   newline='') as outfile:
+            outfile.write(self.data.decode('utf8'))
+        with gzip.open(path, 'rb') as compressed:
+            self.assertEqual(compressed.read(), self.data)
+
+    def test_uncompressed(self):
+        path = os.path.join(self.directory, 'data.csv')
+        with compression.open_file(path, 'wb') as outfile:
+            outfile.write(self.data)
+        with compression.open_file(path, 'rb') as infile:
+            self.assertTrue(infile.seekable())
+            self.assertEqual(infile.read(), self.data)
+
+    def test_errors(self):
+        path = os.path.join(self.directory, 'corrupt.gz')
+        with open(path, 'wb') as outfile:
+            outfile.write(b'not gzip data')
+        with compression.open_file(path, 'rb') as infile:
+            self.assertRaises(OSError, infile.read)
+        self.assertRaises(ValueError, compression.open_file, path,
+                          compression='zip')
+
+    def test_close_early(self):
+        '''
+        Test that closing a file before reading it to the end stops the
+        background thread.
+        '''
+        path = os.path.join(self.directory, 'data.csv.gz')
+        with gzip.open(path, 'wb') as compressed:
+            compressed.write(self.data)
+        infile = compression.open_file(path, 'rb', buffer_size=1024)
+        infile.read(10)
+        raw = infile.raw
+        infile.close()
+        self.assertFalse(raw.thread.is_alive())
@@ -0,0 +1,85 @@
+import unittest
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+import rigidity
+from rigidity import rules
+
+if pandas is not None:
+    from rigidity import dataframe
+
+
+class Doubler(rules.Rule):
+    '''
+    A custom rule, which has no vectorized implementation.
+    '''
+    def apply(self, value):
+        return value * 2
+
+
+@unittest.skipUnless(pandas, 'pandas is not installed')
+class TestValidateFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = pandas.DataFrame({
+            'id': [' 1', '2', 'x', '1_0', '2', '-3'],
+            'name': ['Ann ', 'bob', 'Cy', 'dee', 'Ed', ' Flo'],
+            'flag': ['yes', 'NO', 'maybe', 't', 'f', '1'],
+            'price': ['1.5', '2', '.5e1', 'inf', '9', 'bad'],
+        })
+
+    def ruleset(self):
+        return {
+            'id': [rules.Integer(action=rules.Integer.ACTION_DROPROW),
+                   rules.Unique(action=rules.Unique.ACTION_DROPROW)],
+            'name': [rules.Strip(), rules.Lower(), Doubler()],
+            'flag': [rules.Boolean(action=rules.Boolean.ACTION_DEFAULT)],
+            'price': [rules.Float(action=rules.Float.ACTION_ZERO)],
+        }
+
+    def test_matches_rigidity(self):
+        '''
+        Test that the result is the same as reading the rows with
+        Rigidity.
+        '''
+        result = dataframe.validate_frame(self.frame, self.ruleset())
+        expected = list(rigidity.Rigidity(
+            iter(self.frame.to_dict('records')), self.ruleset()))
+        self.assertEqual(result.to_dict('records'), expected)
+        self.assertEqual(list(result.index), [0, 1, 3, 5])
+        self.assertEqual(result['id'].dtype, 'int64')
+        # The input is not modified.
+        self.assertEqual(self.frame['id'][0], ' 1')
+
+    def test_positional_rules(self):
+        result = dataframe.validate_frame(
+            self.frame, [[], [rules.Upper(),
+                              rules.ReplaceValue({'BOB': 'Rob'},
+                                                 rules.ReplaceValue.
+                                                 ACTION_DROPROW)]])
+        self.assertEqual(result.values.tolist(),
+                         [['2', 'Rob', 'NO', '2']])
+
+    def test_native_dtypes(self):
+        frame = pandas.DataFrame({'a': [1, 2, 3], 'b': [1.5, 2.0, 3.0]})
+        result = dataframe.validate_frame(
+            frame, {'a': [rules.Float()], 'b': [rules.Integer()]})
+        self.assertEqual(result['a'].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(result['b'].tolist(), [1, 2, 3])
+
+    def test_errors(self):
+        self.assertRaises(ValueError, dataframe.validate_frame, self.frame,
+                          {'id': [rules.Integer()]})
+
+    def test_row_rules(self):
+        frame = pandas.DataFrame({'a': ['x', 'x', 'y'], 'b': ['1', '1', '1']})
+        row_rule = rules.CompositeUnique(
+            ['a', 'b'], rules.CompositeUnique.ACTION_DROPROW)
+        result = dataframe.validate_frame(frame, {'b': [rules.Integer()]},
+                                          row_rules=[row_rule])
+        self.assertEqual(result.to_dict('records'),
+                         [{'a': 'x', 'b': 1}, {'a': 'y', 'b': 1}])
+        self.assertEqual(list(result.index), [0, 2])
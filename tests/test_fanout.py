@@ -0,0 +1,95 @@
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from rigidity import fanout, rules
+
+
+class CountingRule(rules.Rule):
+    '''
+    A rule that strips its value and counts how often it is applied.
+    '''
+    calls = 0
+
+    def apply(self, value):
+        self.calls += 1
+        return value.strip()
+
+
+class ListWriter():
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_shared_prefix(self):
+        '''
+        Test that a rule shared by several outputs runs once per row.
+        '''
+        strip = CountingRule()
+        rows = [[' a ', 'secret'], [' b ', 'secret']]
+        f = fanout.FanOut(iter(rows))
+        clean, pii = ListWriter(), ListWriter()
+        f.add_output(clean, [[strip], []])
+        f.add_output(pii, [[strip, rules.Upper()], [rules.Drop()]])
+        counts = f.run()
+
+        self.assertEqual(strip.calls, 2)
+        self.assertEqual(clean.rows, [['a', 'secret'], ['b', 'secret']])
+        self.assertEqual(pii.rows, [['A', ''], ['B', '']])
+        self.assertEqual(counts[1], {'written': 2, 'dropped': 0,
+                                     'rejected': 0})
+        # The input rows are not modified.
+        self.assertEqual(rows[0], [' a ', 'secret'])
+
+    def test_rejects(self):
+        rows = [['1'], ['x'], ['3']]
+        f = fanout.FanOut(iter(rows))
+        valid, rejects, passthrough = ListWriter(), ListWriter(), ListWriter()
+        f.add_output(valid, [[rules.Integer()]], rejects=rejects)
+        f.add_output(passthrough, [[]])
+        counts = f.run()
+        self.assertEqual(valid.rows, [[1], [3]])
+        self.assertEqual(rejects.rows, [['x']])
+        self.assertEqual(passthrough.rows, rows)
+        self.assertEqual(counts[0]['rejected'], 1)
+
+    def test_drops_and_errors(self):
+        f = fanout.FanOut(iter([['a'], ['b']]))
+        f.add_output(mock.MagicMock(), [[rules.Integer(
+            action=rules.Integer.ACTION_DROPROW)]])
+        self.assertEqual(f.run()[0]['dropped'], 2)
+
+        f = fanout.FanOut(iter([['a']]))
+        f.add_output(ListWriter(), [[rules.Integer()]])
+        self.assertRaises(ValueError, f.run)
+
+    def test_failure_stops_later_columns(self):
+        '''
+        Test that, as with Rigidity, rules in later columns do not see
+        rows that an earlier column dropped.
+        '''
+        unique = rules.Unique()
+        f = fanout.FanOut(iter([['x', 'a'], ['1', 'a']]))
+        writer = ListWriter()
+        f.add_output(writer, [[rules.Integer(
+            action=rules.Integer.ACTION_DROPROW)], [unique]])
+        f.run()
+        self.assertEqual(writer.rows, [[1, 'a']])
+
+    def test_row_rules(self):
+        f = fanout.FanOut(iter([['a', 'b'], ['a', 'b']]))
+        writer = ListWriter()
+        row_rule = rules.CompositeUnique(
+            [0, 1], rules.CompositeUnique.ACTION_DROPROW)
+        f.add_output(writer, [[], []], row_rules=[row_rule])
+        counts = f.run()
+        self.assertEqual(writer.rows, [['a', 'b']])
+        self.assertEqual(counts[0]['dropped'], 1)
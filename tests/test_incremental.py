@@ -0,0 +1,256 @@
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import rigidity
+from rigidity import incremental, rules
+
+
+class Counting(rules.Rule):
+    '''
+    Strip values, counting how many were seen.
+    '''
+    def __init__(self):
+        self.calls = 0
+
+    def apply(self, value):
+        self.calls += 1
+        return value.strip()
+
+    def fingerprint(self):
+        return 'Counting'
+
+
+class TestIncrementalValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.csv')
+        with open(self.path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['id', 'name', 'qty'])
+            for i in range(0, 50):
+                writer.writerow([str(i % 40), ' n%d ' % i,
+                                 'x' if i % 7 == 0 else str(i)])
+        self.store = incremental.CheckpointStore(
+            os.path.join(self.directory, 'checkpoints'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sequential(self, r_rules):
+        with open(self.path, newline='') as csvfile:
+            r = rigidity.Rigidity(csv.reader(csvfile), r_rules)
+            r.skip()
+            return list(r)
+
+    def make_rules(self, qty_action=rules.Integer.ACTION_DROPROW):
+        self.counter = Counting()
+        return [[rules.Unique(action=rules.Unique.ACTION_DROPROW)],
+                [self.counter, rules.Upper()],
+                [rules.Integer(action=qty_action)]]
+
+    def test_reuse_unchanged_columns(self):
+        v = incremental.IncrementalValidator(self.make_rules(), self.store)
+        first = v.validate_file(self.path, header=True)
+        self.assertEqual(first, self.sequential(self.make_rules()))
+        self.assertEqual(v.recomputed, [0, 1, 2])
+
+        # Change only the last column's rules.
+        r_rules = self.make_rules(rules.Integer.ACTION_ZERO)
+        counter = self.counter
+        v = incremental.IncrementalValidator(r_rules, self.store)
+        second = v.validate_file(self.path, header=True)
+        self.assertEqual(second, self.sequential(
+            self.make_rules(rules.Integer.ACTION_ZERO)))
+        self.assertEqual(v.reused, [1])
+        self.assertEqual(v.recomputed, [0, 2])
+        self.assertEqual(counter.calls, 0)
+
+    def test_changed_file(self):
+        v = incremental.IncrementalValidator([[rules.Strip()]], self.store)
+        v.validate_file(self.path)
+        v.validate_file(self.path)
+        self.assertEqual(v.reused, [0])
+        with open(self.path, 'a') as csvfile:
+            csvfile.write('extra\n')
+        self.assertEqual(v.validate_file(self.path)[-1], ['extra'])
+        self.assertEqual(v.recomputed, [0])
+
+    def test_errors(self):
+        '''
+        Test that errors are saved and raised again, but not for rows
+        that an earlier column dropped.
+        '''
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)],
+                   [], [rules.Integer()]]
+        v = incremental.IncrementalValidator(r_rules, self.store)
+        self.assertRaises(ValueError, v.validate_file, self.path)
+        self.assertRaises(ValueError, v.validate_file, self.path)
+        self.assertEqual(v.reused, [0, 1, 2])
+
+    def test_changed_rule_code(self):
+        '''
+        Test that results are recomputed when the code of a rule
+        changes, although its configuration does not.
+        '''
+        class Changing(rules.Rule):
+            def apply(self, value):
+                return value.upper()
+        v = incremental.IncrementalValidator([[], [Changing()]], self.store)
+        self.assertEqual(v.validate_file(self.path, header=True)[0][1],
+                         ' N0 ')
+        Changing.apply = lambda self, value: value.strip()
+        v = incremental.IncrementalValidator([[], [Changing()]], self.store)
+        self.assertEqual(v.validate_file(self.path, header=True)[0][1], 'n0')
+        self.assertEqual(v.recomputed, [1])
+
+    def test_dict_rules(self):
+        r_rules = {'qty': [rules.Integer(action=rules.Integer.ACTION_ZERO)]}
+        v = incremental.IncrementalValidator(r_rules, self.store)
+        rows = v.validate_file(self.path)
+        self.assertEqual(rows[0], {'id': '0', 'name': ' n0 ', 'qty': 0})
+        self.assertEqual(rows[1]['qty'], 1)
+
+    def test_reuse_between_validators(self):
+        '''
+        Test that rules holding caches and compiled patterns are reused
+        by a new validator.
+        '''
+        def make_rules():
+            return [[rules.Match(r'\d+')], [rules.Strip(), rules.Upper()],
+                    [rules.DateTime(['%d', 'iso'], infer=False,
+                                    action=rules.DateTime.ACTION_DEFAULT)]]
+        v = incremental.IncrementalValidator(make_rules(), self.store)
+        first = v.validate_file(self.path, header=True)
+        v = incremental.IncrementalValidator(make_rules(), self.store)
+        self.assertEqual(v.validate_file(self.path, header=True), first)
+        self.assertEqual(v.reused, [0, 1, 2])
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            incremental.chain_fingerprint([rules.Strip(), rules.Upper()]),
+            incremental.chain_fingerprint([rules.Strip(), rules.Upper()]))
+        self.assertNotEqual(
+            incremental.chain_fingerprint([rules.Strip(), rules.Upper()]),
+            incremental.chain_fingerprint([rules.Upper(), rules.Strip()]))
+        self.assertNotEqual(
+            rules.ReplaceValue({'a': 'b'}).fingerprint(),
+            rules.ReplaceValue({'a': 'c'}).fingerprint())
+        # Default values are included.
+        self.assertEqual(rules.Strip().fingerprint(),
+                         rules.Strip(None).fingerprint())
+
+    def test_changed_attributes(self):
+        rule = rules.Integer()
+        fingerprint = rule.fingerprint()
+        rule.action = rules.Integer.ACTION_ZERO
+        self.assertNotEqual(rule.fingerprint(), fingerprint)
+        self.assertEqual(rule.fingerprint(), rules.Integer(
+            action=rules.Integer.ACTION_ZERO).fingerprint())
+
+    def test_version(self):
+        class Versioned(rules.Rule):
+            pass
+        fingerprint = Versioned().fingerprint()
+        Versioned.version = 2
+        self.assertNotEqual(Versioned().fingerprint(), fingerprint)
+
+    def test_unknown_configuration(self):
+        '''
+        Test that the results of rules which keep a parameter under
+        another name are not saved.
+        '''
+        class Renamed(rules.Rule):
+            def __init__(self, suffix):
+                self.ending = suffix
+        self.assertIsNone(Renamed('x').fingerprint())
+
+    def test_bundled_rules(self):
+        '''
+        Test that separately created rules have the same fingerprint,
+        including after one of them has been used.
+        '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        reference = os.path.join(directory, 'reference.csv')
+        with open(reference, 'w') as csvfile:
+            csvfile.write('id\n1\n2\n')
+        index = os.path.join(directory, 'reference.index')
+        rules.ForeignKey.build_index(reference, 'id', index)
+        database = os.path.join(directory, 'reference.sqlite')
+        connection = sqlite3.connect(database)
+        connection.execute('CREATE TABLE ids (id TEXT)')
+        connection.execute("INSERT INTO ids VALUES ('1')")
+        connection.commit()
+        connection.close()
+
+        factories = [
+            lambda: rules.CompositeUnique([0]),
+            rules.CapitalizeWords, rules.Cary, rules.Boolean, rules.Bytes,
+            lambda: rules.Contains(['1', '2']),
+            lambda: rules.ContainsAny(['1', '2']),
+            lambda: rules.ContainsNone(['x']),
+            rules.DateTime,
+            lambda: rules.ForeignKey(index),
+            rules.Integer, rules.Float,
+            lambda: rules.SQLiteLookup(database, 'ids', 'id'),
+            rules.NoneToEmptyString, rules.RemoveLinebreaks,
+            lambda: rules.ReplaceValue({'1': 'one'}),
+            lambda: rules.Static('s'), rules.Unique,
+            lambda: rules.BloomUnique(100),
+            lambda: rules.WindowedUnique(max_keys=10),
+            lambda: rules.SpillingUnique(directory=directory),
+            rules.Drop, rules.Strip, rules.UpcA, rules.Lower, rules.Upper,
+            lambda: rules.Match(r'\d+'), lambda: rules.Extract(r'\d+'),
+            lambda: rules.Substitute(r'\d', 'n'),
+        ]
+        covered = set()
+        for factory in factories:
+            used = factory()
+            covered.add(type(used))
+            for value in (['1'] if isinstance(used, rules.RowRule)
+                          else '1'):
+                try:
+                    if hasattr(used, 'prefetch'):
+                        used.prefetch([value])
+                    used.read(value)
+                    used.read(value)
+                except Exception:
+                    pass
+            fresh = factory()
+            self.assertIsNotNone(fresh.fingerprint(), type(fresh).__name__)
+            self.assertEqual(used.fingerprint(), fresh.fingerprint(),
+                             type(fresh).__name__)
+            for rule in (used, fresh):
+                if hasattr(rule, 'close'):
+                    rule.close()
+        bundled = set(value for value in vars(rules).values()
+                      if isinstance(value, type) and
+                      issubclass(value, rules.Rule))
+        self.assertEqual(bundled - covered,
+                         {rules.Rule, rules.RowRule, rules.Lookup})
+
+    def test_external_data(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = os.path.join(directory, 'reference.sqlite')
+        connection = sqlite3.connect(database)
+        connection.execute('CREATE TABLE ids (id TEXT)')
+        connection.commit()
+        before = rules.SQLiteLookup(database, 'ids', 'id').fingerprint()
+        connection.execute("INSERT INTO ids VALUES ('%s')" % ('1' * 5000))
+        connection.commit()
+        connection.close()
+        after = rules.SQLiteLookup(database, 'ids', 'id').fingerprint()
+        self.assertNotEqual(before, after)
+
+        self.assertIsNone(rules.Lookup().fingerprint())
+        self.assertIsNone(incremental.chain_fingerprint(
+            [rules.Strip(), rules.Lookup()]))
@@ -0,0 +1,125 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from rigidity import keyindex
+
+
+class TestEncodeValue(unittest.TestCase):
+
+    def test_types_do_not_collide(self):
+        encoded = {keyindex.encode_value('1'), keyindex.encode_value(b'1'),
+                   keyindex.encode_value(1)}
+        self.assertEqual(len(encoded), 3)
+
+
+class TestSortedKeyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'keys.idx')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_contains(self):
+        keys = [b'pear', b'apple', b'fig', b'apple', b'']
+        index = keyindex.SortedKeyIndex.build(keys, self.path)
+        for key in keys:
+            self.assertIn(key, index)
+        self.assertNotIn(b'banana', index)
+        self.assertNotIn(b'zzz', index)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(list(index), [b'', b'apple', b'fig', b'pear'])
+        index.close()
+
+    def test_empty(self):
+        index = keyindex.SortedKeyIndex.build([], self.path)
+        self.assertNotIn(b'a', index)
+        index.close()
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as indexfile:
+            indexfile.write(b'not an index file')
+        self.assertRaises(ValueError, keyindex.SortedKeyIndex, self.path)
+
+    def test_pickle_reopens_file(self):
+        index = keyindex.SortedKeyIndex.build([b'a'], self.path)
+        copy = pickle.loads(pickle.dumps(index))
+        self.assertIn(b'a', copy)
+        index.close()
+        copy.close()
+
+    def test_merge(self):
+        index = keyindex.SortedKeyIndex.build([b'b', b'd'], self.path)
+        merged = keyindex.SortedKeyIndex.merge(index, [b'a', b'd', b'e'],
+                                               self.path)
+        self.assertEqual(list(merged), [b'a', b'b', b'd', b'e'])
+        index.close()
+        merged.close()
+
+    def test_merge_without_index(self):
+        merged = keyindex.SortedKeyIndex.merge(None, [b'b', b'a'], self.path)
+        self.assertEqual(list(merged), [b'a', b'b'])
+        merged.close()
+
+    def test_combine(self):
+        first = keyindex.SortedKeyIndex.build(
+            [b'a', b'c'], os.path.join(self.directory, 'first.idx'))
+        second = keyindex.SortedKeyIndex.build(
+            [b'b', b'c'], os.path.join(self.directory, 'second.idx'))
+        combined = keyindex.SortedKeyIndex.combine([first, second], self.path)
+        self.assertEqual(list(combined), [b'a', b'b', b'c'])
+        for index in (first, second, combined):
+            index.close()
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_add(self):
+        bloom = keyindex.BloomFilter(100)
+        self.assertFalse(bloom.add(b'a'))
+        self.assertTrue(bloom.add(b'a'))
+        self.assertIn(b'a', bloom)
+        self.assertNotIn(b'b', bloom)
+        self.assertEqual(len(bloom), 1)
+
+    def test_false_positive_rate(self):
+        bloom = keyindex.BloomFilter(1000, 0.01)
+        for i in range(0, 1000):
+            bloom.add(('in%d' % i).encode())
+        false_positives = sum(('out%d' % i).encode() in bloom
+                              for i in range(0, 1000))
+        self.assertLess(false_positives, 50)
+
+    def test_update(self):
+        first = keyindex.BloomFilter(100000)
+        second = keyindex.BloomFilter(100000)
+        for i in range(0, 5000):
+            first.add(('first%d' % i).encode())
+            second.add(('second%d' % i).encode())
+        expected = bytearray(a | b for a, b in zip(first.bits, second.bits))
+        first.update(second)
+        self.assertEqual(first.bits, expected)
+        self.assertIsInstance(first.bits, bytearray)
+        self.assertEqual(len(first), 10000)
+        self.assertTrue(all(('second%d' % i).encode() in first
+                            for i in range(0, 5000)))
+        self.assertRaises(ValueError, first.update,
+                          keyindex.BloomFilter(10))
+
+    def test_invalid_parameters(self):
+        self.assertRaises(ValueError, keyindex.BloomFilter, 0)
+        self.assertRaises(ValueError, keyindex.BloomFilter, 10, 1.5)
+
+    def test_to_bytes(self):
+        bloom = keyindex.BloomFilter(10)
+        bloom.add(b'a')
+        copy = keyindex.BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertIn(b'a', copy)
+        self.assertEqual((copy.size, copy.hashes, copy.count),
+                         (bloom.size, bloom.hashes, bloom.count))
+        self.assertRaises(ValueError, keyindex.BloomFilter.from_bytes,
+                          b'not a filter')
@@ -0,0 +1,93 @@
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import rigidity
+from rigidity import multifile, rules
+
+
+class TestMultiFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for i, size in enumerate([250, 3, 0, 120, 40]):
+            path = os.path.join(self.directory, 'store%d.csv' % i)
+            with open(path, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['store', 'sku'])
+                for j in range(0, size):
+                    writer.writerow([str(i), str(j)])
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_all(self, reader):
+        with reader:
+            return [(reader.source, reader.line_num, row) for row in reader]
+
+    def test_concatenate(self):
+        rows = self.read_all(multifile.MultiFileReader(
+            self.paths, max_open=2, read_ahead=100, header=True))
+        expected = []
+        for path in self.paths:
+            with open(path, newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                next(reader)
+                expected.extend((path, reader.line_num, row)
+                                for row in reader)
+        self.assertEqual(rows, expected)
+
+    def test_interleave(self):
+        reader = multifile.MultiFileReader(self.paths, interleave=True,
+                                           max_open=2, header=True)
+        rows = [row for source, line_num, row in self.read_all(reader)]
+        self.assertEqual(reader.header, ['store', 'sku'])
+        self.assertEqual(rows[:8], [['0', '0'], ['1', '0'],
+                                    ['0', '1'], ['1', '1'],
+                                    ['0', '2'], ['1', '2'],
+                                    ['0', '3'], ['3', '0']])
+        self.assertEqual(len(rows), 413)
+        # The order does not depend on thread timing.
+        again = multifile.MultiFileReader(self.paths, interleave=True,
+                                          max_open=2, header=True)
+        self.assertEqual(rows, [row for source, line_num, row
+                                in self.read_all(again)])
+
+    def test_compressed(self):
+        path = self.paths[1] + '.gz'
+        with open(self.paths[1], 'rb') as infile, \
+                gzip.open(path, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+        reader = multifile.MultiFileReader([path, self.paths[1]])
+        rows = [row for source, line_num, row in self.read_all(reader)]
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[:4], rows[4:])
+
+    def test_missing_file(self):
+        reader = multifile.MultiFileReader(
+            [self.paths[1], os.path.join(self.directory, 'missing.csv')])
+        self.assertRaises(FileNotFoundError, self.read_all, reader)
+
+    def test_close_early(self):
+        reader = multifile.MultiFileReader(self.paths, read_ahead=10)
+        next(reader)
+        reader.close()
+        self.assertFalse(any(thread.is_alive() for thread in reader.threads))
+
+    def test_scan_sources(self):
+        '''
+        Test that a ruleset applies across files and that failures are
+        reported with their file.
+        '''
+        reader = multifile.MultiFileReader(self.paths, header=True)
+        with reader:
+            r = rigidity.Rigidity(reader, [[], [rules.Unique()]])
+            report = r.scan()
+        self.assertEqual(report.rows, 413)
+        self.assertEqual(report.failed, 163)
+        self.assertEqual(report.failing_rows[0], (self.paths[1], 2))
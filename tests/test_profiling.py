@@ -0,0 +1,73 @@
+import random
+import unittest
+
+import rigidity
+from rigidity import profiling, rules
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_estimate_small(self):
+        hll = profiling.HyperLogLog()
+        for i in range(0, 100):
+            hll.add(i)
+            hll.add(i)
+        self.assertAlmostEqual(len(hll), 100, delta=5)
+
+    def test_estimate_large(self):
+        hll = profiling.HyperLogLog()
+        for i in range(0, 50000):
+            hll.add('value%d' % i)
+        self.assertAlmostEqual(hll.estimate(), 50000, delta=50000 * 0.05)
+
+    def test_invalid_precision(self):
+        self.assertRaises(ValueError, profiling.HyperLogLog, 2)
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_quantiles(self):
+        sketch = profiling.QuantileSketch(seed=1)
+        values = list(range(0, 10000))
+        random.Random(2).shuffle(values)
+        for value in values:
+            sketch.add(value)
+        self.assertLess(sketch.size, 1000)
+        self.assertAlmostEqual(sketch.quantile(0.5), 5000, delta=300)
+        self.assertAlmostEqual(sketch.quantile(0.9), 9000, delta=300)
+
+    def test_empty(self):
+        self.assertIsNone(profiling.QuantileSketch().quantile(0.5))
+
+
+class TestColumnProfile(unittest.TestCase):
+
+    def test_summary(self):
+        profile = profiling.ColumnProfile()
+        for value in (3, 1, '', None, 2, 2, True, 'x'):
+            profile.add(value)
+        summary = profile.summary()
+        self.assertEqual(summary['count'], 8)
+        self.assertEqual(summary['nulls'], 2)
+        self.assertEqual(summary['null_rate'], 0.25)
+        self.assertEqual(summary['numeric'], 4)
+        self.assertEqual((summary['min'], summary['max']), (1, 3))
+        self.assertEqual(summary['distinct'], 4)
+        self.assertEqual(summary['quantiles'][0.5], 2)
+
+
+class TestRigidityProfile(unittest.TestCase):
+
+    def test_profile(self):
+        rows = [['1', 'a'], ['x', 'b'], ['3', ''], ['2', 'a']]
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)], []]
+        r = rigidity.Rigidity(iter(rows), r_rules, profile=True)
+        list(r)
+        self.assertEqual(r.profiles[0].count, 3)
+        self.assertEqual((r.profiles[0].minimum, r.profiles[0].maximum),
+                         (1, 3))
+        self.assertEqual(r.profiles[1].nulls, 1)
+        self.assertEqual(len(r.profiles[1].distinct), 1)
+
+    def test_profile_disabled(self):
+        self.assertIsNone(rigidity.Rigidity(None, [[]]).profiles)
@@ -0,0 +1,71 @@
+import csv
+import io
+import unittest
+
+from rigidity import rawcsv, rules
+
+
+class TestSplitRecord(unittest.TestCase):
+
+    def test_split(self):
+        self.assertEqual(rawcsv.split_record(b'a,b,,c'),
+                         [b'a', b'b', b'', b'c'])
+        self.assertEqual(rawcsv.split_record(b'a,"b,""c""",d'),
+                         [b'a', b'"b,""c"""', b'd'])
+        self.assertEqual(rawcsv.split_record(b'"a\nb";c', b';'),
+                         [b'"a\nb"', b'c'])
+        self.assertRaises(ValueError, rawcsv.split_record, b'a,"b')
+
+    def test_matches_csv(self):
+        '''
+        Test that decoded fields match the csv module's parsing.
+        '''
+        lines = ['plain,"quoted, with comma","with ""quotes""",,é',
+                 '"",x,"multi\nline"']
+        data = '\r\n'.join(lines) + '\r\n'
+        expected = list(csv.reader(io.StringIO(data, newline='')))
+        actual = [[rawcsv.decode_field(field)
+                   for field in rawcsv.split_record(record)]
+                  for record, terminator in
+                  rawcsv.records(io.BytesIO(data.encode('utf8')))]
+        self.assertEqual(actual, expected)
+
+    def test_encode_field(self):
+        self.assertEqual(rawcsv.encode_field('a'), b'a')
+        self.assertEqual(rawcsv.encode_field('a,"b"'), b'"a,""b"""')
+        self.assertEqual(rawcsv.encode_field(12), b'12')
+        self.assertEqual(rawcsv.encode_field(None), b'')
+        self.assertEqual(rawcsv.encode_field(b'\xff'), b'\xff')
+
+
+class TestProcess(unittest.TestCase):
+
+    def test_process(self):
+        data = (b'id,name,blob\r\n'
+                b'1, ann ,\xff\xfe\r\n'
+                b'x,bob,"a,b"\r\n'
+                b'3,"cy, jr",\x00\n')
+        output = io.BytesIO()
+        written = rawcsv.process(
+            io.BytesIO(data), output,
+            {0: [rules.Integer(action=rules.Integer.ACTION_DROPROW)],
+             1: [rules.Strip(), rules.Upper()]},
+            header=True)
+        self.assertEqual(written, 2)
+        # Untouched columns are copied without decoding them.
+        self.assertEqual(output.getvalue(),
+                         b'id,name,blob\r\n'
+                         b'1,ANN,\xff\xfe\r\n'
+                         b'3,"CY, JR",\x00\n')
+
+    def test_unchanged_rows(self):
+        data = b'"a",b\n"c",d\n'
+        output = io.BytesIO()
+        rawcsv.process(io.BytesIO(data), output, [[rules.Strip()]])
+        self.assertEqual(output.getvalue(), data)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, rawcsv.process, io.BytesIO(b'x\n'),
+                          io.BytesIO(), [[rules.Integer()]])
+        self.assertRaises(ValueError, list,
+                          rawcsv.records(io.BytesIO(b'"a\nb\n')))
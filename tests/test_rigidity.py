@@ -1,7 +1,9 @@
 import unittest
 import tempfile
 import csv
+import io
 import os
+import time
 
 try:
     from unittest import mock
@@ -180,6 +182,54 @@ class TestRigidity(unittest.TestCase):
             self.assertEqual(next(r), ['things', 'great'])
 
 
+class CountingRow(list):
+    '''
+    A list that counts assignments to its items.
+    '''
+    assignments = 0
+
+    def __setitem__(self, key, value):
+        self.assignments += 1
+        super().__setitem__(key, value)
+
+
+class TestRigidityInPlace(unittest.TestCase):
+    '''
+    Test that list rows are corrected in place and that unchanged
+    values are not stored again.
+    '''
+    def test_validate_read_in_place(self):
+        r = rigidity.Rigidity(None, [[rules.Strip()], [rules.Upper()]])
+        row = CountingRow(['a', 'b'])
+        result = r.validate_read(row)
+        self.assertIs(result, row)
+        self.assertEqual(result, ['a', 'B'])
+        self.assertEqual(row.assignments, 1)
+
+    def test_validate_write_tuple(self):
+        r = rigidity.Rigidity(None, [[rules.Rule()]])
+        self.assertEqual(r.validate_write(('a',)), ['a'])
+
+
+class TestRigidityRowRules(unittest.TestCase):
+    '''
+    Test that row-level rules are applied after the column rules.
+    '''
+    def test_validate_read(self):
+        r = rigidity.Rigidity(None, [[rules.Strip()], []],
+                              row_rules=[rules.CompositeUnique([0, 1])])
+        self.assertEqual(r.validate_read(['a ', 'b']), ['a', 'b'])
+        self.assertRaises(ValueError, r.validate_read, (' a', 'b'))
+
+    def test_validate_write(self):
+        row_rule = rules.CompositeUnique([0, 1],
+                                         rules.CompositeUnique.ACTION_DROPROW)
+        r = rigidity.Rigidity(None, [[], []], row_rules=[row_rule])
+        self.assertEqual(r.validate_write_batch([('a', 'b'), ('a', 'b'),
+                                                 ('a', 'c')]),
+                         [['a', 'b'], ['a', 'c']])
+
+
 class TestRigidityDropRow(unittest.TestCase):
     '''
     Test that the Rigidity class handles a DropRow exception correctly.
@@ -190,3 +240,337 @@ class TestRigidityDropRow(unittest.TestCase):
         r = rigidity.Rigidity(writer, r_rules)
         r.writerow(['a'])
         self.assertFalse(writer.writerow.called)
+
+
+class TestRigidityBatch(unittest.TestCase):
+    '''
+    Test the batch validation helpers.
+    '''
+    def test_validate_read_batch(self):
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        r = rigidity.Rigidity(None, r_rules)
+        self.assertEqual(r.validate_read_batch([('1',), ('a',), ('2',)]),
+                         [[1], [2]])
+
+    def test_validate_write_batch(self):
+        r_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        r = rigidity.Rigidity(None, r_rules)
+        self.assertEqual(r.validate_write_batch([('a',), ('3',)]), [[3]])
+
+    def test_validate_read_batch_prefetch(self):
+        '''
+        Test that lookup rules receive the distinct values of a batch,
+        after the rules preceding them in the column, in one call.
+        '''
+        lookup = LookupTable({'A': 1, 'B': 2})
+        r = rigidity.Rigidity(None, [[rules.Upper(), lookup]])
+        result = r.validate_read_batch([['a'], ['b'], ['a']])
+        self.assertEqual(result, [[1], [2], [1]])
+        self.assertEqual(lookup.calls, [['A', 'B']])
+
+    def test_prefetch_after_stateful_rule(self):
+        '''
+        Test that values are not prefetched when a stateful rule
+        precedes the lookup rule.
+        '''
+        lookup = LookupTable({'a': 1})
+        r = rigidity.Rigidity(None, [[rules.Cary(), lookup]])
+        self.assertEqual(r.prefetch_positions, [])
+        self.assertEqual(r.validate_read_batch([['a'], ['']]), [[1], [1]])
+
+    def test___iter___batches(self):
+        lookup = LookupTable({'1': 'x', '2': 'y'})
+        r = rigidity.Rigidity(iter([['1'], ['2'], ['1']]), [[lookup]],
+                              batch_size=2, read_ahead=True)
+        self.assertEqual(list(r), [['x'], ['y'], ['x']])
+        self.assertEqual(lookup.calls, [['1', '2'], ['1']])
+
+    def test___iter___streams(self):
+        '''
+        Test that rows are read one at a time unless reading ahead is
+        requested, even when a rule can prefetch values.
+        '''
+        reader = csv.reader(io.StringIO('a\nb\nc\n1\n'))
+        r = rigidity.Rigidity(reader, [[rules.Match('[a-z]')]])
+        rows = iter(r)
+        for line_num, value in enumerate('abc', 1):
+            self.assertEqual(next(rows), [value])
+            self.assertEqual(r.line_num, line_num)
+        self.assertRaises(ValueError, next, rows)
+
+    def test___iter___read_ahead_errors(self):
+        '''
+        Test that the valid rows before an error in the same batch are
+        yielded before the error is raised.
+        '''
+        lookup = LookupTable({'A': 1, 'B': 2})
+        r = rigidity.Rigidity(iter([['a'], ['b'], ['c'], ['a']]),
+                              [[rules.Upper(), lookup]], read_ahead=True)
+        rows = iter(r)
+        self.assertEqual([next(rows), next(rows)], [[1], [2]])
+        self.assertRaises(ValueError, next, rows)
+        self.assertEqual(lookup.calls, [['A', 'B', 'C']])
+
+    def test_prefetch_applies_rules_once(self):
+        '''
+        Test that the rules preceding a lookup rule are applied once for
+        each value, and again only for values on which they failed.
+        '''
+        integer = rules.Integer(action=rules.Integer.ACTION_DROPROW)
+        integer.read = mock.MagicMock(wraps=integer.read)
+        lookup = LookupTable({1: 'x', 2: 'y'})
+        r = rigidity.Rigidity(None, [[integer, lookup]])
+        result = r.validate_read_batch([['1'], ['z'], ['2']])
+        self.assertEqual(result, [['x'], ['y']])
+        self.assertEqual(lookup.calls, [[1, 2]])
+        self.assertEqual(integer.read.call_count, 4)
+
+
+class LookupTable(rules.Lookup):
+    '''
+    A lookup rule backed by a dict that records each call to resolve().
+    '''
+    def __init__(self, table):
+        super().__init__()
+        self.table = table
+        self.calls = []
+
+    def resolve(self, values):
+        self.calls.append(sorted(values))
+        return {v: self.table[v] for v in values if v in self.table}
+
+
+class TestRigidityScan(unittest.TestCase):
+    '''
+    Test the validate-only scan mode.
+    '''
+    def test_scan(self):
+        DATA = 'id,qty\n1,3\n2,x\n3,-\n4\n5,7\n'
+        reader = csv.reader(io.StringIO(DATA))
+        r_rules = [
+            [rules.Integer()],
+            [rules.ReplaceValue({'-': '0'},
+                                rules.ReplaceValue.ACTION_PASSTHROUGH),
+             rules.Integer()]
+        ]
+        r = rigidity.Rigidity(reader, r_rules, batch_size=2)
+        r.skip()
+        report = r.scan()
+        self.assertEqual(report.rows, 5)
+        self.assertEqual(report.passed, 3)
+        self.assertEqual(report.failed, 2)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.failing_rows, [3, 5])
+        self.assertEqual(report.errors, {(1, 'Integer'): 1, (1, None): 1})
+
+    def test_scan_drops_and_row_rules(self):
+        rows = [['a ', '1'], ['a', '1'], ['b', 'x']]
+        r_rules = [[rules.Strip()],
+                   [rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        r = rigidity.Rigidity(iter(rows), r_rules,
+                              row_rules=[rules.CompositeUnique([0, 1])])
+        report = r.scan(max_failures=0)
+        self.assertEqual((report.passed, report.failed, report.dropped),
+                         (1, 1, 1))
+        self.assertEqual(report.errors, {(None, 'CompositeUnique'): 1})
+        self.assertEqual(report.drops, {(1, 'Integer'): 1})
+        self.assertEqual(report.failing_rows, [])
+        # The input rows are not modified.
+        self.assertEqual(rows[0], ['a ', '1'])
+
+    def test_scan_short_rows(self):
+        '''
+        Test that rows missing a column are counted as failures.
+        '''
+        rows = [['a', 'b'], ['a'], ['c', 'd']]
+        r = rigidity.Rigidity(iter(rows), [[rules.Strip()]],
+                              row_rules=[rules.CompositeUnique([0, 1])])
+        report = r.scan()
+        self.assertEqual((report.passed, report.failed), (2, 1))
+        self.assertEqual(report.failing_rows, [2])
+        self.assertEqual(report.errors, {(None, 'CompositeUnique'): 1})
+
+        rows = [{'id': '1'}, {}]
+        r = rigidity.Rigidity(iter(rows), {'id': [rules.Integer()]})
+        report = r.scan()
+        self.assertEqual((report.passed, report.failed), (1, 1))
+        self.assertEqual(report.errors, {('id', None): 1})
+
+
+class Yielding(rules.Rule):
+    '''
+    A rule that lets other threads run before returning its value.
+    '''
+    def apply(self, value):
+        time.sleep(0.0001)
+        return value
+
+
+class TestRigidityThreaded(unittest.TestCase):
+    '''
+    Test validation of batches in a thread pool.
+    '''
+    def test_threaded(self):
+        rows = [[str(i % 500), ' %d ' % i] for i in range(0, 2000)]
+        r_rules = [[rules.Integer(),
+                    rules.Unique(action=rules.Unique.ACTION_DROPROW)],
+                   [rules.Strip()]]
+        r = rigidity.Rigidity(iter(rows), r_rules)
+        result = list(r.threaded(workers=4, batch_size=50))
+        # The first occurrence of each key is kept.
+        self.assertEqual(result, [[i, str(i)] for i in range(0, 500)])
+
+    def test_threaded_matches_sequential(self):
+        '''
+        Test that stateful rules see values in row order.
+        '''
+        def make_rows():
+            rows = []
+            for group in range(0, 200):
+                rows.append([str(group), 'k%d' % (group % 7)])
+                rows.extend([['', 'k%d' % (i % 13)] for i in range(0, 9)])
+            return rows
+
+        def make_rules():
+            return [[Yielding(), rules.Cary()],
+                    [Yielding(),
+                     rules.Unique(action=rules.Unique.ACTION_DROPROW)]]
+        expected = list(rigidity.Rigidity(iter(make_rows()), make_rules()))
+        for workers, batch_size in ((8, 5), (3, 7), (2, 1000)):
+            r = rigidity.Rigidity(iter(make_rows()), make_rules())
+            self.assertEqual(list(r.threaded(workers, batch_size)), expected)
+
+    def test_threaded_errors_in_order(self):
+        rows = [['a'], ['b'], ['a'], ['x1'], ['c']]
+        r = rigidity.Rigidity(
+            iter(rows), [[rules.Contains('x'), rules.Unique()]])
+        # The Contains error on the first row is raised, not the
+        #   Unique error on the third.
+        self.assertRaisesRegex(ValueError, 'not in value', list,
+                               r.threaded(workers=4, batch_size=1))
+
+    def test_threaded_prefetch(self):
+        '''
+        Test that each batch resolves its values once, without
+        replacing the results of batches in other threads.
+        '''
+        rows = [[str(i % 30)] for i in range(0, 2000)]
+        lookup = LookupTable(dict((str(i), i) for i in range(0, 25)))
+        lookup.missing_action = rules.Lookup.ACTION_DROPROW
+        r = rigidity.Rigidity(iter(rows), [[lookup, Yielding()]])
+        result = list(r.threaded(workers=8, batch_size=10))
+        self.assertEqual(result, [[i % 30] for i in range(0, 2000)
+                                  if i % 30 < 25])
+        self.assertEqual(len(lookup.calls), 200)
+
+    def test_threaded_order(self):
+        rows = [[str(i)] for i in range(0, 1000)]
+        r = rigidity.Rigidity(iter(rows), [[rules.Integer()]])
+        self.assertEqual(list(r.threaded(workers=3, batch_size=7)),
+                         [[i] for i in range(0, 1000)])
+
+    def test_threaded_unsafe_rule(self):
+        '''
+        Test that stateful rules which are not thread-safe are applied
+        to one batch at a time.
+        '''
+        rows = [['k%d' % (i % 11)] for i in range(0, 1000)]
+
+        def make_rules():
+            return [[Yielding(), rules.WindowedUnique(
+                action=rules.WindowedUnique.ACTION_DROPROW, max_keys=10)]]
+        self.assertFalse(rules.WindowedUnique.thread_safe)
+        expected = list(rigidity.Rigidity(iter(rows), make_rules()))
+        r = rigidity.Rigidity(iter(rows), make_rules())
+        self.assertEqual(list(r.threaded(workers=8, batch_size=5)), expected)
+
+
+class TestRigidityTransform(unittest.TestCase):
+    '''
+    Test the single-call read, validate and write pipeline.
+    '''
+    def test_transform(self):
+        reader = csv.reader(io.StringIO('1, a\n2, b\nx, c\n2, d\n'))
+        output = io.StringIO()
+        writer = mock.MagicMock(wraps=csv.writer(output, lineterminator='\n'))
+        read_rules = [[rules.Integer(action=rules.Integer.ACTION_DROPROW)],
+                      [rules.Strip()]]
+        write_rules = [[rules.Unique(action=rules.Unique.ACTION_DROPROW)],
+                       [rules.Upper()]]
+        report = rigidity.Rigidity.transform(reader, writer, read_rules,
+                                             write_rules, batch_size=3)
+        self.assertEqual(output.getvalue(), '1,A\n2,B\n')
+        self.assertEqual((report.rows, report.written, report.dropped_read,
+                          report.dropped_write), (4, 2, 1, 1))
+        self.assertEqual(report.dropped, 2)
+        # Each batch is written with one call.
+        self.assertEqual(writer.writerows.call_count, 2)
+        self.assertEqual(writer.writerow.call_count, 0)
+
+    def test_transform_subclass(self):
+        '''
+        Test that options are passed to subclasses by keyword.
+        '''
+        class Subclass(rigidity.Rigidity):
+            def __init__(self, csvobj, rules=[], extra=None, **kwargs):
+                super().__init__(csvobj, rules, **kwargs)
+                self.extra = extra
+        output = io.StringIO()
+        report = Subclass.transform(
+            iter([['a'], ['a']]), csv.writer(output, lineterminator='\n'),
+            write_row_rules=[rules.CompositeUnique(
+                [0], rules.CompositeUnique.ACTION_DROPROW)], batch_size=1)
+        self.assertEqual(output.getvalue(), 'a\n')
+        self.assertEqual(report.dropped_write, 1)
+
+    def test_transform_error(self):
+        writer = mock.MagicMock()
+        self.assertRaises(ValueError, rigidity.Rigidity.transform,
+                          iter([['a']]), writer, [[rules.Integer()]])
+        self.assertRaises(ValueError, rigidity.Rigidity.transform,
+                          iter([]), writer, batch_size=0)
+
+
+class TestRigidityCache(unittest.TestCase):
+    '''
+    Test the whole-row cache of validated results.
+    '''
+    def make_rules(self):
+        self.calls = 0
+
+        class Counting(rules.Rule):
+            def apply(rule, value):
+                self.calls += 1
+                return value.strip()
+        return [[Counting(), rules.Upper()],
+                [rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+
+    def test_cache(self):
+        rows = [[' a ', '1'], [' a ', 'x'], [' b ', '2']] * 10
+        rows = [list(row) for row in rows]
+        r = rigidity.Rigidity(iter(rows), self.make_rules(), cache_size=10)
+        result = list(r)
+        self.assertEqual(result, [['A', 1], ['B', 2]] * 10)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(r.cache.hits, 27)
+        # Cached results are copies, corrected in place.
+        self.assertIsNot(result[0], result[2])
+
+    def test_cache_tuples_and_dicts(self):
+        r = rigidity.Rigidity(None, {'a': [rules.Upper()]}, cache_size=10)
+        self.assertEqual(r.validate_read({'a': 'x'}), {'a': 'X'})
+        self.assertEqual(r.validate_read({'a': 'x'}), {'a': 'X'})
+        r = rigidity.Rigidity(None, [[rules.Upper()]], cache_size=10)
+        self.assertEqual(r.validate_write(('x',)), ['X'])
+        self.assertEqual(r.validate_write(('x',)), ['X'])
+        self.assertEqual(r.cache.hits, 1)
+
+    def test_cache_errors_not_cached(self):
+        r = rigidity.Rigidity(None, [[rules.Integer()]], cache_bytes=10000)
+        self.assertRaises(ValueError, r.validate_read, ['x'])
+        self.assertRaises(ValueError, r.validate_read, ['x'])
+        self.assertEqual(len(r.cache), 0)
+
+    def test_cache_stateful(self):
+        self.assertRaises(ValueError, rigidity.Rigidity, None,
+                          [[rules.Unique()]], cache_size=10)
@@ -1,3 +1,10 @@
+import datetime
+import os
+import pickle
+import re
+import shutil
+import sqlite3
+import tempfile
 import unittest
 import rigidity.rules
 from rigidity import rules, errors
@@ -14,6 +21,13 @@ class TestRule(unittest.TestCase):
     def test_apply(self):
         self.assertEqual(self.rule.apply('hello'), 'hello')
 
+    def test_merge_state(self):
+        self.assertIsNone(self.rule.export_state())
+        self.rule.merge_state(None)
+        self.assertRaises(NotImplementedError,
+                          rules.SpillingUnique(memory_keys=1).merge_state,
+                          None)
+
 
 class TestBoolean(unittest.TestCase):
 
@@ -89,6 +103,35 @@ class TestBytes(unittest.TestCase):
         self.assertRaises(ValueError, rule.write, 'ጷ'.encode('utf8'))
 
 
+class TestRowRule(unittest.TestCase):
+
+    def test_apply(self):
+        self.assertEqual(rules.RowRule().read(['a', 'b']), ['a', 'b'])
+
+
+class TestCompositeUnique(unittest.TestCase):
+
+    def test_apply(self):
+        rule = rules.CompositeUnique([0, 2])
+        self.assertEqual(rule.apply(['1', 'x', 'a']), ['1', 'x', 'a'])
+        self.assertEqual(rule.apply(['1', 'y', 'b']), ['1', 'y', 'b'])
+        self.assertRaises(ValueError, rule.apply, ['1', 'z', 'a'])
+
+    def test_apply_dict_row(self):
+        rule = rules.CompositeUnique(['store', 'sku'],
+                                     rules.CompositeUnique.ACTION_DROPROW)
+        rule.apply({'store': 1, 'sku': 'A', 'qty': 3})
+        self.assertRaises(errors.DropRow, rule.apply,
+                          {'store': 1, 'sku': 'A', 'qty': 4})
+
+    def test_merge_state(self):
+        earlier = rules.CompositeUnique([0, 1])
+        earlier.apply(['a', 'b'])
+        later = rules.CompositeUnique([0, 1])
+        later.merge_state(earlier.export_state())
+        self.assertRaises(ValueError, later.apply, ['a', 'b'])
+
+
 class TestCapitalizeWords(unittest.TestCase):
 
     def test_apply(self):
@@ -162,6 +205,20 @@ class TestCary(unittest.TestCase):
                          'Rule does not allow values to pass through')
         self.assertEqual(rule.apply(''), 'test', 'Rule does not cary values')
 
+    def test_merge_state(self):
+        '''
+        Test that a carried value is passed on to a later copy.
+        '''
+        earlier = rigidity.rules.Cary(
+            action=rigidity.rules.Cary.ACTION_DEFAULT, default='default')
+        earlier.apply('')
+        self.assertIsNone(earlier.export_state())
+        earlier.apply('test')
+        later = rigidity.rules.Cary()
+        later.merge_state(None)
+        later.merge_state(earlier.export_state())
+        self.assertEqual(later.apply(''), 'test')
+
 
 class TestContains(unittest.TestCase):
 
@@ -178,6 +235,61 @@ class TestContains(unittest.TestCase):
     def test_apply_invalid(self):
         self.assertRaises(Exception, rigidity.rules.Contains, None)
 
+    def test_apply_many_strings(self):
+        strings = ['token%d;' % i for i in range(0, 100)]
+        rule = rigidity.rules.Contains(strings)
+        self.assertIsNotNone(rule.automaton)
+        value = ''.join(reversed(strings))
+        self.assertEqual(rule.apply(value), value)
+        with self.assertRaisesRegex(ValueError, 'token7;'):
+            rule.apply(value.replace('token7;', ''))
+
+
+class TestContainsAny(unittest.TestCase):
+
+    def test_apply(self):
+        for strings in (['cat', 'dog'],
+                        ['w%d' % i for i in range(0, 100)] + ['cat']):
+            rule = rigidity.rules.ContainsAny(strings)
+            self.assertEqual(rule.apply('a cat'), 'a cat')
+            self.assertRaises(ValueError, rule.apply, 'a bird')
+
+
+class TestContainsNone(unittest.TestCase):
+
+    def test_apply(self):
+        for strings in (['cat', 'dog'],
+                        ['w%d' % i for i in range(0, 100)] + ['cat']):
+            rule = rigidity.rules.ContainsNone(strings)
+            self.assertEqual(rule.apply('a bird'), 'a bird')
+            with self.assertRaisesRegex(ValueError, 'cat'):
+                rule.apply('a cat')
+
+
+class TestForeignKey(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = os.path.join(self.directory, 'products.idx')
+        csvpath = os.path.join(self.directory, 'products.csv')
+        with open(csvpath, 'w') as csvfile:
+            csvfile.write('sku,name\nA1,Apple\nB2,Banana\n')
+        rules.ForeignKey.build_index(csvpath, 'sku', self.index)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_apply(self):
+        rule = rules.ForeignKey(self.index)
+        self.assertEqual(rule.apply('A1'), 'A1')
+        self.assertEqual(rule.apply('B2'), 'B2')
+        self.assertRaises(ValueError, rule.apply, 'sku')
+        self.assertRaises(ValueError, rule.apply, 'C3')
+
+    def test_apply_action_droprow(self):
+        rule = rules.ForeignKey(self.index, rules.ForeignKey.ACTION_DROPROW)
+        self.assertRaises(errors.DropRow, rule.apply, 'C3')
+
 
 class TestInteger(unittest.TestCase):
 
@@ -229,6 +341,104 @@ class TestFloat(unittest.TestCase):
         self.assertRaises(Exception, rule.apply, 'a')
 
 
+class CountingLookup(rules.Lookup):
+    '''
+    A lookup rule backed by a dict that records each call to resolve().
+    '''
+    def __init__(self, table, **kwargs):
+        super().__init__(**kwargs)
+        self.table = table
+        self.calls = []
+
+    def resolve(self, values):
+        self.calls.append(sorted(values))
+        return {v: self.table[v] for v in values if v in self.table}
+
+
+class TestLookup(unittest.TestCase):
+
+    def test_apply_without_prefetch(self):
+        rule = CountingLookup({'a': 1})
+        self.assertEqual(rule.apply('a'), 1)
+        self.assertEqual(rule.apply('a'), 1)
+        self.assertEqual(rule.calls, [['a']])
+
+    def test_apply_without_prefetch_bounded(self):
+        '''
+        Test that results of values resolved one at a time are not kept
+        without limit.
+        '''
+        rule = CountingLookup({'a': 1})
+        rule.FALLBACK_SIZE = 10
+        for i in range(0, 25):
+            self.assertRaises(ValueError, rule.apply, str(i))
+            self.assertLessEqual(len(rule.results.fallback), 10)
+        self.assertEqual(rule.apply('a'), 1)
+        self.assertEqual((rule.results.resolved, rule.results.missing),
+                         ({}, set()))
+
+    def test_apply_prefetched(self):
+        rule = CountingLookup({'a': 1, 'b': 2})
+        rule.prefetch(['a', 'b', 'a', 'c'])
+        self.assertEqual(rule.apply('b'), 2)
+        self.assertRaises(ValueError, rule.apply, 'c')
+        self.assertEqual(rule.calls, [['a', 'b', 'c']])
+
+    def test_apply_missing_actions(self):
+        rule = CountingLookup({}, missing_action=rules.Lookup.ACTION_DROPROW)
+        self.assertRaises(errors.DropRow, rule.apply, 'x')
+        rule = CountingLookup(
+            {}, missing_action=rules.Lookup.ACTION_PASSTHROUGH)
+        self.assertEqual(rule.apply('x'), 'x')
+        rule = CountingLookup(
+            {}, missing_action=rules.Lookup.ACTION_DEFAULT_VALUE,
+            default_value='d')
+        self.assertEqual(rule.apply('x'), 'd')
+
+    def test_resolve_not_implemented(self):
+        self.assertRaises(NotImplementedError, rules.Lookup().apply, 'x')
+
+
+class TestSQLiteLookup(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE stores (id TEXT, name TEXT)')
+        connection.executemany('INSERT INTO stores VALUES (?, ?)',
+                               [('1', 'North'), ('2', 'South')])
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_apply_membership(self):
+        rule = rules.SQLiteLookup(self.path, 'stores', 'id')
+        self.assertEqual(rule.apply('1'), '1')
+        self.assertRaises(ValueError, rule.apply, '3')
+
+    def test_apply_value_column(self):
+        rule = rules.SQLiteLookup(self.path, 'stores', 'id', 'name')
+        rule.prefetch(['1', '2', '3'])
+        self.assertEqual(rule.apply('2'), 'South')
+        self.assertEqual(rule.results.missing, {'3'})
+
+    def test_pickle(self):
+        rule = rules.SQLiteLookup(self.path, 'stores', 'id', 'name')
+        copy = pickle.loads(pickle.dumps(rule))
+        self.assertEqual(copy.apply('1'), 'North')
+
+    def test_resolve_many_values(self):
+        '''
+        Test that more values than fit in a single query are resolved.
+        '''
+        rule = rules.SQLiteLookup(self.path, 'stores', 'id', 'name')
+        values = [str(i) for i in range(rule.QUERY_SIZE * 2 + 1)]
+        self.assertEqual(rule.resolve(values), {'1': 'North', '2': 'South'})
+
+
 class TestNoneToEmptyString(unittest.TestCase):
 
     def test_apply(self):
@@ -350,6 +560,175 @@ class TestUnique(unittest.TestCase):
         rule.apply('test')
         self.assertRaises(Exception, rule.apply, 'test')
 
+    def test_merge_state(self):
+        earlier = rules.Unique()
+        earlier.apply('a')
+        later = rules.Unique()
+        later.merge_state(earlier.export_state())
+        self.assertRaises(ValueError, later.apply, 'a')
+
+
+class TestUniqueIndex(unittest.TestCase):
+    '''
+    Test that Unique can be seeded with the keys of a previous run.
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = os.path.join(self.directory, 'unique.idx')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_index_starts_empty(self):
+        rule = rules.Unique(index=self.index)
+        self.assertIsNone(rule.base)
+        self.assertEqual(rule.apply('a'), 'a')
+
+    def test_save_and_load(self):
+        first = rules.Unique(index=self.index)
+        first.apply('a')
+        first.apply(1)
+        first.save()
+
+        second = rules.Unique(action=rules.Unique.ACTION_DROPROW,
+                              index=self.index)
+        self.assertRaises(errors.DropRow, second.apply, 'a')
+        self.assertRaises(errors.DropRow, second.apply, 1)
+        self.assertEqual(second.apply('1'), '1')
+        self.assertEqual(set(second.encountered), {'1'})
+
+        # Saving again keeps the keys of both runs.
+        second.save()
+        third = rules.Unique(index=self.index)
+        for value in ('a', 1, '1'):
+            self.assertRaises(ValueError, third.apply, value)
+        self.assertEqual(len(third.base), 3)
+
+    def test_save_without_path(self):
+        self.assertRaises(ValueError, rules.Unique().save)
+
+
+class TestBloomUnique(unittest.TestCase):
+
+    def test_apply(self):
+        rule = rules.BloomUnique(100)
+        for i in range(0, 10):
+            self.assertEqual(rule.apply(i), i)
+        self.assertRaises(ValueError, rule.apply, 5)
+
+    def test_apply_action_droprow(self):
+        rule = rules.BloomUnique(100, action=rules.BloomUnique.ACTION_DROPROW)
+        rule.apply('a')
+        self.assertRaises(errors.DropRow, rule.apply, 'a')
+
+    def test_merge_state(self):
+        earlier = rules.BloomUnique(100)
+        earlier.apply('a')
+        later = rules.BloomUnique(100)
+        later.apply('b')
+        later.merge_state(earlier.export_state())
+        self.assertRaises(ValueError, later.apply, 'a')
+        self.assertRaises(ValueError, later.apply, 'b')
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            state = os.path.join(directory, 'seen.bloom')
+            rule = rules.BloomUnique(100, state=state)
+            rule.apply('a')
+            rule.save(state)
+            rule = rules.BloomUnique(100, state=state)
+            self.assertRaises(ValueError, rule.apply, 'a')
+            self.assertEqual(rule.apply('b'), 'b')
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestWindowedUnique(unittest.TestCase):
+
+    def test_apply_max_keys(self):
+        rule = rules.WindowedUnique(max_keys=2)
+        rule.apply('a')
+        rule.apply('b')
+        self.assertRaises(ValueError, rule.apply, 'a')
+        rule.apply('c')  # 'a' leaves the window
+        self.assertEqual(rule.apply('a'), 'a')
+        self.assertEqual(len(rule.encountered), 2)
+
+    def test_apply_seconds(self):
+        now = [0.0]
+        rule = rules.WindowedUnique(action=rules.WindowedUnique.ACTION_DROPROW,
+                                    seconds=10, clock=lambda: now[0])
+        rule.apply('a')
+        now[0] = 5.0
+        rule.apply('b')
+        self.assertRaises(errors.DropRow, rule.apply, 'a')
+        now[0] = 12.0
+        self.assertEqual(rule.apply('a'), 'a')
+        self.assertRaises(errors.DropRow, rule.apply, 'b')
+        self.assertEqual(list(rule.encountered), ['b', 'a'])
+
+    def test_no_window(self):
+        self.assertRaises(ValueError, rules.WindowedUnique)
+
+    def test_merge_state(self):
+        earlier = rules.WindowedUnique(max_keys=2)
+        for value in ('a', 'b', 'c'):
+            earlier.apply(value)
+        later = rules.WindowedUnique(max_keys=2)
+        later.apply('d')
+        rule = rules.WindowedUnique(max_keys=2)
+        rule.merge_state(earlier.export_state())
+        rule.merge_state(later.export_state())
+        self.assertEqual(list(rule.encountered), ['c', 'd'])
+        self.assertEqual(rule.apply('b'), 'b')
+
+    def test_export_state_copy(self):
+        rule = rules.WindowedUnique(max_keys=2)
+        rule.apply('a')
+        state = rule.export_state()
+        rule.apply('b')
+        self.assertEqual(list(state), ['a'])
+
+
+class TestSpillingUnique(unittest.TestCase):
+
+    def setUp(self):
+        self.rule = rules.SpillingUnique(memory_keys=10, partitions=4)
+
+    def tearDown(self):
+        self.rule.close()
+
+    def test_apply(self):
+        for i in range(0, 100):
+            self.assertEqual(self.rule.apply(i), i)
+        self.assertLess(len(self.rule.encountered), 10)
+        for i in range(0, 100):
+            self.assertRaises(ValueError, self.rule.apply, i)
+        self.assertEqual(self.rule.apply('0'), '0')
+
+    def test_runs_are_merged(self):
+        for i in range(0, 1000):
+            self.rule.apply(i)
+        for runs in self.rule.runs:
+            self.assertLessEqual(len(runs), 8)
+        self.assertEqual(sum(len(run) for runs in self.rule.runs
+                             for run in runs), 1000)
+
+    def test_apply_action_droprow(self):
+        rule = rules.SpillingUnique(rules.SpillingUnique.ACTION_DROPROW,
+                                    memory_keys=1)
+        rule.apply('a')
+        self.assertRaises(errors.DropRow, rule.apply, 'a')
+        rule.close()
+
+    def test_close_removes_directory(self):
+        for i in range(0, 20):
+            self.rule.apply(i)
+        self.assertTrue(os.listdir(self.rule.directory))
+        self.rule.close()
+        self.assertFalse(os.path.exists(self.rule.directory))
+
 
 class TestDrop(unittest.TestCase):
 
@@ -431,3 +810,197 @@ class TestUpper(unittest.TestCase):
         rule = rigidity.rules.Upper()
         self.assertEqual(rule.apply('hello'), 'HELLO')
         self.assertEqual(rule.apply('123'), '123')
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_apply(self):
+        rule = rigidity.rules.Match(r'\d{5}')
+        self.assertEqual(rule.apply('12345'), '12345')
+        self.assertRaises(ValueError, rule.apply, '123456')
+        rule = rigidity.rules.Match(r'\d{5}',
+                                    rigidity.rules.Match.ACTION_DROPROW)
+        self.assertRaises(rigidity.errors.DropRow, rule.apply, 'x')
+
+    def test_prefetch(self):
+        '''
+        Test that batch matching agrees with matching each value,
+        including for expressions that can match across values.
+        '''
+        values = ['a', 'ab', 'b', '', 'a\nb', '1', 'a b', ' b', 'aa', 'a\n',
+                  '\na']
+        for pattern in (r'a+', r'a.*', r'[\s\S]*b', r'\d+|x', r'(?s).*',
+                        r'a|', r'\s*', r'(a)b', r'^a', r'a\n?'):
+            rule = rigidity.rules.Match(pattern, batch=True)
+            rule.prefetch(values)
+            for value in values:
+                expected = re.fullmatch(pattern, value) is not None
+                try:
+                    rule.apply(value)
+                    matched = True
+                except ValueError:
+                    matched = False
+                self.assertEqual(matched, expected, (pattern, value))
+
+    def test_prefetch_results(self):
+        rule = rigidity.rules.Match(r'[a-z]+', batch=True)
+        rule.prefetch({'abc', 'ABC', 'de', 3})
+        self.assertEqual(rule.results.matched, {'abc', 'de'})
+        self.assertEqual(rule.results.unmatched, {'ABC'})
+        self.assertIsNone(
+            rigidity.rules.Match(r'^\w+$', batch=True).batch_regex)
+        self.assertIsNone(rigidity.rules.Match(r'[a-z]+').batch_regex)
+
+    def test_prefetch_line_breaks(self):
+        '''
+        Test that a value ending with a line break is not matched by
+        the batch search, where `$` may match before the line break.
+        '''
+        rule = rigidity.rules.Match(r'[a-z]+', batch=True)
+        r = rigidity.Rigidity(None, [[rule]])
+        self.assertEqual(r.prefetch_positions, [(0, 0)])
+        self.assertEqual(r.validate_read_batch([['abc'], ['de']]),
+                         [['abc'], ['de']])
+        self.assertRaises(ValueError, r.validate_read_batch,
+                          [['abc'], ['abc\n']])
+
+    def test_no_batch(self):
+        r = rigidity.Rigidity(None, [[rigidity.rules.Match(r'[a-z]+')]])
+        self.assertEqual(r.prefetch_positions, [])
+
+    def test_pickle(self):
+        rule = rigidity.rules.Match(r'[a-z]+', batch=True)
+        rule.prefetch(['abc', 'ABC'])
+        copy = pickle.loads(pickle.dumps(rule))
+        self.assertEqual(copy.results.matched, set())
+        self.assertEqual(copy.apply('abc'), 'abc')
+        self.assertRaises(ValueError, copy.apply, 'ABC')
+
+    def test_rigidity_batches(self):
+        rule = rigidity.rules.Match(r'\d{3}',
+                                    rigidity.rules.Match.ACTION_DROPROW,
+                                    batch=True)
+        rows = [['%03d' % i] for i in range(0, 50)] + [['bad']]
+        r = rigidity.Rigidity(iter(rows), [[rule]], batch_size=20,
+                              read_ahead=True)
+        self.assertEqual(len(list(r)), 50)
+
+
+class TestExtract(unittest.TestCase):
+
+    def test_apply(self):
+        rule = rigidity.rules.Extract(r'id=(\d+)')
+        self.assertEqual(rule.apply('x id=42 y'), '42')
+        self.assertRaises(ValueError, rule.apply, 'none')
+        rule = rigidity.rules.Extract(r'\d+')
+        self.assertEqual(rule.apply('ab12cd'), '12')
+        rule = rigidity.rules.Extract(r'(?P<a>\w)(?P<b>\d)', group='b',
+                                      action=rigidity.rules.Extract.
+                                      ACTION_DROPROW)
+        self.assertEqual(rule.apply('x1'), '1')
+        self.assertRaises(rigidity.errors.DropRow, rule.apply, '--')
+
+
+class TestSubstitute(unittest.TestCase):
+
+    def test_apply(self):
+        rule = rigidity.rules.Substitute(r'\s+', ' ')
+        self.assertEqual(rule.apply('a  b\t\tc'), 'a b c')
+        rule = rigidity.rules.Substitute('-', '', count=1)
+        self.assertEqual(rule.apply('1-2-3'), '12-3')
+
+
+class TestDateTime(unittest.TestCase):
+
+    def test_read_iso(self):
+        rule = rigidity.rules.DateTime()
+        self.assertEqual(rule.read('2024-03-05T10:20:30'),
+                         datetime.datetime(2024, 3, 5, 10, 20, 30))
+        self.assertEqual(rule.format, rigidity.rules.DateTime.FORMAT_ISO)
+        self.assertRaises(ValueError, rule.read, '03/05/2024')
+
+    def test_infer_format(self):
+        rule = rigidity.rules.DateTime()
+        self.assertEqual(rule.read('03/05/2024 08:09:10'),
+                         datetime.datetime(2024, 3, 5, 8, 9, 10))
+        self.assertEqual(rule.format, '%m/%d/%Y %H:%M:%S')
+        # Unpadded values are handled by strptime.
+        self.assertEqual(rule.read('3/5/2024 8:09:10'),
+                         datetime.datetime(2024, 3, 5, 8, 9, 10))
+
+    def test_merge_state(self):
+        rule = rigidity.rules.DateTime()
+        self.assertTrue(rule.stateful)
+        self.assertIsNone(rule.export_state())
+        rule.read('2024-03-05')
+        later = rigidity.rules.DateTime()
+        later.merge_state(None)
+        later.merge_state(rule.export_state())
+        later.merge_state(('%m/%d/%Y',))
+        self.assertEqual(later.format, rigidity.rules.DateTime.FORMAT_ISO)
+        self.assertRaises(ValueError, later.read, '03/05/2024')
+        self.assertFalse(rigidity.rules.DateTime(infer=False).stateful)
+        self.assertFalse(rigidity.rules.DateTime('%Y').stateful)
+
+    def test_fingerprint(self):
+        '''
+        Test that the inferred format, cache and parsers are not part
+        of the fingerprint.
+        '''
+        rule = rigidity.rules.DateTime()
+        fingerprint = rule.fingerprint()
+        rule.read('2024/03/05')
+        self.assertEqual(rule.fingerprint(), fingerprint)
+        self.assertNotIn('0x', fingerprint)
+
+    def test_no_inference(self):
+        rule = rigidity.rules.DateTime(['%d.%m.%Y', 'iso'], infer=False)
+        self.assertEqual(rule.read('05.03.2024'),
+                         datetime.datetime(2024, 3, 5))
+        self.assertEqual(rule.read('2024-03-06'),
+                         datetime.datetime(2024, 3, 6))
+        self.assertIsNone(rule.format)
+
+    def test_fixed_width_parser(self):
+        '''
+        Test that the fixed-width parser agrees with strptime.
+        '''
+        fmt = '%Y/%m/%d %H:%M'
+        rule = rigidity.rules.DateTime(fmt)
+        for value in ('2024/02/29 23:59', '2023/02/29 10:00',
+                      '2024/1/02 10:00', '2024/01/02T10:00',
+                      '2024/01/02 1x:00', '２０２４/01/02 10:00'):
+            try:
+                expected = datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                expected = None
+            try:
+                actual = rule.read(value)
+            except ValueError:
+                actual = None
+            self.assertEqual(actual, expected, value)
+
+    def test_actions(self):
+        rule = rigidity.rules.DateTime(
+            action=rigidity.rules.DateTime.ACTION_DROPROW)
+        self.assertRaises(rigidity.errors.DropRow, rule.read, 'never')
+        rule = rigidity.rules.DateTime(
+            action=rigidity.rules.DateTime.ACTION_DEFAULT, default='?')
+        self.assertEqual(rule.read('never'), '?')
+
+    def test_cache(self):
+        rule = rigidity.rules.DateTime(cache_size=2)
+        first = rule.read('2024-01-01')
+        self.assertIs(rule.read('2024-01-01'), first)
+        rule.read('2024-01-02')
+        rule.read('2024-01-03')
+        self.assertLessEqual(len(rule.cache), 2)
+
+    def test_write(self):
+        rule = rigidity.rules.DateTime('%m/%d/%Y')
+        self.assertEqual(rule.write(datetime.datetime(2024, 3, 5)),
+                         '03/05/2024')
+        rule = rigidity.rules.DateTime(output_format='%Y%m%d')
+        self.assertEqual(rule.write('2024-03-05'), '20240305')
+        self.assertEqual(rigidity.rules.DateTime().write(
+            datetime.date(2024, 3, 5)), '2024-03-05')
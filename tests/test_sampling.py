@@ -0,0 +1,98 @@
+import gzip
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from rigidity import rules, sampling
+
+
+class TestSample(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.csv')
+        with open(self.path, 'w', newline='') as csvfile:
+            csvfile.write('id,qty\n')
+            for i in range(0, 1000):
+                # Every tenth row has an invalid quantity.
+                qty = 'x' if i % 10 == 0 else str(i)
+                csvfile.write('%d,"%s"\n' % (i, qty))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sample_random(self):
+        report = sampling.sample(self.path, [[rules.Integer()],
+                                             [rules.Integer()]],
+                                 size=200, seed=1, header=True)
+        self.assertGreater(report.rows, 100)
+        self.assertLessEqual(report.rows, 200)
+        self.assertGreater(report.error_rate, 0.02)
+        self.assertLess(report.error_rate, 0.25)
+        self.assertEqual(report.approximate, [])
+
+    def test_sample_path_types(self):
+        r_rules = [[rules.Integer()], [rules.Integer()]]
+        expected = sampling.sample(self.path, r_rules, seed=1, header=True)
+        paths = [os.fsencode(self.path)]
+        if hasattr(os, 'PathLike'):
+            paths.append(pathlib.Path(self.path))
+        for path in paths:
+            report = sampling.sample(path, r_rules, seed=1, header=True)
+            self.assertEqual((report.rows, report.failed),
+                             (expected.rows, expected.failed))
+
+    def test_sample_stratified(self):
+        r_rules = [[rules.Integer(), rules.Unique()],
+                   [rules.Integer(action=rules.Integer.ACTION_DROPROW)]]
+        report = sampling.sample(self.path, r_rules, size=100, seed=2,
+                                 method=sampling.SAMPLE_STRATIFIED,
+                                 header=True)
+        self.assertGreater(report.rows, 90)
+        self.assertEqual(report.failed, 0)
+        self.assertGreater(report.drop_rate, 0.02)
+        self.assertLess(report.drop_rate, 0.25)
+        self.assertEqual(report.approximate, [(0, 'Unique')])
+
+    def test_sample_stream(self):
+        '''
+        Test that inputs that cannot seek are reservoir sampled.
+        '''
+        class Stream(io.BytesIO):
+            def seekable(self):
+                return False
+
+        with open(self.path, 'rb') as csvfile:
+            stream = Stream(csvfile.read())
+        report = sampling.sample(stream, [[rules.Integer()], []], size=50,
+                                 seed=3, header=True)
+        self.assertEqual(report.rows, 50)
+        self.assertEqual(report.failed, 0)
+        self.assertFalse(stream.closed)
+
+    def test_sample_compressed(self):
+        path = self.path + '.gz'
+        with open(self.path, 'rb') as infile, gzip.open(path, 'wb') as out:
+            shutil.copyfileobj(infile, out)
+        report = sampling.sample(path, [[rules.Integer()], []], size=50,
+                                 seed=3, header=True)
+        self.assertEqual(report.rows, 50)
+        self.assertEqual(report.failed, 0)
+
+    def test_sample_quoted_line_breaks(self):
+        with open(self.path, 'w', newline='') as csvfile:
+            for i in range(0, 100):
+                csvfile.write('%d,"a\nb"\n' % i)
+        report = sampling.sample(self.path, [[], [rules.Contains('\n')]],
+                                 size=20, seed=4)
+        self.assertGreater(report.rows, 0)
+
+    def test_sample_empty_file(self):
+        with open(self.path, 'w') as csvfile:
+            csvfile.write('id,qty\n')
+        report = sampling.sample(self.path, [[], []], header=True)
+        self.assertEqual(report.rows, 0)
+        self.assertEqual(report.error_rate, 0.0)
@@ -0,0 +1,190 @@
+import concurrent.futures
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import rigidity
+from rigidity import rules, sharding
+
+
+class TestSplitRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.csv')
+        with open(self.path, 'wb') as csvfile:
+            lines = ''.join('%d\n' % i for i in range(100))
+            csvfile.write(b'h\n' + lines.encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ranges_cover_lines(self):
+        ranges = sharding.split_ranges(self.path, 7, header=True)
+        self.assertEqual(ranges[0][0], 2)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.path))
+        with open(self.path, 'rb') as csvfile:
+            data = csvfile.read()
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[start - 1:start], b'\n')
+
+    def test_more_shards_than_lines(self):
+        with open(self.path, 'wb') as csvfile:
+            csvfile.write(b'a\nb\n')
+        ranges = sharding.split_ranges(self.path, 10)
+        self.assertEqual(ranges, [(0, 2), (2, 4)])
+
+    def test_quoted_line_breaks(self):
+        '''
+        Test that ranges do not start inside quoted fields.
+        '''
+        with open(self.path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['id', 'note'])
+            for i in range(0, 50):
+                writer.writerow([i, 'line one\nline two\n"three"\nfour'])
+        with open(self.path, 'rb') as csvfile:
+            data = csvfile.read()
+        ranges = sharding.split_ranges(self.path, 7, header=True)
+        self.assertEqual(len(ranges), 7)
+        rows = []
+        for start, end in ranges:
+            text = data[start:end].decode('utf8')
+            rows.extend(csv.reader(io.StringIO(text, newline='')))
+        self.assertEqual(rows, [[str(i), 'line one\nline two\n"three"\nfour']
+                                for i in range(0, 50)])
+
+
+class TestProcessFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'input.csv')
+        self.output = os.path.join(self.directory, 'output.csv')
+        with open(self.input, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['group', 'id'])
+            for i in range(0, 200):
+                group = 'g%d' % (i // 30) if i % 30 == 0 else ''
+                writer.writerow([group, str(i % 150)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_rules(self):
+        return [[rules.Cary()],
+                [rules.Unique(action=rules.Unique.ACTION_DROPROW)]]
+
+    def sequential(self):
+        with open(self.input, newline='') as csvfile:
+            r = rigidity.Rigidity(csv.reader(csvfile), self.make_rules())
+            r.skip()
+            return [['group', 'id']] + list(r)
+
+    def read_output(self):
+        with open(self.output, newline='') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_matches_sequential_run(self):
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            written = sharding.process_file(
+                self.input, self.output, self.make_rules(), shards=9,
+                header=True, executor=executor)
+        self.assertEqual(written, 150)
+        self.assertEqual(self.read_output(), self.sequential())
+
+    def test_process_pool(self):
+        written = sharding.process_file(self.input, self.output,
+                                        self.make_rules(), shards=3,
+                                        workers=2, header=True)
+        self.assertEqual(written, 150)
+        self.assertEqual(self.read_output(), self.sequential())
+
+    def test_compressed(self):
+        '''
+        Test that compressed inputs are validated in a single pass and
+        compressed outputs are written.
+        '''
+        compressed = self.input + '.gz'
+        with open(self.input, 'rb') as infile, \
+                gzip.open(compressed, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+        self.output += '.gz'
+        written = sharding.process_file(compressed, self.output,
+                                        self.make_rules(), header=True)
+        self.assertEqual(written, 150)
+        with gzip.open(self.output, 'rt', newline='') as csvfile:
+            self.assertEqual(list(csv.reader(csvfile)), self.sequential())
+
+    def test_quoted_line_breaks(self):
+        with open(self.input, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['id', 'note\nheader'])
+            for i in range(0, 40):
+                writer.writerow([' %d ' % i, 'line one\nline two\nthree'])
+        for r_rules in ([[rules.Strip()], []], [[rules.Integer()], []]):
+            with open(self.input, newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                expected = [next(reader)] + list(
+                    rigidity.Rigidity(reader, r_rules))
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                written = sharding.process_file(
+                    self.input, self.output, r_rules, shards=6,
+                    header=True, executor=executor)
+            self.assertEqual(written, 40)
+            self.assertEqual(self.read_output(),
+                             [[str(value) for value in row]
+                              for row in expected])
+
+    def test_inferred_format(self):
+        '''
+        Test that every shard parses dates with the format inferred
+        from the first rows of the file.
+        '''
+        with open(self.input, 'w', newline='') as csvfile:
+            csvfile.write('2024-01-02\n' * 100 + '01/02/2024\n' * 100)
+        with open(self.input, newline='') as csvfile:
+            self.assertRaises(ValueError, list, rigidity.Rigidity(
+                csv.reader(csvfile), [[rules.DateTime()]]))
+        for shards in (2, 4):
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                self.assertRaises(ValueError, sharding.process_file,
+                                  self.input, self.output,
+                                  [[rules.DateTime()]], shards=shards,
+                                  executor=executor)
+
+    def test_windowed_unique(self):
+        '''
+        Test that a value which left the window in an earlier shard is
+        accepted again in a later one.
+        '''
+        with open(self.input, 'w', newline='') as csvfile:
+            csvfile.write('a\nb\nc\nd\na\nx\n')
+        self.assertEqual(len(sharding.split_ranges(self.input, 3)), 3)
+
+        def make_rules():
+            return [[rules.WindowedUnique(
+                action=rules.WindowedUnique.ACTION_DROPROW, max_keys=2)]]
+        with open(self.input, newline='') as csvfile:
+            expected = list(rigidity.Rigidity(csv.reader(csvfile),
+                                              make_rules()))
+        self.assertEqual(len(expected), 6)
+        with concurrent.futures.ThreadPoolExecutor(3) as executor:
+            written = sharding.process_file(self.input, self.output,
+                                            make_rules(), shards=3,
+                                            executor=executor)
+        self.assertEqual(written, 6)
+        self.assertEqual(self.read_output(), expected)
+
+    def test_unmergeable_rule(self):
+        rule = rules.SpillingUnique()
+        try:
+            self.assertRaises(ValueError, sharding.process_file, self.input,
+                              self.output, [[], [rule]])
+        finally:
+            rule.close()